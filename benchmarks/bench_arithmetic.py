@@ -0,0 +1,56 @@
+'''Compares the arithmetic backends of the constant additions, see Arithmetic.
+
+For every model and backend the script reports the number of qubits, the depth, the two-qubit
+gates and the arbitrary-angle rotations (rz not a multiple of pi/4, each a long sequence on
+Clifford+T) after transpiling to a hardware-like basis, the transpile time, the time of a
+SparseState simulation and the estimated amplitude.
+
+    python -m benchmarks.bench_arithmetic   (from the repository root)
+'''
+
+import time
+import warnings
+
+import numpy as np
+from qiskit import transpile
+
+from markov_chain_models import DerivativePricing, DynamicCreditRisk, SparseState
+
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+BASIS = ['rz', 'sx', 'x', 'cx']
+
+MODELS = {
+    'DynamicCreditRisk(1, 3)': (DynamicCreditRisk, (1, 3), {}),
+    'DynamicCreditRisk(1, 6)': (DynamicCreditRisk, (1, 6), {}),
+    'DerivativePricing(1.0, 2)': (DerivativePricing, (1.0, 2), {'fractional_precision': 5}),
+    'DerivativePricing(1.0, 3)': (DerivativePricing, (1.0, 3), {'fractional_precision': 6}),
+}
+
+
+def arbitrary_rotations(circuit) -> int:
+    angles = [float(instruction.operation.params[0]) for instruction in circuit.data
+              if instruction.operation.name == 'rz']
+    return int(np.sum(np.abs(np.remainder(np.array(angles)/(np.pi/4) + 0.5, 1) - 0.5) > 1e-8))
+
+
+def measure(model, args, kwargs, arithmetic):
+    circuit = model(*args, arithmetic=arithmetic, **kwargs)
+    start = time.perf_counter()
+    transpiled = transpile(circuit, basis_gates=BASIS, optimization_level=1, seed_transpiler=0)
+    transpiled_at = time.perf_counter()
+    amplitude = SparseState.from_circuit(circuit).probabilities([circuit.objective])[1]
+    simulated_at = time.perf_counter()
+    ops = transpiled.count_ops()
+    return (circuit.num_qubits, transpiled.depth(), ops.get('cx', 0), arbitrary_rotations(transpiled),
+            transpiled_at-start, simulated_at-transpiled_at, amplitude)
+
+
+if __name__ == '__main__':
+    print('{:28} {:7} {:>6} {:>8} {:>8} {:>8} {:>12} {:>10} {:>10}'.format(
+        'model', 'adder', 'qubits', 'depth', 'cx', 'rz', 'transpile s', 'simulate s', 'amplitude'))
+    for label, (model, args, kwargs) in MODELS.items():
+        for arithmetic in ['qft', 'ripple']:
+            qubits, depth, cx, rz, transpile_time, simulate_time, amplitude = measure(model, args, kwargs, arithmetic)
+            print('{:28} {:7} {:6d} {:8d} {:8d} {:8d} {:12.2f} {:10.2f} {:10.5f}'.format(
+                label, arithmetic, qubits, depth, cx, rz, transpile_time, simulate_time, amplitude))
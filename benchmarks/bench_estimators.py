@@ -0,0 +1,73 @@
+'''Compares the oracle calls of MLAE, IAE and FAE on the credit and pricing problems.
+
+Every estimator targets a confidence interval of half width EPSILON on the amplitude at level
+1 - ALPHA. IAE chooses its powers and shots adaptively, FAE its powers with FAE_SHOTS per
+circuit instead of the far larger shots of its guarantee. MLAE keeps its fixed schedule
+of powers [0, 1, 2, 4] and doubles the shots per circuit until its Fisher information interval
+is narrow enough. The counts are sampled noiselessly from one statevector per problem, and the
+oracle calls count every application of A, a circuit A Q^k counting 2k+1 per shot.
+
+    python -m benchmarks.bench_estimators   (from the repository root)
+'''
+
+import warnings
+
+import numpy as np
+from qiskit.quantum_info import Statevector
+
+from markov_chain_models import (DerivativePricing, DynamicCreditRisk, StaticCreditRisk, EstimationProblem,
+                                 IterativeAmplitudeEstimation, FasterAmplitudeEstimation, GroverSampler,
+                                 compute_mle, compute_confidence_interval, simulate_mlae_counts)
+from markov_chain_models.MLAE import MLAE_POWERS
+
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+EPSILON = 0.005
+ALPHA = 0.05
+REPEATS = 10
+FAE_SHOTS = (200, 200)
+
+PROBLEMS = {
+    'DynamicCreditRisk(1, 3)': (DynamicCreditRisk, (1, 3)),
+    'StaticCreditRisk(1, 3)': (StaticCreditRisk, (1, 3)),
+    'DerivativePricing(1.0, 2, ...)': (DerivativePricing, (1.0, 2, 0.1, 0.3, 1, 3)),
+}
+
+
+def mlae(problem, probabilities, rng):
+    '''Estimate and oracle calls of MLAE with the fewest doubled shots reaching EPSILON.'''
+    shots = 16
+    while True:
+        counts = np.vstack([rng.multinomial(shots, row/row.sum()) for row in probabilities])
+        estimation = compute_mle(counts, problem)
+        low, high = compute_confidence_interval(estimation, counts.sum(axis=1), ALPHA)
+        if (high - low)/2 <= EPSILON or shots >= 2**20:
+            return estimation, shots*sum(2*k + 1 for k in MLAE_POWERS)
+        shots *= 2
+
+
+def summary(result):
+    return result.estimation, result.num_oracle_queries
+
+
+if __name__ == '__main__':
+    print(f"epsilon = {EPSILON}, alpha = {ALPHA}, mean over {REPEATS} runs")
+    print(f"{'problem':32s}{'estimator':>10s}{'oracle calls':>15s}{'max error':>12s}")
+    for label, (model, args) in PROBLEMS.items():
+        circuit = model(*args)
+        problem = EstimationProblem(circuit, circuit.objective)
+        exact = Statevector(circuit).probabilities([circuit.objective])[1]
+
+        # one statevector per problem, shared by the runs
+        probabilities = simulate_mlae_counts(problem)
+        sampler = GroverSampler(seed=0)
+        rng = np.random.default_rng(0)
+        estimators = {
+            'MLAE': lambda: mlae(problem, probabilities, rng),
+            'IAE': lambda: summary(IterativeAmplitudeEstimation(EPSILON, ALPHA).estimate(problem, sampler)),
+            'FAE': lambda: summary(FasterAmplitudeEstimation(EPSILON, ALPHA, shots=FAE_SHOTS).estimate(problem, sampler)),
+        }
+        for name, estimate in estimators.items():
+            results = np.array([estimate() for _ in range(REPEATS)])
+            error = np.abs(results[:, 0] - exact).max()
+            print(f"{label:32s}{name:>10s}{results[:, 1].mean():15.0f}{error:12.4f}")
@@ -0,0 +1,66 @@
+'''Build cost of the correlated systemic factors of StaticCreditRisk against the generic
+multivariate NormalDistribution, which initializes the full meshgrid of the factors.
+
+For every number of factors the script reports the time to build and transpile the joint
+loader and its CX count. StaticCreditRisk loads independent innovations, one univariate
+loader per factor, and correlates them through the default rotations, so its loader is
+measured alone and with the whole model, one group of loans per factor. The meshgrid
+loader fails in qiskit's isometry synthesis from 12 qubits on.
+
+    python -m benchmarks.bench_factors   (from the repository root)
+'''
+
+import time
+import warnings
+
+import numpy as np
+from qiskit import QuantumCircuit, transpile
+
+from markov_chain_models import StaticCreditRisk
+from markov_chain_models.NormalDistribution import NormalDistribution
+
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+BASIS = ['rz', 'sx', 'x', 'cx']
+Z_QUBITS = 3
+FACTORS = [1, 2, 3, 4]
+
+
+def correlation(num_factors):
+    return 0.3*np.ones((num_factors, num_factors)) + 0.7*np.eye(num_factors)
+
+
+def measure(build):
+    start = time.perf_counter()
+    try:
+        transpiled = transpile(build(), basis_gates=BASIS, optimization_level=1, seed_transpiler=0)
+    except ValueError:
+        return float('nan'), -1
+    return time.perf_counter() - start, transpiled.count_ops().get('cx', 0)
+
+
+def factor_loaders(num_factors):
+    center = (2**Z_QUBITS - 1)/2
+    loader = NormalDistribution(Z_QUBITS, mu=center, sigma=center/2, bounds=(0, 2**Z_QUBITS - 1)).to_gate()
+    circuit = QuantumCircuit(num_factors*Z_QUBITS)
+    for factor in range(num_factors):
+        circuit.append(loader, range(factor*Z_QUBITS, (factor + 1)*Z_QUBITS))
+    return circuit
+
+
+if __name__ == '__main__':
+    print(f"{'factors':>8s}{'meshgrid [s]':>14s}{'meshgrid CX':>13s}{'loaders [s]':>13s}{'loaders CX':>12s}"
+          f"{'model [s]':>11s}{'model CX':>10s}")
+    for num_factors in FACTORS:
+        center = (2**Z_QUBITS - 1)/2
+        meshgrid = measure(lambda: NormalDistribution([Z_QUBITS]*num_factors, [center]*num_factors,
+                                                      correlation(num_factors)*center/2,
+                                                      [(0, 2**Z_QUBITS - 1)]*num_factors))
+        loaders = measure(lambda: factor_loaders(num_factors))
+        groups = num_factors
+        model = measure(lambda: StaticCreditRisk(1, 1, default_probs=[[0.1]*groups]*2,
+                                                 sensitivities=[[0.1]*groups]*2, weights=[1]*groups,
+                                                 z_qubits=Z_QUBITS, factor_correlation=correlation(num_factors),
+                                                 sectors=list(range(groups))))
+        print(f"{num_factors:8d}{meshgrid[0]:14.3f}{meshgrid[1]:13d}{loaders[0]:13.3f}{loaders[1]:12d}"
+              f"{model[0]:11.3f}{model[1]:10d}")
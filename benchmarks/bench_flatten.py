@@ -0,0 +1,46 @@
+'''Compares the nested (default) and flattened construction of the model circuits.
+
+For every model the script reports the build time, the time to transpile the circuit to
+a hardware-like basis, and the peak Python memory of build + transpile (tracemalloc).
+
+    python -m benchmarks.bench_flatten   (from the repository root)
+'''
+
+import time
+import tracemalloc
+import warnings
+
+from qiskit import transpile
+
+from markov_chain_models import DerivativePricing, DynamicCreditRisk, StaticCreditRisk
+
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+BASIS = ['rz', 'sx', 'x', 'cx']
+
+MODELS = {
+    'DynamicCreditRisk(1, 6)': (DynamicCreditRisk, (1, 6)),
+    'StaticCreditRisk(1, 3)': (StaticCreditRisk, (1, 3)),
+    'DerivativePricing(1.0, 3)': (DerivativePricing, (1.0, 3)),
+}
+
+
+def measure(model, args, flatten):
+    tracemalloc.start()
+    start = time.perf_counter()
+    circuit = model(*args, flatten=flatten)
+    built = time.perf_counter()
+    transpiled = transpile(circuit, basis_gates=BASIS, optimization_level=1, seed_transpiler=0)
+    done = time.perf_counter()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return built-start, done-built, peak/2**20, transpiled.depth()
+
+
+if __name__ == '__main__':
+    print(f"{'model':28s}{'mode':>9s}{'build [s]':>11s}{'transpile [s]':>15s}{'peak [MiB]':>12s}{'depth':>8s}")
+    for label, (model, args) in MODELS.items():
+        for flatten in [False, True]:
+            build, trans, peak, depth = measure(model, args, flatten)
+            mode = 'flat' if flatten else 'nested'
+            print(f"{label:28s}{mode:>9s}{build:11.3f}{trans:15.3f}{peak:12.1f}{depth:8d}")
@@ -0,0 +1,60 @@
+'''Measures the import time of markov_chain_models entry points in fresh interpreters.
+
+Every statement is timed in its own subprocess, the median of REPEATS runs is reported
+together with the heavy dependencies it pulled in. The script exits with an error if a
+statement loads a dependency it must not, e.g. the post processing loading scipy.optimize, so it
+can guard against import time regressions in CI.
+
+    python -m benchmarks.bench_import   (from the repository root)
+'''
+
+import statistics
+import subprocess
+import sys
+
+REPEATS = 5
+
+HEAVY = ['qiskit', 'qiskit.circuit.library', 'scipy.optimize', 'scipy.stats']
+
+'''Statement -> heavy modules it must not load. The classes named like their submodules are
+imported with the package, qiskit with them, scipy.stats and scipy.optimize stay lazy'''
+LAZY = ['scipy.optimize', 'scipy.stats']
+STATEMENTS = {
+    'import markov_chain_models': LAZY,
+    'from markov_chain_models import compute_mle, compute_confidence_interval': LAZY,
+    'from markov_chain_models import ResultsStore, import_json': LAZY,
+    'from markov_chain_models import MarkovChain': LAZY,
+    'from markov_chain_models import DerivativePricing': LAZY,
+    'from markov_chain_models import StaticCreditRisk': LAZY,
+    'from markov_chain_models import Calibration': LAZY,
+}
+
+PROBE = '''
+import sys, time
+start = time.perf_counter()
+{}
+elapsed = time.perf_counter() - start
+print(elapsed, *[name for name in {!r} if name in sys.modules])
+'''
+
+
+def measure(statement):
+    '''Median import time in seconds and the heavy modules loaded by ``statement``.'''
+    times = []
+    for _ in range(REPEATS):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(statement, HEAVY)],
+                                capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(output[0]))
+    return statistics.median(times), output[1:]
+
+
+if __name__ == '__main__':
+    failures = []
+    print(f"{'statement':<75s}{'time [s]':>10s}  loaded")
+    for statement, forbidden in STATEMENTS.items():
+        elapsed, loaded = measure(statement)
+        print(f"{statement:<75s}{elapsed:10.3f}  {', '.join(loaded)}")
+        failures += ['{} loads {}'.format(statement, name) for name in loaded if name in forbidden]
+
+    if failures:
+        sys.exit('\n'.join(failures))
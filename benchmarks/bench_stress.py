@@ -0,0 +1,52 @@
+'''Time to evaluate the loss distributions of many stressed scenarios, one model object and
+simulation per scenario against the vectorized classical evaluation of StressTest.
+
+For every model and number of scenarios the script reports:
+
+* per scenario: building every scenario's circuit and reading P(L <= loss) off its sparse
+  statevector, which is what a stress test costs without the engine.
+* batch: StressTest.loss_distributions for all scenarios at once.
+
+    python -m benchmarks.bench_stress   (from the repository root)
+'''
+
+import time
+import warnings
+
+import numpy as np
+
+from markov_chain_models import SparseState, StressTest
+
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+SCENARIOS = [8, 32]
+
+
+def scenarios(model, count):
+    rng = np.random.default_rng(0)
+    if model == 'StaticCreditRisk':
+        return [{'prob_gb': rng.uniform(0.05, 0.5),
+                 'default_probs': rng.uniform(0.05, 0.4, (2, 2)).tolist()} for _ in range(count)]
+    return [{'prob_gb': rng.uniform(0.05, 0.5), 'prob_bg': rng.uniform(0.05, 0.5)} for _ in range(count)]
+
+
+def per_scenario(test):
+    start = time.perf_counter()
+    for index in range(len(test)):
+        circuit = test.spec(index).build()
+        SparseState.from_circuit(circuit).probabilities([circuit.objective])
+    return time.perf_counter() - start
+
+
+def batch(test):
+    start = time.perf_counter()
+    test.loss_distributions()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    print(f"{'model':>20s}{'scenarios':>11s}{'per scenario [s]':>18s}{'batch [s]':>11s}")
+    for model in ['StaticCreditRisk', 'DynamicCreditRisk']:
+        for count in SCENARIOS:
+            test = StressTest(model, scenarios(model, count), loss=1, time_steps=2)
+            print(f"{model:>20s}{count:11d}{per_scenario(test):18.3f}{batch(test):11.4f}")
@@ -0,0 +1,72 @@
+'''Compares job submission strategies for the MLAE circuits against the MockBackend.
+
+The backend replays the recorded Torino counts with a simulated queue, so the wall time is
+dominated by the latency and the retries of failed jobs, as on remote hardware:
+
+* batch: all circuits in one ``run`` job, retried as a whole.
+* handles: one job per circuit via ``process_circuits``, polled until done, failed circuits
+  resubmitted.
+
+    python -m benchmarks.bench_submission   (from the repository root)
+'''
+
+import tempfile
+import time
+import warnings
+
+from qiskit import QuantumCircuit
+from qiskit.providers import JobError, JobStatus
+
+from markov_chain_models import EstimationProblem, ResultsStore, import_json, construct_mlae_circuits
+from markov_chain_models.MockBackend import MockBackend
+
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+LATENCY = 0.05
+FAILURE_RATES = [0.0, 0.2, 0.5]
+REPEATS = 10
+
+
+def batch(backend, circuits, shots):
+    while True:
+        try:
+            return backend.run(circuits, shots=shots).result()
+        except JobError:
+            continue
+
+
+def handles(backend, circuits, shots):
+    pending = dict(zip(backend.process_circuits(circuits, n_shots=shots), circuits))
+    results = {}
+    while pending:
+        for handle, circuit in list(pending.items()):
+            status = backend.circuit_status(handle)
+            if status == JobStatus.DONE:
+                results[circuit.name] = backend.get_result(handle)
+                del pending[handle]
+            elif status == JobStatus.ERROR:
+                del pending[handle]
+                pending.update(zip(backend.process_circuits([circuit], n_shots=shots), [circuit]))
+        time.sleep(LATENCY/10)
+    return [results[circuit.name] for circuit in circuits]
+
+
+if __name__ == '__main__':
+    circuit = QuantumCircuit(1)
+    circuits = construct_mlae_circuits(EstimationProblem(circuit, [0]), measurement=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ResultsStore(directory)
+        import_json(store, 'hardware_results/probabilities.json')
+
+        print(f"{'failure rate':>14s}{'batch [s]':>12s}{'handles [s]':>14s}")
+        for failure_rate in FAILURE_RATES:
+            times = []
+            for strategy in [batch, handles]:
+                backend = MockBackend.from_store(store, 'MLAE', 'Torino', latency=LATENCY,
+                                                 failure_rate=failure_rate, seed=0)
+                start = time.perf_counter()
+                for _ in range(REPEATS):
+                    strategy(backend, circuits, 4000)
+                times.append((time.perf_counter()-start)/REPEATS)
+            print(f"{failure_rate:14.1f}{times[0]:12.3f}{times[1]:14.3f}")
@@ -0,0 +1,53 @@
+'''Latency of the Worker with cold and warm circuits, and throughput of concurrent requests.
+
+The requests are StaticCreditRisk VaR steps, sampled noiselessly or run on a MockBackend
+without latency, so the times are those of building, transpiling, simulating and estimating:
+
+* cold: the first request of every spec builds and transpiles the MLAE circuits.
+* warm: the same requests again, only run and estimated.
+* concurrent: all requests at once, twice each, batched into one job and coalesced.
+
+    python -m benchmarks.bench_worker   (from the repository root)
+'''
+
+import asyncio
+import time
+import warnings
+
+from markov_chain_models import ModelSpec, StaticCreditRisk
+from markov_chain_models.MockBackend import MockBackend
+from markov_chain_models.Worker import Worker
+
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+SPECS = [ModelSpec.of(StaticCreditRisk, loss, 1) for loss in range(4)]
+SHOTS = 500
+
+
+async def sequential(worker):
+    start = time.perf_counter()
+    for spec in SPECS:
+        await worker.price(spec)
+    return (time.perf_counter() - start)/len(SPECS)
+
+
+async def concurrent(worker):
+    start = time.perf_counter()
+    await asyncio.gather(*[worker.price(spec) for spec in SPECS*2])
+    return time.perf_counter() - start
+
+
+async def main():
+    print(f"{'backend':12s}{'cold latency [s]':>18s}{'warm latency [s]':>18s}{'concurrent [s]':>16s}"
+          f"{'batches':>9s}{'coalesced':>11s}")
+    for label, backend in [('noiseless', None), ('mock', MockBackend(seed=0))]:
+        async with Worker(backend, shots=SHOTS, seed=0, optimization_level=1) as worker:
+            cold = await sequential(worker)
+            warm = await sequential(worker)
+            wall = await concurrent(worker)
+            metrics = worker.metrics()
+        print(f"{label:12s}{cold:18.3f}{warm:18.3f}{wall:16.3f}{metrics['batches']:9d}{metrics['coalesced']:11d}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
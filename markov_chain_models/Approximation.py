@@ -0,0 +1,68 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+import numpy as np
+
+'''Phases closer to a multiple of 2 pi than this are identities up to rounding'''
+ZERO_PHASE = 1e-12
+
+
+def wrap_phase(lam: float) -> float:
+    '''Maps a phase to [-pi, pi).'''
+    return (lam + np.pi) % (2*np.pi) - np.pi
+
+
+def adder_phases(value: float, num_qubits: int, fractional_precision: int) -> np.ndarray:
+    '''Phases, wrapped to [-pi, pi), of adding ``value`` to a register of ``num_qubits`` qubits
+    with ``fractional_precision`` fractional bits in the QFT basis, least significant qubit first.'''
+    return wrap_phase(value * np.pi * 2.0**(fractional_precision - np.arange(num_qubits)))
+
+
+def pruned_phase(values, num_qubits: int, fractional_precision: int, tolerance: float) -> float:
+    '''Total angle of the adder phases at most ``tolerance`` over all the added ``values``.'''
+    phases = np.abs(adder_phases(np.asarray(values, dtype=float)[:, None], num_qubits, fractional_precision))
+    return float(phases[phases <= tolerance].sum())
+
+
+def phase_tolerance(num_qubits: int, approximation_degree: int) -> float:
+    '''Largest phase pruned from an adder on ``num_qubits`` qubits.
+
+    ``QFT(num_qubits, approximation_degree)`` drops its controlled rotations of angle
+    ``pi/2**m`` for ``m >= num_qubits-approximation_degree``, the adders drop their phases
+    below the same angle. With ``approximation_degree=0`` only the phases that are multiples
+    of 2 pi, i.e. identities, are pruned.
+    '''
+    if approximation_degree <= 0:
+        return ZERO_PHASE
+    return np.pi/2**(num_qubits-approximation_degree)
+
+
+def qft_dropped_phase(num_qubits: int, approximation_degree: int) -> float:
+    '''Sum of the angles of the rotations dropped by ``QFT(num_qubits, approximation_degree)``,
+    there are ``num_qubits-m`` rotations of angle ``pi/2**m``.'''
+    m = np.arange(max(1, num_qubits-approximation_degree), num_qubits)
+    return float(np.sum((num_qubits-m)*np.pi/2.0**m))
+
+
+def probability_error_bound(dropped_phase: float) -> float:
+    '''Bound on the change of any measurement probability when gates with a total phase of
+    ``dropped_phase`` are removed.
+
+    Removing a (controlled) phase gate of angle ``lam`` changes the unitary by
+    ``|1-exp(i lam)| <= |lam|`` in operator norm, these errors add up over the circuit and a
+    probability changes by at most twice the distance of the states.
+    '''
+    return min(1.0, 2*dropped_phase)
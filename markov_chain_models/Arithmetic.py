@@ -0,0 +1,127 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit.circuit import Gate
+from qiskit.circuit.library import QFT
+from qiskit.synthesis import adder_ripple_c04
+
+from .Approximation import adder_phases
+from .LazyCircuit import memoized_gate
+
+'''Arithmetic of the constant additions of DerivativePricing and DynamicCreditRisk:
+
+    'qft': phase rotations in the QFT basis, between a QFT and an inverse QFT, no ancillas.
+    'ripple': Cuccaro ripple-carry additions in the computational basis. The constant is
+        loaded into an operand register with X gates controlled by the control qubits, so one
+        adder adds any of the constants selected by the controls, e.g. the four increments of
+        a step of the binomial tree. Uses num_qubits+1 clean ancillas, the operand register
+        and the carry qubit, returned to |0>.
+'''
+ARITHMETICS = ('qft', 'ripple')
+
+
+def num_arithmetic_ancillas(arithmetic: str, num_qubits: int, approximation_degree: int = 0) -> int:
+    '''Ancillas of the arithmetic for a register of ``num_qubits`` qubits. The ripple-carry
+    arithmetic has no QFT to approximate, it rejects a nonzero ``approximation_degree``.'''
+    if arithmetic not in ARITHMETICS:
+        raise ValueError('arithmetic must be one of {}, got {}.'.format(ARITHMETICS, arithmetic))
+    if arithmetic == 'ripple' and approximation_degree:
+        raise ValueError('The ripple-carry arithmetic is exact, approximation_degree must be 0, got {}.'.format(
+            approximation_degree))
+    return num_qubits+1 if arithmetic == 'ripple' else 0
+
+
+@memoized_gate(maxsize=16)
+def qft_gate(num_qubits: int, approximation_degree: int, inverse: bool) -> Gate:
+    '''Memoized QFT of a register, without swaps, it only depends on the precision'''
+    return QFT(num_qubits,approximation_degree,do_swaps=False, inverse=inverse, insert_barriers=False).to_gate()
+
+
+@memoized_gate(maxsize=1024)
+def qft_adder_gate(value: float, num_qubits: int, fractional_precision: int, tolerance: float,
+                   num_ctrl_qubits: int = 0, ctrl_state: Optional[str] = None) -> Gate:
+    '''Memoized addition of ``value`` in the QFT basis, optionally controlled, skipping the
+    phases up to ``tolerance``. Models that share an increment, e.g. the bumped instruments of
+    a sensitivity run, share the gate and its synthesized definition'''
+    circ_a = QuantumCircuit(num_qubits)
+    for i, lam in enumerate(adder_phases(value, num_qubits, fractional_precision)):
+        if abs(lam) > tolerance:
+            circ_a.p(lam, i)
+    gate = circ_a.to_gate(label='Add Value')
+    if num_ctrl_qubits:
+        return gate.control(num_ctrl_qubits=num_ctrl_qubits, ctrl_state=ctrl_state)
+    return gate
+
+
+def to_integer(value: float, num_qubits: int, fractional_precision: int) -> int:
+    '''The register state closest to ``value``, in two's complement modulo ``2**num_qubits``.'''
+    return int(np.round(value*2.0**fractional_precision)) % 2**num_qubits
+
+
+def _load(circuit: QuantumCircuit, states: set, controls: list, target: int) -> None:
+    '''Flips ``target`` if the controls are in one of ``states``. Controls the set does not
+    depend on are dropped, so a bit shared by all constants is a plain X.'''
+    free = [j for j in range(len(controls)) if all(state ^ (1 << j) in states for state in states)]
+    kept = [j for j in range(len(controls)) if j not in free]
+    reduced = {sum(((state >> j) & 1) << bit for bit, j in enumerate(kept)) for state in states}
+    for state in sorted(reduced):
+        if kept:
+            circuit.mcx([controls[j] for j in kept], target, ctrl_state=state)
+        else:
+            circuit.x(target)
+
+
+@memoized_gate(maxsize=1024)
+def ripple_adder_gate(values: tuple, num_qubits: int, fractional_precision: int) -> Gate:
+    '''Adds ``values[s]`` to a register, ``s`` being the integer state of the control qubits
+    (the first control is the least significant bit), with a Cuccaro ripple-carry adder.
+
+    The gate acts on the ``log2(len(values))`` controls, the register and the
+    ``num_qubits+1`` ancillas, in that order. Every value is rounded to the grid of the
+    register, see ``to_integer``.'''
+    num_ctrl_qubits = int(np.log2(len(values)))
+    if len(values) != 2**num_ctrl_qubits:
+        raise ValueError('One value per state of the controls is needed, got {}.'.format(len(values)))
+    integers = [to_integer(value, num_qubits, fractional_precision) for value in values]
+
+    controls = list(range(num_ctrl_qubits))
+    register = list(range(num_ctrl_qubits, num_ctrl_qubits+num_qubits))
+    operand = list(range(num_ctrl_qubits+num_qubits, num_ctrl_qubits+2*num_qubits))
+    carry = num_ctrl_qubits+2*num_qubits
+
+    load = QuantumCircuit(carry+1)
+    for bit in range(num_qubits):
+        states = {state for state, integer in enumerate(integers) if (integer >> bit) & 1}
+        if states:
+            _load(load, states, controls, operand[bit])
+
+    circ = QuantumCircuit(carry+1)
+    if any(integers):
+        circ.compose(load, inplace=True)
+        circ.append(_ripple_carry_adder(num_qubits), operand+register+[carry])
+        circ.compose(load.inverse(), inplace=True)
+    return circ.to_gate(label='Ripple Add')
+
+
+@lru_cache(maxsize=16)
+def _ripple_carry_adder(num_qubits: int) -> Gate:
+    '''Memoized modular adder ``b <- a+b`` on the qubits (a, b, carry)'''
+    return adder_ripple_c04(num_qubits, kind='fixed').to_gate()
@@ -0,0 +1,177 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+import os
+from typing import Optional
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'classical_calculations')
+AAA_PATH = os.path.join(DATA_DIR, 'AAA10Y.csv')
+BAA_PATH = os.path.join(DATA_DIR, 'BAA10Y.csv')
+
+'''Series of the statistics, the columns of ``Calibration.mean``'''
+SERIES = ('AAA', 'BAA')
+
+'''Average number of days in a month, used to convert date differences into monthly steps'''
+DAYS_PER_MONTH = 30.437
+
+'''NBER business cycle reference dates (peak, trough) of every US recession since 1857'''
+NBER_CYCLES = np.array([
+    ('1857-06-01', '1858-12-01'), ('1860-10-01', '1861-06-01'), ('1865-04-01', '1867-12-01'),
+    ('1869-06-01', '1870-12-01'), ('1873-10-01', '1879-03-01'), ('1882-03-01', '1885-05-01'),
+    ('1887-03-01', '1888-04-01'), ('1890-07-01', '1891-05-01'), ('1893-01-01', '1894-06-01'),
+    ('1895-12-01', '1897-06-01'), ('1899-06-01', '1900-12-01'), ('1902-09-01', '1904-08-01'),
+    ('1907-05-01', '1908-06-01'), ('1910-01-01', '1912-01-01'), ('1913-01-01', '1914-12-01'),
+    ('1918-08-01', '1919-03-01'), ('1920-01-01', '1921-07-01'), ('1923-05-01', '1924-07-01'),
+    ('1926-10-01', '1927-11-01'), ('1929-08-01', '1933-03-01'), ('1937-05-01', '1938-06-01'),
+    ('1945-02-01', '1945-10-01'), ('1948-11-01', '1949-10-01'), ('1953-07-01', '1954-05-01'),
+    ('1957-08-01', '1958-04-01'), ('1960-04-01', '1961-02-01'), ('1969-12-01', '1970-11-01'),
+    ('1973-11-01', '1975-03-01'), ('1980-01-01', '1980-07-01'), ('1981-07-01', '1982-11-01'),
+    ('1990-07-01', '1991-03-01'), ('2001-03-01', '2001-11-01'), ('2007-12-01', '2009-06-01'),
+    ('2020-02-01', '2020-04-01'),
+], dtype='datetime64[D]')
+
+
+def load_series(path: str) -> tuple[np.ndarray, np.ndarray]:
+    '''Loads a FRED style ``DATE,VALUE`` csv file in bulk, dropping the missing ('.') values.
+
+    Returns:
+        The dates as a ``datetime64[D]`` array and the values as a float64 array.
+    '''
+    table = np.loadtxt(path, delimiter=',', skiprows=1, dtype='S10')
+    observed = table[:, 1] != b'.'
+
+    '''Parse the fixed width YYYY-MM-DD dates from their digits, much faster than via strings'''
+    digits = (table[observed, 0].view(np.uint8).reshape(-1, 10) - ord('0')).astype(np.int64)
+    year = digits[:, 0]*1000 + digits[:, 1]*100 + digits[:, 2]*10 + digits[:, 3]
+    month = digits[:, 5]*10 + digits[:, 6]
+    day = digits[:, 8]*10 + digits[:, 9]
+    dates = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1)
+    dates = dates.astype('datetime64[D]') + (day - 1)
+
+    return dates, table[observed, 1].astype(np.float64)
+
+
+def label_regimes(dates: np.ndarray, cycles: np.ndarray = NBER_CYCLES) -> np.ndarray:
+    '''Labels every date with its regime via an interval join over the cycle dates.
+
+    A date belongs to the bad regime (1) if it falls in ``[peak, trough)`` of a recession and
+    to the good regime (0) if it falls before the peak of the next recession. Dates after the
+    last trough cannot be assigned and are labelled -1.
+
+    Args:
+        dates: Sorted or unsorted ``datetime64`` dates.
+        cycles: Array of shape ``(recessions, 2)`` holding the sorted (peak, trough) dates.
+    '''
+    following = np.searchsorted(cycles[:, 1], dates, side='right')
+    labels = np.full(len(dates), -1, dtype=np.int8)
+    assigned = following < len(cycles)
+    labels[assigned] = dates[assigned] >= cycles[following[assigned], 0]
+    return labels
+
+
+class Calibration:
+    '''Regime switching parameters estimated from the AAA/BAA 10 year bond yield spreads and
+    the NBER recession dates.
+
+    The transition probabilities are estimated per month over the span of the BAA series:
+    ``prob_gb`` is the number of recessions starting in that span divided by the number of
+    good months, ``prob_bg`` the number of recessions divided by the number of bad months.
+    The regime statistics are those of the rates ``1 + spread`` of both series, sampled on the
+    days both series were observed. The spreads are in percent.
+
+    The parameters of ``DerivativePricing`` are derived from one series, BAA by default: the
+    rate of a regime is its mean spread as a fraction, and its volatility the coefficient of
+    variation ``std/mean`` of its rates, constant over the time steps.
+
+    Example:
+
+        >>> calibration = Calibration()
+        >>> MarkovChain(time_steps=3, **calibration.markov_chain_params())
+        >>> DerivativePricing(strike_price=1.0, time_steps=3, **calibration.derivative_pricing_params())
+    '''
+
+    def __init__(self,
+                 aaa_path: Optional[str] = AAA_PATH,
+                 baa_path: Optional[str] = BAA_PATH,
+                 cycles: Optional[np.ndarray] = NBER_CYCLES,
+                 ) -> None:
+        '''
+        Args:
+            aaa_path: csv file of the AAA 10 year spread.
+            baa_path: csv file of the BAA 10 year spread.
+            cycles: Array of shape ``(recessions, 2)`` holding the sorted (peak, trough) dates.
+        '''
+        aaa_dates, aaa_values = load_series(aaa_path)
+        baa_dates, baa_values = load_series(baa_path)
+
+        self.start = baa_dates[0]
+        self.end = baa_dates[-1]
+
+        '''Transition probabilities'''
+        recessions = cycles[cycles[:, 0] >= self.start]
+        self.recessions = len(recessions)
+        self.total_months = int(np.round((self.end - self.start).astype(int) / DAYS_PER_MONTH))
+        self.bad_months = int(np.round((recessions[:, 1] - recessions[:, 0]).astype(int) / DAYS_PER_MONTH).sum())
+        self.good_months = self.total_months - self.bad_months
+
+        self.prob_gb = self.recessions / self.good_months
+        self.prob_bg = self.recessions / self.bad_months
+
+        '''Regime statistics of the rates, [AAA, BAA] per regime'''
+        dates, aaa_index, baa_index = np.intersect1d(aaa_dates, baa_dates, assume_unique=True, return_indices=True)
+        rates = 1 + np.column_stack([aaa_values[aaa_index], baa_values[baa_index]])
+        labels = label_regimes(dates, recessions)
+
+        self.observations = [int(np.sum(labels == regime)) for regime in [0, 1]]
+        self.mean = np.array([rates[labels == regime].mean(axis=0) for regime in [0, 1]])
+        self.median = np.array([np.median(rates[labels == regime], axis=0) for regime in [0, 1]])
+        self.covariance = np.array([np.cov(rates[labels == regime], rowvar=False, bias=True) for regime in [0, 1]])
+        self.std = np.sqrt(np.diagonal(self.covariance, axis1=1, axis2=2))
+
+    def markov_chain_params(self) -> dict:
+        '''Keyword arguments of ``MarkovChain`` other than ``time_steps``.'''
+        return {'prob_gb': self.prob_gb, 'prob_bg': self.prob_bg}
+
+    def regime_rates(self, series: str = 'BAA') -> np.ndarray:
+        '''Mean spread of ``series`` per regime, as a fraction.'''
+        return (self.mean[:, SERIES.index(series)] - 1)/100
+
+    def regime_volatilities(self, series: str = 'BAA') -> np.ndarray:
+        '''Coefficient of variation of the rates of ``series`` per regime.'''
+        column = SERIES.index(series)
+        return self.std[:, column]/self.mean[:, column]
+
+    def derivative_pricing_params(self,
+                                  sigma: Optional[np.ndarray] = None,
+                                  rates: Optional[np.ndarray] = None,
+                                  series: str = 'BAA') -> dict:
+        '''Keyword arguments of ``DerivativePricing`` determined by the calibration.
+
+        Args:
+            sigma: Volatility schedule of the underlying per regime and step, defaults to
+                ``regime_volatilities``.
+            rates: Rate schedule of the underlying per regime and step, defaults to
+                ``regime_rates``.
+            series: The series of the default schedules, 'AAA' or 'BAA'.
+        '''
+        if series not in SERIES:
+            raise ValueError('series must be one of {}, got {}.'.format(SERIES, series))
+        return {'prob_gb': self.prob_gb,
+                'prob_bg': self.prob_bg,
+                'sigma': self.regime_volatilities(series) if sigma is None else sigma,
+                'rates': self.regime_rates(series) if rates is None else rates}
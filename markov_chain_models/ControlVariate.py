@@ -0,0 +1,229 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+from typing import Optional, Sequence
+
+import numpy as np
+from qiskit import QuantumCircuit, transpile
+
+from .EstimationProblem import EstimationProblem
+from .Greeks import price
+from .MLAE import construct_mlae_circuits, compute_mle, compute_confidence_interval, simulate_mlae_counts, _get_counts
+from .ModelSpec import ModelSpec
+from .SparseState import SparseState
+
+
+class ControlVariate:
+    '''Corrects the estimate of a model with a cheaper model of the same quantity whose value
+    is known classically, e.g. ``DerivativePricing`` with a coarser price register.
+
+    With ``x`` the known value of the control, the corrected estimate
+
+        y_cv = y - beta (x_hat - x),    beta = Cov(y, x_hat)/Var(x_hat),
+
+    is unbiased and has the variance ``Var(y) + beta**2 Var(x_hat) - 2 beta Cov(y, x_hat)``,
+    i.e. ``(1 - rho**2) Var(y)``, ``rho`` being the correlation of the two estimates.
+    ``beta`` and ``rho`` are learned from calibration runs, see ``calibrate``, executed the
+    way the estimates are:
+
+    * ``simulate`` samples the counts of both models from the same uniforms, the common
+      random numbers, so their errors are correlated. It is calibrated by
+      ``simulate_calibration``.
+    * ``run`` executes the circuits of the two models separately, on a backend their shot
+      noise is independent. It is calibrated from backend runs, ``run_calibration``, which
+      find the correlation, if any, of the noise of the backend.
+
+    Calibrations of one kind are rejected by the other. Without correlation the correction
+    only adds the variance ``beta**2 Var(x_hat)``, the interval of ``correct`` widens
+    accordingly. The shots that reach an accuracy scale with ``variance_reduction``.
+
+    The control only helps where both amplitudes are close: at the larger powers of the
+    schedule ``sin^2((2k+1) theta)`` of distant amplitudes respond differently to the same
+    noise, the calibration then reports a small correlation.
+
+    Example:
+
+        >>> spec = ModelSpec.of(DerivativePricing, 1.0, 3, fractional_precision=5)
+        >>> cv = ControlVariate(spec, spec.replace(fractional_precision=3))
+        >>> cv.simulate_calibration(runs=20, shots=200)
+        >>> estimate, interval = cv.simulate(shots=200, seed=1)
+    '''
+
+    def __init__(self, spec: ModelSpec, control: ModelSpec, control_value: Optional[float] = None) -> None:
+        '''
+        Args:
+            spec: The model, see ``ModelSpec``.
+            control: The cheaper model, estimating approximately the same quantity.
+            control_value: The post processed value of ``control``. Defaults to its exact value,
+                simulated with ``SparseState``, see ``Greeks.price``.
+        '''
+        self.spec = spec
+        self.control = control
+        self.control_value = price(control) if control_value is None else float(control_value)
+        self.beta = None
+        self.correlation = None
+        '''Whether the calibration used common random numbers, see simulate_calibration'''
+        self.common_random_numbers = None
+
+    @property
+    def variance_reduction(self) -> float:
+        '''The factor ``1 - rho**2`` of the variance, and of the shots, of the corrected estimate.'''
+        if self.correlation is None:
+            raise ValueError('The control variate is not calibrated, call calibrate first.')
+        return 1 - self.correlation**2
+
+    def estimation_problems(self) -> list[EstimationProblem]:
+        '''The estimation problems of the model and of the control.'''
+        return [self.spec.estimation_problem(), self.control.estimation_problem()]
+
+    def circuits(self, measurement: bool = True) -> list[QuantumCircuit]:
+        '''The MLAE circuits of the model followed by those of the control.'''
+        circuits = []
+        for problem in self.estimation_problems():
+            circuits += construct_mlae_circuits(problem, measurement=measurement)
+        return circuits
+
+    def samples(self, circuit_results: Sequence[dict] | np.ndarray) -> tuple[float, float]:
+        '''The post processed estimates of the model and of the control from the results of
+        ``circuits``, one calibration sample.'''
+        problems = self.estimation_problems()
+        num_powers = len(circuit_results)//len(problems)
+        return tuple(float(problem.post_processing(compute_mle(circuit_results[index*num_powers:(index+1)*num_powers], problem)))
+                     for index, problem in enumerate(problems))
+
+    def calibrate(self, samples: Sequence[tuple[float, float]], common_random_numbers: bool = False) -> float:
+        '''Learns ``beta`` and the correlation from pairs of estimates of the model and of the
+        control, each pair from one run of ``circuits`` with the shots of the later estimates.
+
+        Args:
+            samples: The pairs of post processed estimates, see ``samples``.
+            common_random_numbers: Whether the pairs were sampled with common random numbers,
+                see ``simulate_samples``, and can only correct ``simulate``.
+
+        Returns:
+            The coefficient ``beta``.
+        '''
+        samples = np.asarray(samples, dtype=float)
+        if len(samples) < 3:
+            raise ValueError('At least 3 calibration samples are needed, got {}.'.format(len(samples)))
+        covariance = np.cov(samples, rowvar=False)
+        if covariance[1, 1] == 0:
+            raise ValueError('The control estimates do not vary, it can not be used as a control variate.')
+        self.beta = float(covariance[0, 1]/covariance[1, 1])
+        self.correlation = float(covariance[0, 1]/np.sqrt(covariance[0, 0]*covariance[1, 1])) if covariance[0, 0] > 0 else 0.0
+        self.common_random_numbers = common_random_numbers
+        return self.beta
+
+    def correct(self,
+                estimation: float,
+                control_estimation: float,
+                interval: Sequence[float],
+                control_interval: Sequence[float]) -> tuple[float, np.ndarray]:
+        '''The corrected estimate and its interval. The half widths ``h`` of the intervals of the
+        model and of the control, of the same confidence level, combine like the standard
+        deviations, ``h**2 = h_y**2 + beta**2 h_x**2 - 2 beta rho h_y h_x``: narrowed by the
+        square root of ``variance_reduction`` at the calibrated ``beta``, widened by the
+        control if the estimates are not correlated.'''
+        if self.beta is None:
+            raise ValueError('The control variate is not calibrated, call calibrate first.')
+        estimation = estimation - self.beta*(control_estimation - self.control_value)
+        model_width = (max(interval) - min(interval))/2
+        control_width = (max(control_interval) - min(control_interval))/2
+        variance = (model_width**2 + (self.beta*control_width)**2
+                    - 2*self.beta*self.correlation*model_width*control_width)
+        half_width = np.sqrt(max(variance, 0.0))
+        return float(estimation), np.array([estimation - half_width, estimation + half_width])
+
+    def results(self,
+                circuit_results: Sequence[dict] | np.ndarray,
+                alpha: float = 0.05) -> tuple[float, np.ndarray]:
+        '''The corrected estimate and confidence interval from the results of ``circuits``.'''
+        problems = self.estimation_problems()
+        num_powers = len(circuit_results)//2
+        estimations, intervals = [], []
+        for index, problem in enumerate(problems):
+            results = circuit_results[index*num_powers:(index+1)*num_powers]
+            estimation = compute_mle(results, problem)
+            _, all_counts = _get_counts(results, problem)
+            estimations.append(problem.post_processing(estimation))
+            intervals.append([problem.post_processing(bound) for bound in
+                              compute_confidence_interval(estimation, all_counts, alpha)])
+        return self.correct(estimations[0], estimations[1], intervals[0], intervals[1])
+
+    def run(self, backend, shots: int = 1000, alpha: float = 0.05, **transpile_options) -> tuple[float, np.ndarray]:
+        '''Runs the circuits of the model and of the control in one job, see ``results``. Needs
+        a calibration from backend runs, see ``run_calibration``.'''
+        if self.common_random_numbers is not False:
+            raise ValueError('run needs a calibration from backend runs, the common random numbers of '
+                             'simulate_calibration are not shared by separate runs, call run_calibration.')
+        job = backend.run(transpile(self.circuits(), backend, **transpile_options), shots=shots)
+        return self.results(job.result().get_counts(), alpha)
+
+    def run_samples(self, backend, runs: int, shots: int = 1000, **transpile_options) -> np.ndarray:
+        '''Calibration samples from ``runs`` executions of ``circuits`` on ``backend``, all in
+        one job of the circuits transpiled once.'''
+        circuits = transpile(self.circuits(), backend, **transpile_options)
+        counts = backend.run(circuits*runs, shots=shots).result().get_counts()
+        return np.array([self.samples(counts[run*len(circuits):(run+1)*len(circuits)]) for run in range(runs)])
+
+    def run_calibration(self, backend, runs: int = 20, shots: int = 1000, **transpile_options) -> float:
+        '''Calibrates from ``runs`` executions on ``backend``, see ``run_samples`` and ``calibrate``.'''
+        return self.calibrate(self.run_samples(backend, runs, shots, **transpile_options))
+
+    def simulate_samples(self, runs: int, shots: int = 1000, seed: Optional[int] = None) -> np.ndarray:
+        '''Noiseless calibration samples: per run the counts of the model and of the control
+        are drawn from the same uniforms, the common random numbers, see ``_coupled_counts``.'''
+        distributions = self._distributions()
+        rng = np.random.default_rng(seed)
+        samples = []
+        for _ in range(runs):
+            uniforms = rng.random((distributions[0].shape[0], shots))
+            samples.append(self.samples(np.vstack([_coupled_counts(distribution, uniforms)
+                                                   for distribution in distributions])))
+        return np.array(samples)
+
+    def simulate_calibration(self, runs: int = 20, shots: int = 1000, seed: Optional[int] = None) -> float:
+        '''Calibrates from ``runs`` noiseless runs, see ``simulate_samples`` and ``calibrate``.
+        The calibration only corrects ``simulate``.'''
+        return self.calibrate(self.simulate_samples(runs, shots, seed), common_random_numbers=True)
+
+    def simulate(self, shots: int = 1000, alpha: float = 0.05, seed: Optional[int] = None) -> tuple[float, np.ndarray]:
+        '''Noiseless counterpart of ``run`` with common random numbers. Needs a calibration with
+        common random numbers, see ``simulate_calibration``.'''
+        if self.common_random_numbers is not True:
+            raise ValueError('simulate needs a calibration with common random numbers, call '
+                             'simulate_calibration.')
+        distributions = self._distributions()
+        uniforms = np.random.default_rng(seed).random((distributions[0].shape[0], shots))
+        return self.results(np.vstack([_coupled_counts(distribution, uniforms) for distribution in distributions]), alpha)
+
+    def _distributions(self) -> list[np.ndarray]:
+        '''The exact outcome probabilities of the MLAE circuits of the model and of the control.'''
+        distributions = []
+        for problem in self.estimation_problems():
+            distribution = SparseState.from_circuit(problem.state_preparation).probabilities(problem.objective_qubits)
+            distributions.append(simulate_mlae_counts(problem, distribution=distribution))
+        return distributions
+
+
+def _coupled_counts(probabilities: np.ndarray, uniforms: np.ndarray) -> np.ndarray:
+    '''Counts of the outcomes of every circuit by inverse transform sampling of ``uniforms``, of
+    shape ``(circuits, shots)``. Two distributions sampled from the same uniforms give counts
+    that move together.'''
+    cdf = np.cumsum(probabilities, axis=1)
+    cdf[:, -1] = 1
+    return np.vstack([np.bincount(np.searchsorted(row, samples, side='right'), minlength=probabilities.shape[1])
+                      for row, samples in zip(cdf, uniforms)]).astype(float)
@@ -14,83 +14,112 @@ Copyright 2024 Jack Morgan
    limitations under the License.
 '''
 
-from .MarkovChain import MarkovChain
+from .MarkovChain import MarkovChain, markov_chain_gate
+from .LazyCircuit import LazyCircuit
+from .Payoffs import Payoff, call
+from .Approximation import adder_phases, pruned_phase, phase_tolerance, qft_dropped_phase, probability_error_bound
+from .Arithmetic import num_arithmetic_ancillas, qft_adder_gate, qft_gate, ripple_adder_gate
 
 # Importing standard Qiskit libraries
 from qiskit import QuantumCircuit
+from qiskit.circuit import Gate
 
-from qiskit.circuit.library import QFT, LinearAmplitudeFunction
+from qiskit.circuit.library import QFT, MCPhaseGate
 from typing import Optional
 import numpy as np
 
+'''Default volatility offsets and rates of the (good, bad) regimes'''
+SIGMA_OFF = [0.2, 0.3]
+RATES = [0.2, 0.1]
 
-class DerivativePricing(QuantumCircuit):   
+
+def default_volatility(time_steps: int, time_tot: float) -> np.ndarray:
+    '''The default volatility schedule, the offset of each regime plus a ramp of 1.2 per unit
+    of time capped at 0.1.'''
+    dt = time_tot/time_steps
+    return np.array(SIGMA_OFF)[:, None] + np.clip(1.2*np.arange(time_steps)*dt, 0, 0.1)
+
+
+def _schedule(values, time_steps: int, name: str) -> np.ndarray:
+    '''Broadcasts a scalar, a value per regime or a (2, time_steps) array to shape (2, time_steps)'''
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    try:
+        return np.broadcast_to(values, (2, time_steps))
+    except ValueError:
+        raise ValueError('{} must broadcast to shape (2, {}), got shape {}.'.format(name, time_steps, values.shape))
+
+
+class DerivativePricing(LazyCircuit):   
             
-        def _AdderBaseQFT(self, value):
+        def _Phases(self, value):
+            '''Yields (qubit, phase) of adding value in the QFT basis, skipping pruned phases'''
+            for i, lam in enumerate(adder_phases(value, self.num_size, self.fractional_precision)):
+                if abs(lam) > self.phase_tolerance:
+                    yield i, lam
+        
+        def _AdderBaseQFT(self, value, num_ctrl_qubits=0, ctrl_state=None):
             '''Adds the constant value to the price register in the QFT basis'''
-            circ_a = QuantumCircuit(self.num_size)
-            
-            for i in range(self.num_size):
-                lam = value * (2**self.fractional_precision) * np.pi / (2**(i))
-                circ_a.p(lam, i)
-            
-            return circ_a.to_gate(label='Add Value')
+            return qft_adder_gate(float(value), self.num_size, self.fractional_precision, self.phase_tolerance,
+                                  num_ctrl_qubits, ctrl_state)
         
-        def _MCBinTree(self):
-    
+        def increments(self):
+            '''Log price increments of the up and down moves, each of shape (2, time_steps)
+            indexed by regime and step, computed in one pass over the schedules'''
             dt = self.time_tot/self.time_steps
+            mu = self.rates - ((self.sigma**2)/2)
             
-            sigma_off = [0.2,0.3]
-            r = [0.2,0.1]
+            lu = (mu*dt)+(self.sigma*np.sqrt(dt))
+            ld = (mu*dt)-(self.sigma*np.sqrt(dt))
+            return lu, ld
+        
+        def _BinTreeIncrements(self):
+            '''Yields (step, control qubits, control state, increment) for every controlled
+            addition of the binomial tree. The controls are the regime qubit and the binomial
+            qubit of the step, if both regimes move by the same increment the addition is only
+            controlled on the binomial qubit'''
+            lu, ld = self.increments()
+            
+            for i in range(self.time_steps):
+                regime, binomial = i+1, self.time_steps+1+i
+                for move, values in [('0', lu[:, i]), ('1', ld[:, i])]:
+                    if values[0] == values[1]:
+                        yield i, [binomial], move, values[0]
+                    else:
+                        yield i, [regime, binomial], move+'0', values[0]
+                        yield i, [regime, binomial], move+'1', values[1]
         
+        def _MCBinTree(self):
         
             circ_b = QuantumCircuit(1+(2*self.time_steps)+self.num_size)
-    
-            for i in range(self.time_steps):
             
-                sigma = sigma_off[0]+min(max(1.2*i*dt,0),0.1)
-                mu = r[0] - ((sigma**2)/2)
-
-                lu = (mu*dt)+(sigma*np.sqrt(dt))
-                ld = (mu*dt)-(sigma*np.sqrt(dt))
-
-                lucirc = self._AdderBaseQFT(lu).control(num_ctrl_qubits=2, ctrl_state='00')
-                ldcirc = self._AdderBaseQFT(ld).control(num_ctrl_qubits=2, ctrl_state='10')
-
-                circ_b.append(lucirc, [i+1,self.time_steps+1+i]+list(range(-self.num_size,0,1)))
-                circ_b.append(ldcirc, [i+1,self.time_steps+1+i]+list(range(-self.num_size,0,1)))
-
-                sigma = sigma_off[1]+min(max(1.2*i*dt,0),0.1)
-                mu = r[1] - ((sigma**2)/2)
-
-                lu = (mu*dt)+(sigma*np.sqrt(dt))
-                ld = (mu*dt)-(sigma*np.sqrt(dt))
-
-                lucirc = self._AdderBaseQFT(lu).control(num_ctrl_qubits=2, ctrl_state='01')
-                ldcirc = self._AdderBaseQFT(ld).control(num_ctrl_qubits=2, ctrl_state='11')
-
-                circ_b.append(lucirc, [i+1,self.time_steps+1+i]+list(range(-self.num_size,0,1)))
-                circ_b.append(ldcirc, [i+1,self.time_steps+1+i]+list(range(-self.num_size,0,1)))
+            '''Steps with the same increments share their controlled adders'''
+            for i, ctrl_qubits, ctrl_state, value in self._BinTreeIncrements():
+                circ_b.append(self._AdderBaseQFT(value, len(ctrl_qubits), ctrl_state),
+                              ctrl_qubits+list(range(-self.num_size,0,1)))
+                
             return circ_b.to_gate(label='Price Evolution')
         
+        def _AddFlat(self, value, qubits, ctrl_qubits=None, ctrl_state=None):
+            '''Flat counterpart of _AdderBaseQFT: emits the phases of the addition directly
+            on ``qubits`` of this circuit, optionally controlled on ``ctrl_qubits``'''
+            for i, lam in self._Phases(value):
+                if ctrl_qubits is None:
+                    self.p(lam, qubits[i])
+                else:
+                    self.append(MCPhaseGate(lam, len(ctrl_qubits), ctrl_state=ctrl_state),
+                                list(ctrl_qubits)+[qubits[i]])
+        
         def _Payoff(self):
 
             f_max = ((2**(self.integer_precision+1))-(2.0**(-self.fractional_precision)))
-            po_max = f_max - self.strike_price
-            
-            circ_p = LinearAmplitudeFunction(
-                num_state_qubits=self.integer_precision+self.fractional_precision+1,
-                slope=[0,1],
-                offset=[0,0],
-                domain=(0, f_max),
-                image=(0, po_max),
-                breakpoints=[0,self.strike_price],
-                rescaling_factor=self.c_approx,
-            )
-            return circ_p
+            
+            return self.payoff.circuit(self.integer_precision+self.fractional_precision+1,
+                                       (0, f_max), self.c_approx)
         
         def __init__(self,
-            strike_price: float,
+            strike_price: Optional[float],
             time_steps: int,
             prob_gb: Optional[float] = 0.1,
             prob_bg: Optional[float] = 0.3,
@@ -98,9 +127,17 @@ class DerivativePricing(QuantumCircuit):
             fractional_precision: Optional[int] = 6,
             starting_price: Optional[float] = 1.0,
             time_tot: Optional[float] = 1/12,
-            r: Optional[float] = 0.1,
+            r: Optional[float] = None,
             c_approx: Optional[float] = 0.05,
-            name: Optional[str] = 'DP'
+            name: Optional[str] = 'DP',
+            lazy: Optional[bool] = False,
+            flatten: Optional[bool] = False,
+            approximation_degree: Optional[int] = 0,
+            sigma: Optional[np.ndarray] = None,
+            rates: Optional[np.ndarray] = None,
+            evolution: Optional[Gate] = None,
+            payoff: Optional[Payoff] = None,
+            arithmetic: Optional[str] = 'qft',
             ) -> None:               
                 
         
@@ -111,41 +148,166 @@ class DerivativePricing(QuantumCircuit):
             self.num_size = integer_precision+fractional_precision+1
             self.starting_price = starting_price
             self.time_tot = time_tot
-            self.r = r
             self.c_approx = c_approx
             self.f_max = ((2**self.integer_precision)-(2.0**(-self.fractional_precision)))
             
-            payoff = self._Payoff()
-            qubits = 1+(2*time_steps)+payoff.num_qubits
+            self.prob_gb = prob_gb
+            self.prob_bg = prob_bg
             
-            self.post_processing = payoff.post_processing
-            self.objective = qubits-payoff.num_ancillas-1
+            '''Volatility and rate per regime (good, bad) and step, either scalars, one value
+            per regime or one row of time_steps values per regime. The legacy scalar rate r
+            is the same rate in both regimes'''
+            if sigma is None:
+                sigma = default_volatility(time_steps, time_tot)
+            if r is not None and rates is not None:
+                raise ValueError('Give either the rate r or the rates schedule, not both.')
+            if rates is None:
+                rates = RATES if r is None else r
+            self.sigma = _schedule(sigma, time_steps, 'sigma')
+            self.rates = _schedule(rates, time_steps, 'rates')
             
-            circ = QuantumCircuit(qubits)
+            '''Shared price evolution, see price_evolution'''
+            self._evolution = evolution
             
-            circ.append(MarkovChain(time_steps,prob_gb,prob_bg).to_gate(),range(time_steps+1)) #prepare Markov Chain
+            '''The payoff as data, see Payoffs. Defaults to a call at strike_price, which is None
+            when the payoff is given'''
+            if (payoff is None) == (strike_price is None):
+                raise ValueError('Give either strike_price or payoff, got {} and {}.'.format(strike_price, payoff))
+            self.payoff = payoff if payoff is not None else call(strike_price)
             
-            circ.h(range(1+time_steps,1+(2*time_steps))) #prepare binomial tree
+            self._payoff = self._Payoff()
+            qubits = 1+(2*time_steps)+self._payoff.num_qubits
+            
+            self.post_processing = self._payoff.post_processing
+            self.objective = qubits-self._payoff.num_ancillas-1
+            
+            '''Approximation: both QFTs drop their smallest rotations and the adders their
+            phases below the same angle, see error_bound'''
+            self.approximation_degree = approximation_degree
+            self.phase_tolerance = phase_tolerance(self.num_size, approximation_degree)
+            
+            '''Arithmetic of the price register, see Arithmetic. The ancillas of the ripple-carry
+            adders follow the qubits of the payoff'''
+            self.arithmetic = arithmetic
+            self.num_arithmetic_ancillas = num_arithmetic_ancillas(arithmetic, self.num_size, approximation_degree)
+            
+            super().__init__(qubits+self.num_arithmetic_ancillas, name=name, lazy=lazy, flatten=flatten)
+        
+        def _EvolutionQubits(self):
+            '''Qubits of price_evolution: the Markov chain, the binomial tree, the price register
+            and the ancillas of the arithmetic'''
+            qubits = self.num_qubits
+            return list(range(1+(2*self.time_steps)+self.num_size))+list(range(qubits-self.num_arithmetic_ancillas,qubits))
+        
+        def _RippleAdditions(self):
+            '''Yields (control qubits, values) of every addition of the ripple-carry arithmetic, see
+            ripple_adder_gate. A step of the binomial tree adds one of its four increments, selected
+            by the regime and the binomial qubit, with a single adder'''
+            lu, ld = self.increments()
+            yield [], (float(np.log(self.starting_price)),)
+            for i in range(self.time_steps):
+                yield [i+1, self.time_steps+1+i], (lu[0, i], lu[1, i], ld[0, i], ld[1, i])
+            yield [], (1.0,)
+            
+        def price_evolution(self):
+            '''The gate preparing the Markov chain, the binomial tree and the price register, i.e.
+            the circuit before the payoff. Instances that only differ in the strike can share it
+            through the ``evolution`` argument.'''
+            if self._evolution is None and self.arithmetic == 'ripple':
+                time_steps = self.time_steps
+                circ = QuantumCircuit(1+(2*time_steps)+self.num_size+self.num_arithmetic_ancillas)
+                register = list(range(1+(2*time_steps),circ.num_qubits))
+                
+                circ.append(markov_chain_gate(time_steps,self.prob_gb,self.prob_bg),range(time_steps+1))
+                circ.h(range(1+time_steps,1+(2*time_steps)))
+                for ctrl_qubits, values in self._RippleAdditions():
+                    circ.append(ripple_adder_gate(tuple(values), self.num_size, self.fractional_precision),
+                                ctrl_qubits+register)
+                
+                self._evolution = circ.to_gate(label='Evolution')
+            
+            if self._evolution is None:
+                time_steps = self.time_steps
+                circ = QuantumCircuit(1+(2*time_steps)+self.num_size)
+            
+                circ.append(markov_chain_gate(time_steps,self.prob_gb,self.prob_bg),range(time_steps+1)) #prepare Markov Chain
+            
+                circ.h(range(1+time_steps,1+(2*time_steps))) #prepare binomial tree
 
-            circ.append(QFT(self.num_size,0,do_swaps=False, inverse=False, insert_barriers=False).to_gate(), 
-                        range(1+(2*time_steps),1+(2*time_steps)+self.num_size)) #switch price register to base QFT
+                circ.append(qft_gate(self.num_size,self.approximation_degree,False), 
+                            range(1+(2*time_steps),1+(2*time_steps)+self.num_size)) #switch price register to base QFT
 
-            '''Note: We calculate exolution of the price in log space,
-            then convert at the end using e^x approx 1+x'''
-            circ.append(self._AdderBaseQFT(np.log(starting_price)),
-                        range(1+(2*time_steps),1+(2*time_steps)+self.num_size)) 
+                '''Note: We calculate exolution of the price in log space,
+                then convert at the end using e^x approx 1+x'''
+                circ.append(self._AdderBaseQFT(np.log(self.starting_price)),
+                            range(1+(2*time_steps),1+(2*time_steps)+self.num_size)) 
 
-            circ.append(self._MCBinTree(),
-                        range(1+(2*time_steps)+self.num_size))
+                circ.append(self._MCBinTree(),
+                            range(1+(2*time_steps)+self.num_size))
 
-            circ.append(self._AdderBaseQFT(1),
-                        range(1+(2*time_steps),1+(2*time_steps)+self.num_size)) #converts to normal space
+                circ.append(self._AdderBaseQFT(1),
+                            range(1+(2*time_steps),1+(2*time_steps)+self.num_size)) #converts to normal space
+            
+                circ.append(qft_gate(self.num_size,self.approximation_degree,True), 
+                            range(1+(2*time_steps),1+(2*time_steps)+self.num_size)) #converts to computational basis
+                
+                self._evolution = circ.to_gate(label='Evolution')
+            return self._evolution
+        
+        def _build(self):
+            
+            time_steps = self.time_steps
+            payoff = self._payoff
+            qubits = self.num_qubits-self.num_arithmetic_ancillas
+            
+            if self.flatten and self._evolution is not None:
+                self._inline(self._evolution.definition, self._EvolutionQubits())
+                self._inline(payoff, range(1+(2*time_steps),qubits))
+                return
             
-            circ.append(QFT(self.num_size,0,do_swaps=False, inverse=True, insert_barriers=False).to_gate(), 
-                        range(1+(2*time_steps),1+(2*time_steps)+self.num_size)) #converts to computational basis 
+            if self.flatten and self.arithmetic == 'ripple':
+                register = self._EvolutionQubits()[1+(2*time_steps):]
+                
+                self._inline(MarkovChain(time_steps,self.prob_gb,self.prob_bg,flatten=True), range(time_steps+1))
+                self.h(range(1+time_steps,1+(2*time_steps)))
+                for ctrl_qubits, values in self._RippleAdditions():
+                    self._inline(ripple_adder_gate(tuple(values), self.num_size, self.fractional_precision).definition,
+                                 ctrl_qubits+register)
+                self._inline(payoff, range(1+(2*time_steps),qubits))
+                return
+            
+            if self.flatten:
+                price = list(range(1+(2*time_steps),1+(2*time_steps)+self.num_size))
+                
+                self._inline(MarkovChain(time_steps,self.prob_gb,self.prob_bg,flatten=True), range(time_steps+1))
+                self.h(range(1+time_steps,1+(2*time_steps)))
+                self._inline(QFT(self.num_size,self.approximation_degree,do_swaps=False, inverse=False, insert_barriers=False), price)
+                self._AddFlat(np.log(self.starting_price), price)
+                for i, ctrl_qubits, ctrl_state, value in self._BinTreeIncrements():
+                    self._AddFlat(value, price, ctrl_qubits, ctrl_state)
+                self._AddFlat(1, price)
+                self._inline(QFT(self.num_size,self.approximation_degree,do_swaps=False, inverse=True, insert_barriers=False), price)
+                self._inline(payoff, range(1+(2*time_steps),qubits))
+                return
+            
+            circ = QuantumCircuit(self.num_qubits)
+            
+            circ.append(self.price_evolution(), self._EvolutionQubits())
 
             circ.append(payoff.to_gate(),
                         list(range(1+(2*time_steps),qubits))) #peicewise function = price - strike price if price > strike price
          
-            super().__init__(circ.num_qubits, name=name)
             self.append(circ.to_gate(),self.qubits)
+        
+        def error_bound(self) -> float:
+            '''Bound on the error of the price, after post processing, caused by the approximate
+            QFTs and the pruned phases. The bound holds for this circuit, a Grover power k
+            applies it 2k+1 times. The ripple-carry arithmetic is exact on the grid of the
+            register, its bound is 0.'''
+            if self.arithmetic == 'ripple':
+                return 0.0
+            values = [np.log(self.starting_price), 1]+[value for *_, value in self._BinTreeIncrements()]
+            dropped = (2*qft_dropped_phase(self.num_size, self.approximation_degree)
+                       + pruned_phase(values, self.num_size, self.fractional_precision, self.phase_tolerance))
+            error = probability_error_bound(dropped)
+            return abs(self.post_processing(error) - self.post_processing(0))
@@ -19,35 +19,100 @@ import numpy as np
 import math
 from qiskit import QuantumRegister, ClassicalRegister
 from qiskit.circuit.library.arithmetic import PolynomialPauliRotations, WeightedAdder
-from qiskit.circuit.library import QFT
+from qiskit.circuit.library import QFT, CPhaseGate
 from typing import Optional
 from qiskit.circuit.library.arithmetic import IntegerComparator
 
-from .MarkovChain import MarkovChain
+from .MarkovChain import MarkovChain, markov_chain_gate
+from .MultiRegimeMarkovChain import _binary_tree_angles, _append_tree
+from .LazyCircuit import LazyCircuit, memoized_gate
+from .Approximation import adder_phases, pruned_phase, phase_tolerance, qft_dropped_phase, probability_error_bound
+from .Arithmetic import num_arithmetic_ancillas, qft_adder_gate, qft_gate, ripple_adder_gate
 
-class DynamicCreditRisk(QuantumCircuit):
+
+@memoized_gate(maxsize=256)
+def _growths_gate(growth_possibilities: tuple, num_qubits: int, fractional_precision: int, tolerance: float):
+    '''Memoized growth of one step, controlled by its regime. Models that only differ in their
+    regime probabilities, e.g. the scenarios of a stress test, share it'''
+    circ_g = QuantumCircuit(num_qubits+1)
+    for ctrl in [0,1]:
+        if growth_possibilities[ctrl] != 0:
+            circ_g.append(qft_adder_gate(float(growth_possibilities[ctrl]), num_qubits, fractional_precision, tolerance,
+                                          1, ctrl), circ_g.qubits)
+    return circ_g.to_gate(label='Add_growth')
+
+
+def count_distribution(time_steps, prob_gb, prob_bg):
+    '''Exact joint distribution of the final regime and the number of bad steps among the
+    time steps 1..T, of shape (2, T+1), or (..., 2, T+1) for arrays of probabilities'''
+    prob_gb, prob_bg = np.asarray(prob_gb, dtype=float)[..., None], np.asarray(prob_bg, dtype=float)[..., None]
+    good = np.zeros(np.broadcast_shapes(prob_gb.shape, prob_bg.shape)[:-1]+(time_steps+1,))
+    bad = good.copy()
+    good[..., :1], bad[..., :1] = prob_bg/(prob_gb+prob_bg), prob_gb/(prob_gb+prob_bg)
+    for _ in range(time_steps):
+        good, bad = good*(1-prob_gb) + bad*prob_bg, np.roll(good*prob_gb + bad*(1-prob_bg), 1, axis=-1)
+    return np.stack([good, bad], axis=-2)
+
+class DynamicCreditRisk(LazyCircuit):
+    def _Phases(self, value):
+        '''Yields (qubit, phase) of adding value in the QFT basis, skipping pruned phases'''
+        for i, lam in enumerate(adder_phases(value, self.num_sum_qubits, self.fractional_precision)):
+            if abs(lam) > self.phase_tolerance:
+                yield i, lam
+    
     def _AdderBaseQFT(self, value):
-        circ_a = QuantumCircuit(self.num_sum_qubits)
-        for i in range(self.num_sum_qubits):
-            lam = value * np.pi * 2**(self.fractional_precision - i)
-            circ_a.p(lam, i)   
-        return circ_a.to_gate(label='Add_value')
+        return qft_adder_gate(float(value), self.num_sum_qubits, self.fractional_precision, self.phase_tolerance)
     
     def _OneStepGrowths(self):
-        circ_g = QuantumCircuit(self.num_sum_qubits+1)
-        for ctrl in [0,1]:
-            if self.growth_possibilities[ctrl] != 0:
-                add = self._AdderBaseQFT(self.growth_possibilities[ctrl])
-                circ_g.append(add.control(ctrl_state=ctrl), circ_g.qubits)
+        return _growths_gate(tuple(float(growth) for growth in self.growth_possibilities[:2]), self.num_sum_qubits,
+                             self.fractional_precision, self.phase_tolerance)
+    
+    def _CountGrowths(self):
+        '''Adds the growth of all steps from the count c of bad steps in the count encoding:
+        T*growth_0 + c*(growth_1-growth_0), with one controlled adder per bit of c'''
+        circ_g = QuantumCircuit(self.num_count_qubits+self.num_sum_qubits)
+        sum_register = list(range(self.num_count_qubits,circ_g.num_qubits))
+        
+        step = self.growth_possibilities[1]-self.growth_possibilities[0]
+        circ_g.append(self._AdderBaseQFT(self.time_steps*self.growth_possibilities[0]), sum_register)
+        if step != 0:
+            for j in range(self.num_count_qubits):
+                circ_g.append(self._AdderBaseQFT(step*2**j).control(), [j]+sum_register)
         return circ_g.to_gate(label='Add_growth')
     
+    def count_distribution(self):
+        '''Exact joint distribution of the final regime and the number of bad steps among the
+        time steps 1..T, as an array of shape (2, T+1)'''
+        return count_distribution(self.time_steps, self.prob_gb, self.prob_bg)
+    
+    def _CountChain(self, circ):
+        '''Prepares the count encoding: the number of bad steps on the first qubits and the
+        final regime on the next one'''
+        amplitudes = np.zeros((2, 2**self.num_count_qubits))
+        amplitudes[:, :self.time_steps+1] = self.count_distribution()
+        _append_tree(circ, _binary_tree_angles(amplitudes.reshape(1, -1)), list(range(self.num_count_qubits+1)))
+    
+    def _AddFlat(self, value, qubits, ctrl_qubit=None, ctrl_state=None):
+        '''Flat counterpart of _AdderBaseQFT: emits the phases of the addition directly
+        on ``qubits`` of this circuit, optionally controlled on ``ctrl_qubit``'''
+        for i, lam in self._Phases(value):
+            if ctrl_qubit is None:
+                self.p(lam, qubits[i])
+            else:
+                self.append(CPhaseGate(lam, ctrl_state=ctrl_state), [ctrl_qubit, qubits[i]])
+    
     def __init__(self,
                  loss: int,
                  time_steps: int,
                  prob_gb: Optional[float] = 0.009708737864077669,
                  prob_bg: Optional[float] = 0.1111111111111111,
                  growth_possibilities: Optional[list] = [0.771,0],
-                 fractional_precision:Optional[int] = 2):
+                 fractional_precision:Optional[int] = 2,
+                 lazy: Optional[bool] = False,
+                 flatten: Optional[bool] = False,
+                 encoding: Optional[str] = 'path',
+                 approximation_degree: Optional[int] = 0,
+                 arithmetic: Optional[str] = 'qft'):
         
         self.num_sum_qubits = 2+fractional_precision+math.ceil(np.log2(growth_possibilities[0]*time_steps))
         self.fractional_precision = fractional_precision
@@ -57,18 +122,132 @@ class DynamicCreditRisk(QuantumCircuit):
         
         smallest_increment = min(non_zeros, key=abs)
         self.scaled_loss = loss+(2**(-fractional_precision-1)*smallest_increment)
+        self.loss = loss
+        self.prob_gb = prob_gb
+        self.prob_bg = prob_bg
+        
+        '''The path encoding holds the regime of every step, one qubit each. The loss only depends
+        on the number of bad steps, so the count encoding holds that number on log2(T+1) qubits
+        followed by the final regime'''
+        if encoding not in ['path', 'count']:
+            raise ValueError("encoding must be 'path' or 'count', got {}".format(encoding))
+        self.encoding = encoding
+        self.num_count_qubits = max(1, math.ceil(np.log2(time_steps+1)))
+        
+        if encoding == 'path':
+            qubits = time_steps+1+self.num_sum_qubits
+        else:
+            qubits = self.num_count_qubits+1+self.num_sum_qubits
+        self.objective = qubits-1  #qubit to measure and/or objective in QAE
         
+        '''Approximation: the inverse QFT drops its smallest rotations and the adders their
+        phases below the same angle, see error_bound'''
+        self.approximation_degree = approximation_degree
+        self.phase_tolerance = phase_tolerance(self.num_sum_qubits, approximation_degree)
+        
+        '''Arithmetic of the sum register, see Arithmetic. The ancillas of the ripple-carry adders
+        follow the sum register'''
+        self.arithmetic = arithmetic
+        self.num_arithmetic_ancillas = num_arithmetic_ancillas(arithmetic, self.num_sum_qubits, approximation_degree)
+        
+        super().__init__(qubits+self.num_arithmetic_ancillas, name = str(loss)+'_loss_'+str(time_steps)+'_steps', lazy=lazy, flatten=flatten)
+        
+    def _RippleAdditions(self):
+        '''Yields (control qubits, values) of every addition of the ripple-carry arithmetic, see
+        ripple_adder_gate. The growth of a step, selected by its regime, is one adder'''
+        if self.encoding == 'count':
+            yield [], (self.time_steps*self.growth_possibilities[0],)
+            step = self.growth_possibilities[1]-self.growth_possibilities[0]
+            for j in range(self.num_count_qubits):
+                yield [j], (0.0, step*2**j)
+        else:
+            for i in range(1, self.time_steps+1):
+                yield [i], tuple(self.growth_possibilities)
+        yield [], (-self.scaled_loss,)
+    
+    def _BuildRipple(self):
+        num_chain = self.num_count_qubits+1 if self.encoding == 'count' else self.time_steps+1
+        register = list(range(num_chain,self.num_qubits))
+        
+        if self.flatten:
+            if self.encoding == 'count':
+                self._CountChain(self)
+            else:
+                self._inline(MarkovChain(self.time_steps, self.prob_gb, self.prob_bg, flatten=True), range(num_chain))
+            for ctrl_qubits, values in self._RippleAdditions():
+                self._inline(ripple_adder_gate(tuple(values), self.num_sum_qubits, self.fractional_precision).definition,
+                             ctrl_qubits+register)
+            return
+        
+        circ = QuantumCircuit(self.num_qubits)
+        if self.encoding == 'count':
+            M = QuantumCircuit(num_chain, name='MC count')
+            self._CountChain(M)
+            circ.append(M.to_gate(), range(num_chain))
+        else:
+            circ.append(markov_chain_gate(self.time_steps, self.prob_gb, self.prob_bg), range(num_chain))
+        for ctrl_qubits, values in self._RippleAdditions():
+            circ.append(ripple_adder_gate(tuple(values), self.num_sum_qubits, self.fractional_precision),
+                        ctrl_qubits+register)
+        self.append(circ.to_gate(),range(circ.num_qubits))
+    
+    def _build(self):
+        
+        if self.arithmetic == 'ripple':
+            self._BuildRipple()
+            return
+        
+        if self.encoding == 'count':
+            num_chain = self.num_count_qubits+1
+            sum_register = list(range(num_chain,self.num_qubits))
+            
+            if self.flatten:
+                self._CountChain(self)
+                self.h(sum_register)
+                self._AddFlat(self.time_steps*self.growth_possibilities[0], sum_register)
+                step = self.growth_possibilities[1]-self.growth_possibilities[0]
+                if step != 0:
+                    for j in range(self.num_count_qubits):
+                        self._AddFlat(step*2**j, sum_register, j, 1)
+                self._AddFlat(-self.scaled_loss, sum_register)
+                self._inline(QFT(self.num_sum_qubits,self.approximation_degree,do_swaps=False, inverse=True, insert_barriers=False), sum_register)
+                return
+            
+            M = QuantumCircuit(num_chain, name='MC count')
+            self._CountChain(M)
+            
+            circ = QuantumCircuit(self.num_qubits)
+            circ.append(M.to_gate(), range(num_chain))
+            circ.h(sum_register)
+            circ.append(self._CountGrowths(), list(range(self.num_count_qubits))+sum_register)
+            circ.append(self._AdderBaseQFT(-self.scaled_loss), sum_register)
+            circ.append(QFT(self.num_sum_qubits,self.approximation_degree,do_swaps=False, inverse=True, insert_barriers=False).to_gate(), sum_register)
+            
+            self.append(circ.to_gate(),range(circ.num_qubits))
+            return
+        
+        if self.flatten:
+            sum_register = list(range(self.time_steps+1,self.num_qubits))
+            
+            self._inline(MarkovChain(self.time_steps, self.prob_gb, self.prob_bg, flatten=True), range(self.time_steps+1))
+            self.h(sum_register)
+            for i in range(1, self.time_steps+1):
+                for ctrl in [0,1]:
+                    if self.growth_possibilities[ctrl] != 0:
+                        self._AddFlat(self.growth_possibilities[ctrl], sum_register, i, ctrl)
+            self._AddFlat(-self.scaled_loss, sum_register)
+            self._inline(QFT(self.num_sum_qubits,self.approximation_degree,do_swaps=False, inverse=True, insert_barriers=False), sum_register)
+            return
                  
-        M = MarkovChain(time_steps, prob_gb, prob_bg).to_gate()
+        M = markov_chain_gate(self.time_steps, self.prob_gb, self.prob_bg)
         
-        iQ = QFT(self.num_sum_qubits,0,do_swaps=False, inverse=True, insert_barriers=False).to_gate()
+        iQ = qft_gate(self.num_sum_qubits,self.approximation_degree,True)
         
         C = self._AdderBaseQFT(-self.scaled_loss)
         
         circ = QuantumCircuit(M.num_qubits+self.num_sum_qubits)
-        self.objective = circ.num_qubits-1  #qubit to measure and/or objective in QAE
         
-        circ.append(M, qargs=range(time_steps+1)) #prepare Markov Chain Qubits
+        circ.append(M, qargs=range(self.time_steps+1)) #prepare Markov Chain Qubits
         
         #circ.append(Q, qargs=list(range(M.num_qubits,M.num_qubits+self.num_sum_qubits)))
         circ.h(list(range(M.num_qubits,M.num_qubits+self.num_sum_qubits)))
@@ -82,5 +261,22 @@ class DynamicCreditRisk(QuantumCircuit):
         #circ.append(C.to_gate(), qargs=list(range(M.num_qubits,M.num_qubits+C.num_qubits))) #Compare the sum of the losses to our input value
         #circ.h(list(range(M.num_qubits,M.num_qubits+self.num_sum_qubits)))
         
-        super().__init__(circ.num_qubits, name = str(loss)+'_loss_'+str(time_steps)+'_steps')
         self.append(circ.to_gate(),range(circ.num_qubits))       
+    
+    def error_bound(self) -> float:
+        '''Bound on the error of the probability of the objective qubit, i.e. of the probability
+        that the loss exceeds ``loss``, caused by the approximate QFT and the pruned phases.
+        The bound holds for this circuit, a Grover power k applies it 2k+1 times. The
+        ripple-carry arithmetic is exact on the grid of the register, its bound is 0.'''
+        if self.arithmetic == 'ripple':
+            return 0.0
+        growths = self.growth_possibilities
+        if self.encoding == 'count':
+            step = growths[1]-growths[0]
+            values = [self.time_steps*growths[0]]+[step*2**j for j in range(self.num_count_qubits) if step != 0]
+        else:
+            values = [growth for growth in growths if growth != 0]*self.time_steps
+        values.append(-self.scaled_loss)
+        dropped = (qft_dropped_phase(self.num_sum_qubits, self.approximation_degree)
+                   + pruned_phase(values, self.num_sum_qubits, self.fractional_precision, self.phase_tolerance))
+        return probability_error_bound(dropped)
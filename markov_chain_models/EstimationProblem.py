@@ -118,7 +118,7 @@ class EstimationProblem:
             Handle to the ``is_good_state`` callable.
         """
         if self._is_good_state is None:
-            return lambda x: all(bit == "1" for bit in x)
+            return _all_ones
 
         return self._is_good_state
 
@@ -190,21 +190,34 @@ class EstimationProblem:
         objective_qubits = self.objective_qubits + [num_qubits]
 
         # add the scaling qubit to the good state qualifier
-        def is_good_state(bitstr):
-            # pylint: disable=not-callable
-            return self.is_good_state(bitstr[1:]) and bitstr[0] == "1"
+        is_good_state = _ScaledGoodState(self.is_good_state)
 
         # rescaled estimation problem
         problem = EstimationProblem(
             rescaled_stateprep,
             objective_qubits=objective_qubits,
-            post_processing=self.post_processing,
+            post_processing=self._post_processing,
             is_good_state=is_good_state,
         )
 
         return problem
 
 
+def _all_ones(bitstr: str) -> bool:
+    return all(bit == "1" for bit in bitstr)
+
+
+class _ScaledGoodState:
+    """Good state qualifier of a rescaled problem, a class rather than a closure so that the
+    problem can be pickled."""
+
+    def __init__(self, is_good_state: Callable[[str], bool]) -> None:
+        self.is_good_state = is_good_state
+
+    def __call__(self, bitstr: str) -> bool:
+        return self.is_good_state(bitstr[1:]) and bitstr[0] == "1"
+
+
 def _rescale_amplitudes(circuit: QuantumCircuit, scaling_factor: float) -> QuantumCircuit:
     r"""Uses an auxiliary qubit to scale the amplitude of :math:`|1\rangle` by ``scaling_factor``.
 
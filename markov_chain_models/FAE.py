@@ -0,0 +1,138 @@
+"""This code was adapted from the FasterAmplitudeEstimation of qiskit_algorithms 0.3.0 (which is
+no longer supported) to run on the estimation problems of this package. The original code can be
+referenced at https://qiskit-community.github.io/qiskit-algorithms/_modules/qiskit_algorithms/amplitude_estimators/fae.html"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from .GroverSampler import AmplitudeEstimate, GroverSampler
+
+if TYPE_CHECKING:
+    from .EstimationProblem import EstimationProblem
+
+'''Amplitude scaling of the auxiliary qubit, see ``EstimationProblem.rescale``'''
+SCALING_FACTOR = 0.25
+
+
+class FasterAmplitudeEstimation:
+    r"""Faster Amplitude Estimation [1].
+
+    The problem is rescaled with ``EstimationProblem.rescale`` so that
+    :math:`\theta \leq \arcsin(1/4)`. In the first stage the powers :math:`2^{j-1}` are run
+    until the interval of :math:`\theta` is narrow enough to fix the branch of
+    :math:`\cos((2^{j+1}+2)\theta)`. From then on every iteration estimates both the cosine and
+    the sine of the doubled angle, so the interval of :math:`\theta` halves per iteration with a
+    fixed number of shots, until the amplitude is known to ``epsilon_target``.
+
+    References:
+        [1]: K. Nakaji. Faster Amplitude Estimation, 2020;
+            `arXiv:2002.02417 <https://arxiv.org/pdf/2003.02417.pdf>`_
+    """
+
+    def __init__(
+        self,
+        epsilon_target: float = 0.01,
+        alpha: float = 0.05,
+        *,
+        shots: tuple[int, int],
+        maxiter: Optional[int] = None,
+    ) -> None:
+        r"""
+        Args:
+            epsilon_target: Target half width of the confidence interval of the amplitude.
+            alpha: Confidence level, the interval holds the amplitude with probability
+                ``1 - alpha`` given the shots of ``guaranteed``.
+            shots: Shots per circuit in the first and in the second stage. The second stage
+                doubles the Grover power every iteration with these shots, so a few hundred
+                already cost about 10^5-10^6 oracle calls, see ``guaranteed`` for the shots
+                of [1].
+            maxiter: Maximal number of iterations. Defaults to the number of second stage
+                iterations that reaches ``epsilon_target`` in the worst case.
+        """
+        if not 0 < epsilon_target <= 0.5:
+            raise ValueError("The target epsilon must be in (0, 0.5], got {}.".format(epsilon_target))
+        if not 0 < alpha < 1:
+            raise ValueError("The confidence level alpha must be in (0, 1), got {}.".format(alpha))
+        if len(shots) != 2 or min(shots) < 1:
+            raise ValueError("shots must be two positive numbers of shots, got {}.".format(shots))
+
+        self.epsilon_target = epsilon_target
+        self.alpha = alpha
+        self.shots = tuple(int(num_shots) for num_shots in shots)
+        self.maxiter = maxiter if maxiter is not None else self._maxiter(epsilon_target)
+
+        # every cosine estimate holds with probability 1 - delta, two per iteration
+        self.delta = alpha / (2 * self.maxiter)
+
+    @staticmethod
+    def _maxiter(epsilon_target: float) -> int:
+        # the half width of theta is pi/3/(2^(j+1)+2) and a = 16 sin^2(theta) has slope below 8
+        return max(2, int(np.ceil(np.log2(8 * np.pi / 3 / epsilon_target))))
+
+    @classmethod
+    def guaranteed(cls, epsilon_target: float = 0.01, alpha: float = 0.05,
+                   maxiter: Optional[int] = None) -> FasterAmplitudeEstimation:
+        """The estimator with the shots of [1] for the confidence level of one cosine estimate,
+        whose interval holds with probability ``1 - alpha``. They are conservative, at
+        ``epsilon_target=0.005`` an estimate costs 10^7 oracle calls."""
+        maxiter = maxiter if maxiter is not None else cls._maxiter(epsilon_target)
+        delta = alpha / (2 * maxiter)
+        shots = (int(1944 * np.log(2 / delta)), int(972 * np.log(2 / delta)))
+        return cls(epsilon_target, alpha, shots=shots, maxiter=maxiter)
+
+    def estimate(self, estimation_problem: EstimationProblem, sampler: Optional[GroverSampler] = None) -> AmplitudeEstimate:
+        """Estimates the amplitude of ``estimation_problem``.
+
+        Args:
+            estimation_problem: The estimation problem.
+            sampler: Runs the circuits, see ``GroverSampler``. Defaults to noiseless sampling.
+
+        Returns:
+            The estimate, its confidence interval and the number of oracle queries.
+        """
+        sampler = sampler or GroverSampler()
+        queries = sampler.num_oracle_queries
+        rescaled = estimation_problem.rescale(SCALING_FACTOR)
+        powers, shots = [], []
+
+        def cos_estimate(power, num_shots):
+            powers.append(power)
+            shots.append(num_shots)
+            return 1 - 2 * sampler(rescaled, power, num_shots) / num_shots
+
+        def chernoff(cos, num_shots):
+            width = np.sqrt(np.log(2 / self.delta) * 12 / num_shots)
+            return [max(-1.0, cos - width), min(1.0, cos + width)]
+
+        def to_amplitude(theta):
+            return (np.sin(theta) / SCALING_FACTOR) ** 2
+
+        theta_ci = [0.0, np.arcsin(SCALING_FACTOR)]
+        first_stage = True
+        for j in range(1, self.maxiter + 1):
+            if first_stage:
+                cos_ci = chernoff(cos_estimate(2 ** (j - 1), self.shots[0]), self.shots[0])
+                theta_ci = [np.arccos(x) / (2 ** (j + 1) + 2) for x in cos_ci[::-1]]
+
+                if 2 ** (j + 1) * theta_ci[1] >= 3 * np.pi / 8 and j < self.maxiter:
+                    j_0 = j
+                    v = 2 ** j * np.sum(theta_ci)
+                    first_stage = False
+            else:
+                cos = cos_estimate(2 ** (j - 1), self.shots[1])
+                cos_2 = cos_estimate(2 ** (j - 1) + 2 ** (j_0 - 1), self.shots[1])
+                sin = (cos * np.cos(v) - cos_2) / np.sin(v)
+                rho = np.arctan2(sin, cos)
+                n = int(((2 ** (j + 1) + 2) * theta_ci[1] - rho + np.pi / 3) / (2 * np.pi))
+
+                theta_ci = [(2 * np.pi * n + rho + sign * np.pi / 3) / (2 ** (j + 1) + 2) for sign in [-1, 1]]
+
+            a_interval = sorted(min(1.0, to_amplitude(theta)) for theta in theta_ci)
+            if a_interval[1] - a_interval[0] <= 2 * self.epsilon_target:
+                break
+
+        return AmplitudeEstimate.of(estimation_problem, min(1.0, to_amplitude(np.mean(theta_ci))),
+                                    tuple(a_interval), sampler.num_oracle_queries - queries, powers, shots)
@@ -0,0 +1,125 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+from concurrent.futures import Executor
+from itertools import repeat
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .ModelSpec import ModelSpec
+from .MLAE import compute_mle, simulate_mlae_counts, _get_counts
+from .SparseState import SparseState
+
+'''Default absolute bump of every parameter'''
+BUMPS = {'starting_price': 0.01, 'sigma': 0.01, 'rates': 0.01, 'prob_gb': 0.005, 'prob_bg': 0.005}
+
+'''Parameters of the usual Greeks of DerivativePricing'''
+GREEKS = {'delta': 'starting_price', 'vega': 'sigma', 'rho': 'rates'}
+
+'''Legacy arguments a parameter is derived from, dropped when the parameter is bumped'''
+DERIVED = {'rates': 'r'}
+
+
+def price(spec: ModelSpec, shots: Optional[int] = None, seed: Optional[int] = None) -> float:
+    '''The post processed amplitude of a model, exact if ``shots`` is None and otherwise the
+    MLE of MLAE counts sampled with ``seed``, see ``simulate_mlae_counts``. The state is
+    simulated with ``SparseState``, the models only populate a small part of their registers.'''
+    problem = spec.estimation_problem()
+    distribution = SparseState.from_circuit(problem.state_preparation).probabilities(problem.objective_qubits)
+    if shots is None:
+        good, total = _get_counts(simulate_mlae_counts(problem, distribution=distribution)[:1], problem)
+        return float(problem.post_processing(good[0]/total[0]))
+    counts = simulate_mlae_counts(problem, shots, seed, distribution)
+    return float(problem.post_processing(compute_mle(counts, problem)))
+
+
+class Greeks:
+    '''Sensitivities of a model price by central bump-and-reprice.
+
+    All bumped models are priced in one batch, optionally on an ``Executor``, and with common
+    random numbers: every price samples its counts with the same seed, so the sampling noise
+    largely cancels in the differences. The bumped models share every sub-circuit that does not
+    depend on the bumped parameter through the memoized gates of the models (Markov chain,
+    QFTs, QFT-basis adders and payoff), e.g. a vega bump rebuilds only the adders of the
+    binomial tree, so a full set of sensitivities costs a small multiple of one price.
+
+    Parameters are constructor arguments of the model, ``GREEKS`` maps the usual names.
+    Array valued parameters, e.g. the ``sigma`` schedule, are shifted in parallel. With
+    ``shots`` a bump only shows if it moves the amplitude by more than about ``1/shots``.
+
+    Example:
+
+        >>> greeks = Greeks(ModelSpec.of(DerivativePricing, 1.0, 3), shots=2000, seed=1)
+        >>> greeks.sensitivities(['delta', 'vega', 'prob_gb', 'prob_bg'])
+    '''
+
+    def __init__(self,
+                 spec: ModelSpec,
+                 bumps: Optional[dict] = None,
+                 shots: Optional[int] = None,
+                 seed: Optional[int] = 0,
+                 executor: Optional[Executor] = None,
+                 ) -> None:
+        '''
+        Args:
+            spec: The model, see ``ModelSpec``.
+            bumps: Absolute bump per parameter, defaults to ``BUMPS``.
+            shots: Shots per MLAE circuit, ``None`` prices exactly.
+            seed: Seed shared by all prices, the common random numbers.
+            executor: Prices the bumped models in parallel, e.g. a ``ProcessPoolExecutor``.
+        '''
+        self.spec = spec
+        self.bumps = dict(BUMPS, **(bumps or {}))
+        self.shots = shots
+        self.seed = seed
+        self.executor = executor
+
+    def bumped(self, parameter: str) -> tuple[ModelSpec, ModelSpec, float]:
+        '''The models with ``parameter`` bumped down and up, and the distance between the two.
+        Probabilities are kept in [0, 1], the difference is then one sided.'''
+        parameter = GREEKS.get(parameter, parameter)
+        if parameter not in self.bumps:
+            raise ValueError('No bump for parameter {}, pass one in bumps.'.format(parameter))
+        value = self.spec.arguments(defaults=True).get(parameter)
+        if value is None:
+            '''Parameters the constructor derives, e.g. the default sigma schedule, are read from
+            the model without synthesizing its gates'''
+            value = getattr(self.spec.replace(lazy=True).build(cache=False), parameter)
+        value = np.asarray(value, dtype=float)
+        down, up = value - self.bumps[parameter], value + self.bumps[parameter]
+        if parameter.startswith('prob_'):
+            down, up = np.clip(down, 0, 1), np.clip(up, 0, 1)
+        width = float(np.max(up - down))
+        arguments = self.spec.arguments()
+        arguments.pop(DERIVED.get(parameter), None)
+        spec = ModelSpec.of(self.spec.model, **arguments)
+        return spec.replace(**{parameter: down}), spec.replace(**{parameter: up}), width
+
+    def _prices(self, specs: list[ModelSpec]) -> list[float]:
+        mapper = self.executor.map if self.executor is not None else map
+        return list(mapper(price, specs, repeat(self.shots), repeat(self.seed)))
+
+    def price(self) -> float:
+        '''The price of the unbumped model.'''
+        return self._prices([self.spec])[0]
+
+    def sensitivities(self, parameters: Sequence[str] = ('delta', 'vega', 'prob_gb', 'prob_bg')) -> dict:
+        '''The derivative of the price with respect to every parameter, keyed as requested.'''
+        bumped = [self.bumped(parameter) for parameter in parameters]
+        prices = self._prices([spec for down, up, _ in bumped for spec in (down, up)])
+        return {parameter: (prices[2*i+1] - prices[2*i])/width
+                for i, (parameter, (_, _, width)) in enumerate(zip(parameters, bumped))}
@@ -0,0 +1,127 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from .MLAE import _good_state_mask
+
+if TYPE_CHECKING:
+    from qiskit.circuit import QuantumCircuit
+    from .EstimationProblem import EstimationProblem
+
+
+@dataclass
+class AmplitudeEstimate:
+    '''Result of an adaptive amplitude estimation.
+
+    Attributes:
+        estimation: The estimated amplitude ``a``.
+        confidence_interval: Interval holding ``a`` with probability ``1 - alpha``.
+        estimation_processed: The estimate mapped by the ``post_processing`` of the problem.
+        confidence_interval_processed: The interval mapped by the ``post_processing``, sorted.
+        num_oracle_queries: Number of applications of the state preparation A over all shots,
+            a circuit ``A Q^k`` counting ``2k+1``.
+        powers: The Grover power ``k`` of every round.
+        shots: The shots of every round.
+    '''
+    estimation: float
+    confidence_interval: tuple[float, float]
+    estimation_processed: float
+    confidence_interval_processed: tuple[float, float]
+    num_oracle_queries: int
+    powers: list[int] = field(default_factory=list)
+    shots: list[int] = field(default_factory=list)
+
+    @classmethod
+    def of(cls, problem: EstimationProblem, estimation: float, interval: tuple[float, float],
+           num_oracle_queries: int, powers: list[int], shots: list[int]) -> 'AmplitudeEstimate':
+        processed = sorted(float(problem.post_processing(bound)) for bound in interval)
+        return cls(float(estimation), (float(interval[0]), float(interval[1])),
+                   float(problem.post_processing(estimation)), (processed[0], processed[1]),
+                   num_oracle_queries, powers, shots)
+
+
+class GroverSampler:
+    '''Runs ``A Q^k`` of an estimation problem and counts the good outcomes, the measurement
+    step shared by the adaptive estimators ``IterativeAmplitudeEstimation`` and
+    ``FasterAmplitudeEstimation``.
+
+    With a ``backend`` the circuit of every power is built, transpiled once and submitted with
+    ``backend.run``, as ``Portfolio.run`` does. Without a backend the good counts are drawn
+    from the binomial distribution of ``sin^2((2k+1) theta)``, with ``theta`` from one
+    statevector of A, as ``simulate_mlae_counts`` does, so no Grover circuit is simulated.
+
+    Example:
+
+        >>> sampler = GroverSampler(MockBackend(seed=1), optimization_level=1)
+        >>> IterativeAmplitudeEstimation(epsilon_target=0.01).estimate(problem, sampler)
+    '''
+
+    def __init__(self, backend=None, seed: Optional[int] = None, **transpile_options) -> None:
+        '''
+        Args:
+            backend: Backend to run the circuits on. ``None`` samples noiselessly.
+            seed: Seed of the noiseless sampler.
+            transpile_options: Keyword arguments of ``transpile``.
+        '''
+        self.backend = backend
+        self.transpile_options = transpile_options
+        self.num_oracle_queries = 0
+        self._rng = np.random.default_rng(seed)
+        self._thetas = {}
+        self._circuits = {}
+
+    def __call__(self, problem: EstimationProblem, power: int, shots: int) -> int:
+        '''The number of good outcomes of ``shots`` runs of ``A Q^power``.'''
+        self.num_oracle_queries += (2*power + 1)*shots
+        if self.backend is None:
+            return int(self._rng.binomial(shots, np.sin((2*power + 1)*self._theta(problem))**2))
+
+        counts = self.backend.run(self._circuit(problem, power), shots=shots).result().get_counts()
+        return sum(count for bitstr, count in counts.items() if problem.is_good_state(bitstr))
+
+    def _theta(self, problem: EstimationProblem) -> float:
+        from qiskit.quantum_info import Statevector
+
+        key = id(problem)
+        if key not in self._thetas:
+            num_bits = len(problem.objective_qubits)
+            distribution = Statevector(problem.state_preparation).probabilities(problem.objective_qubits)
+            a = min(distribution[_good_state_mask(problem, num_bits)].sum(), 1.0)
+            # keep the problem alive so that its id is not reused
+            self._thetas[key] = (problem, np.arcsin(np.sqrt(a)))
+        return self._thetas[key][1]
+
+    def _circuit(self, problem: EstimationProblem, power: int) -> QuantumCircuit:
+        from qiskit import transpile
+        from qiskit.circuit import QuantumCircuit
+
+        key = (id(problem), power)
+        if key not in self._circuits:
+            num_qubits = max(problem.state_preparation.num_qubits, problem.grover_operator.num_qubits)
+            circuit = QuantumCircuit(num_qubits, len(problem.objective_qubits), name="qc_a_q_%s" % power)
+            circuit.compose(problem.state_preparation, inplace=True)
+            if power != 0:
+                circuit.compose(problem.grover_operator.power(power), inplace=True)
+            circuit.barrier()
+            circuit.measure(problem.objective_qubits, range(len(problem.objective_qubits)))
+            self._circuits[key] = (problem, transpile(circuit, self.backend, **self.transpile_options))
+        return self._circuits[key][1]
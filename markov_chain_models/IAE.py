@@ -0,0 +1,148 @@
+"""This code was adapted from the IterativeAmplitudeEstimation of qiskit_algorithms 0.3.0 (which is
+no longer supported) to run on the estimation problems of this package. The original code can be
+referenced at https://qiskit-community.github.io/qiskit-algorithms/_modules/qiskit_algorithms/amplitude_estimators/iae.html"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from .GroverSampler import AmplitudeEstimate, GroverSampler
+
+if TYPE_CHECKING:
+    from .EstimationProblem import EstimationProblem
+
+
+class IterativeAmplitudeEstimation:
+    r"""Iterative Amplitude Estimation [1].
+
+    Every round picks the largest Grover power :math:`k` for which the current interval of
+    :math:`\theta/(2\pi)` maps into one half circle of :math:`(4k+2)\theta`, runs
+    :math:`\mathcal{Q}^k\mathcal{A}` and narrows the interval with the confidence interval of
+    the measured good state probability. The rounds stop once the amplitude is known to
+    ``epsilon_target`` with confidence ``1 - alpha``.
+
+    References:
+        [1]: Grinko, D., Gacon, J., Zoufal, C., & Woerner, S. (2019).
+             Iterative Quantum Amplitude Estimation.
+             `arXiv:1912.05559 <https://arxiv.org/abs/1912.05559>`_.
+    """
+
+    def __init__(
+        self,
+        epsilon_target: float = 0.01,
+        alpha: float = 0.05,
+        confint_method: str = "beta",
+        min_ratio: float = 2,
+        shots: int = 100,
+    ) -> None:
+        r"""
+        Args:
+            epsilon_target: Target half width of the confidence interval of the amplitude.
+            alpha: Confidence level, the interval holds the amplitude with probability
+                ``1 - alpha``.
+            confint_method: ``'beta'`` for Clopper-Pearson or ``'chernoff'`` intervals per round.
+            min_ratio: Minimal factor between the scalings :math:`4k+2` of consecutive powers.
+            shots: Shots per round.
+        """
+        if not 0 < epsilon_target <= 0.5:
+            raise ValueError("The target epsilon must be in (0, 0.5], got {}.".format(epsilon_target))
+        if not 0 < alpha < 1:
+            raise ValueError("The confidence level alpha must be in (0, 1), got {}.".format(alpha))
+        if confint_method not in ("beta", "chernoff"):
+            raise ValueError("The confidence interval method must be 'beta' or 'chernoff'.")
+        if min_ratio <= 1:
+            raise ValueError("The minimal ratio must be larger than 1.")
+
+        self.epsilon_target = epsilon_target
+        self.alpha = alpha
+        self.confint_method = confint_method
+        self.min_ratio = min_ratio
+        self.shots = shots
+
+    def _find_next_k(self, k: int, upper_half_circle: bool, theta_interval: list[float]) -> tuple[int, bool]:
+        """The largest power whose scaled interval lies in one half circle, and that half."""
+        theta_l, theta_u = theta_interval
+        old_scaling = 4 * k + 2
+
+        # the largest feasible scaling, of the form 4k+2
+        max_scaling = int(1 / (2 * (theta_u - theta_l)))
+        scaling = max_scaling - (max_scaling - 2) % 4
+
+        while scaling >= self.min_ratio * old_scaling:
+            theta_min = scaling * theta_l - int(scaling * theta_l)
+            theta_max = scaling * theta_u - int(scaling * theta_u)
+
+            if theta_min <= theta_max <= 0.5 and theta_min <= 0.5:
+                return int((scaling - 2) / 4), True
+            if theta_max >= 0.5 and theta_max >= theta_min >= 0.5:
+                return int((scaling - 2) / 4), False
+            scaling -= 4
+
+        return int(k), upper_half_circle
+
+    def _confint(self, good_counts: int, shots: int, max_rounds: int) -> tuple[float, float]:
+        """Confidence interval of the good state probability of one round."""
+        if self.confint_method == "chernoff":
+            width = np.sqrt(np.log(2 * max_rounds / self.alpha) * 3 / shots)
+            probability = good_counts / shots
+            return max(0.0, probability - width), min(1.0, probability + width)
+
+        from scipy.stats import beta
+
+        level = self.alpha / max_rounds
+        lower = beta.ppf(level / 2, good_counts, shots - good_counts + 1) if good_counts > 0 else 0.0
+        upper = beta.ppf(1 - level / 2, good_counts + 1, shots - good_counts) if good_counts < shots else 1.0
+        return float(lower), float(upper)
+
+    def estimate(self, estimation_problem: EstimationProblem, sampler: Optional[GroverSampler] = None) -> AmplitudeEstimate:
+        """Estimates the amplitude of ``estimation_problem``.
+
+        Args:
+            estimation_problem: The estimation problem.
+            sampler: Runs the circuits, see ``GroverSampler``. Defaults to noiseless sampling.
+
+        Returns:
+            The estimate, its confidence interval and the number of oracle queries.
+        """
+        sampler = sampler or GroverSampler()
+        queries = sampler.num_oracle_queries
+
+        # an upper bound of the number of rounds, each round gets alpha/max_rounds
+        max_rounds = int(np.log(self.min_ratio * np.pi / 8 / self.epsilon_target) / np.log(self.min_ratio)) + 1
+
+        powers, good_counts = [0], []
+        upper_half_circle = True
+        theta_interval = [0.0, 1 / 4]  # theta/(2 pi)
+        a_interval = [0.0, 1.0]
+
+        while theta_interval[1] - theta_interval[0] > self.epsilon_target / np.pi:
+            k, upper_half_circle = self._find_next_k(powers[-1], upper_half_circle, theta_interval)
+            powers.append(k)
+            good_counts.append(sampler(estimation_problem, k, self.shots))
+
+            # rounds with the same power are pooled
+            rounds = 1
+            while rounds < len(good_counts) and powers[-1 - rounds] == k:
+                rounds += 1
+            a_min, a_max = self._confint(sum(good_counts[-rounds:]), rounds * self.shots, max_rounds)
+
+            if upper_half_circle:
+                theta_min = np.arccos(1 - 2 * a_min) / 2 / np.pi
+                theta_max = np.arccos(1 - 2 * a_max) / 2 / np.pi
+            else:
+                theta_min = 1 - np.arccos(1 - 2 * a_max) / 2 / np.pi
+                theta_max = 1 - np.arccos(1 - 2 * a_min) / 2 / np.pi
+
+            # map back from the scaled angle to theta. The interval lies in one period of the
+            # scaled angle, its upper end may touch the next one
+            scaling = 4 * k + 2
+            period = int(scaling * theta_interval[0])
+            theta_interval = [(period + theta_min) / scaling, (period + theta_max) / scaling]
+            a_interval = [np.sin(2 * np.pi * theta_interval[0]) ** 2,
+                          np.sin(2 * np.pi * theta_interval[1]) ** 2]
+
+        return AmplitudeEstimate.of(estimation_problem, np.mean(a_interval), tuple(a_interval),
+                                    sampler.num_oracle_queries - queries, powers[1:],
+                                    [self.shots] * len(good_counts))
@@ -0,0 +1,170 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+import threading
+from functools import lru_cache, wraps
+
+from qiskit import QuantumCircuit
+from qiskit.circuit import Gate, Instruction
+
+
+def memoized_gate(maxsize: int):
+    '''Memoizes a function returning a gate or a circuit, e.g. the Markov chain, an adder or a
+    payoff shared by many models. The synthesis is cached, every call returns a copy of the
+    cached gate, so a model changing its gate, e.g. its label or definition, does not change
+    the gates of the others. ``cache_info`` and ``cache_clear`` are those of the cache'''
+    def decorator(function):
+        cached = lru_cache(maxsize=maxsize)(function)
+
+        @wraps(function)
+        def gate(*args, **kwargs):
+            return cached(*args, **kwargs).copy()
+        gate.cache_info = cached.cache_info
+        gate.cache_clear = cached.cache_clear
+        return gate
+    return decorator
+
+
+class LazyCircuit(QuantumCircuit):
+    '''Base class for the model circuits.
+
+    Subclasses set their parameters and metadata (``objective``, ``post_processing``, ...)
+    in ``__init__`` and synthesize their gates in ``_build``. With ``lazy=True`` the
+    registers are allocated immediately, so ``num_qubits``, ``qubits`` and ``qregs`` are
+    available without building, and ``_build`` only runs the first time the circuit data
+    is touched (``data``, ``draw``, ``transpile``, ``Statevector``, ``compose``, ...).
+
+    With ``flatten=True`` subclasses emit their instructions directly into ``self``
+    instead of wrapping every block in ``to_gate()``, so transpilation and simulation do
+    not have to unroll nested definitions.
+
+    Note: qiskit's own ``BlueprintCircuit`` plays the same role, but it is deprecated and
+    ``transpile`` only special-cases it by type, so we hook the underlying ``_data``
+    attribute instead, which every consumer of the circuit goes through.'''
+
+    # class level default so that accesses made by QuantumCircuit.__init__ never build
+    _is_built = True
+    _building = False
+
+    # builds of concurrent threads are serialized, reentrant as models build other models
+    _build_lock = threading.RLock()
+
+    def __new__(cls, *args, **kwargs):
+        self = super().__new__(cls)
+        # the constructor arguments, see spec
+        self._spec_args = (args, kwargs)
+        return self
+
+    def __init__(self, *regs, name=None, lazy=False, flatten=False):
+        self.flatten = flatten
+        super().__init__(*regs, name=name)
+        self._is_built = False
+        if not lazy:
+            self._ensure_built()
+
+    def _build(self):
+        '''Appends the gates of the model to ``self``. Called at most once.'''
+        raise NotImplementedError
+
+    def _ensure_built(self):
+        if self._is_built:
+            return
+        with LazyCircuit._build_lock:
+            if self._is_built or self._building:
+                return
+            self._building = True
+            try:
+                self._build()
+            finally:
+                self._building = False
+            self._is_built = True
+
+    @property
+    def spec(self):
+        '''The ``ModelSpec`` this circuit was constructed from.'''
+        from .ModelSpec import ModelSpec
+        args, kwargs = self._spec_args
+        return ModelSpec.of(type(self), *args, **kwargs)
+
+    def _inline(self, circuit, qubits):
+        '''Appends the instructions of ``circuit`` to ``self`` on ``qubits``, unrolling the
+        composite gates created by ``to_gate``/``to_instruction`` rather than nesting them'''
+        qubits = list(qubits)
+        for instruction in circuit.data:
+            operation = instruction.operation
+            qargs = [qubits[circuit.find_bit(qubit).index] for qubit in instruction.qubits]
+            if type(operation) in (Gate, Instruction) and operation.definition is not None:
+                self._inline(operation.definition, qargs)
+            else:
+                self.append(operation, qargs)
+        self.global_phase += circuit.global_phase
+
+    @property
+    def is_built(self) -> bool:
+        '''Whether the gates of the circuit have been synthesized.'''
+        return self._is_built
+
+    @property
+    def _data(self):
+        self._ensure_built()
+        return self.__dict__['_circuit_data']
+
+    @_data.setter
+    def _data(self, data):
+        self.__dict__['_circuit_data'] = data
+
+    '''The layout of the circuit is known before it is built'''
+
+    @property
+    def num_qubits(self) -> int:
+        return self.__dict__['_circuit_data'].num_qubits
+
+    @property
+    def qubits(self):
+        return self.__dict__['_circuit_data'].qubits
+
+    @property
+    def qregs(self):
+        return self.__dict__['_circuit_data'].qregs
+
+    @qregs.setter
+    def qregs(self, other):
+        QuantumCircuit.qregs.fset(self, other)
+
+    @property
+    def num_clbits(self) -> int:
+        return self.__dict__['_circuit_data'].num_clbits
+
+    @property
+    def clbits(self):
+        return self.__dict__['_circuit_data'].clbits
+
+    @property
+    def cregs(self):
+        return self.__dict__['_circuit_data'].cregs
+
+    @cregs.setter
+    def cregs(self, other):
+        QuantumCircuit.cregs.fset(self, other)
+
+    def width(self) -> int:
+        return self.num_qubits + self.num_clbits
+
+    def copy_empty_like(self, name=None, **kwargs):
+        cpy = super().copy_empty_like(name, **kwargs)
+        # the copy is empty by definition, it must not build the model gates a second time
+        cpy._is_built = True
+        return cpy
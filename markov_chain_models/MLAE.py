@@ -2,14 +2,19 @@
 with qiskit > 1.0. The original code can be referenced at https://qiskit-community.github.io/qiskit-algorithms/_modules/qiskit_algorithms/amplitude_estimators/mlae.html#MaximumLikelihoodAmplitudeEstimation"""
 
 
-from typing import List, Sequence
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional, Sequence
 import numpy as np
-from scipy.optimize import brute
 
-from qiskit import ClassicalRegister
-from qiskit.circuit import QuantumCircuit, QuantumRegister
+# qiskit and scipy are imported where they are used, so that the post processing
+# (compute_mle, compute_confidence_interval) imports with numpy only
+if TYPE_CHECKING:
+    from qiskit.circuit import QuantumCircuit
+    from .EstimationProblem import EstimationProblem
 
-from .EstimationProblem import EstimationProblem
+'''Grover powers of the MLAE circuits, the evaluation schedule of compute_mle'''
+MLAE_POWERS = [0, 1, 2, 4]
 
 def construct_mlae_circuits(
         estimation_problem: EstimationProblem, measurement: bool = False
@@ -23,6 +28,8 @@ def construct_mlae_circuits(
         Returns:
             A list with the QuantumCircuit objects for the algorithm.
         """
+        from qiskit.circuit import ClassicalRegister, QuantumCircuit, QuantumRegister
+
         # keep track of the Q-oracle queries
         circuits = []
 
@@ -40,7 +47,7 @@ def construct_mlae_circuits(
 
         qc_0.compose(estimation_problem.state_preparation, inplace=True)
 
-        for k in [0,1,2,4]:
+        for k in MLAE_POWERS:
             qc_k = qc_0.copy(name="qc_a_q_%s" % k)
 
             if k != 0:
@@ -57,22 +64,98 @@ def construct_mlae_circuits(
 
         return circuits
 
+def simulate_mlae_counts(
+        estimation_problem: EstimationProblem,
+        shots: Optional[int] = None,
+        seed: Optional[int] = None,
+        distribution: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        r"""Noiseless results of the MLAE circuits without simulating any Grover operator.
+
+        One statevector of the state preparation :math:`\mathcal{A}` gives the distribution
+        :math:`p(x)` of the objective qubits and the good state probability
+        :math:`a = \sin^2(\theta)`. After :math:`\mathcal{Q}^k` the good outcomes have total
+        probability :math:`\sin^2((2k+1)\theta)`, distributed in proportion to :math:`p(x)`,
+        and likewise the bad outcomes.
+
+        Args:
+            estimation_problem: The estimation problem.
+            shots: Number of shots per circuit. The counts are sampled from the multinomial
+                distribution. ``None`` returns the exact probabilities instead.
+            seed: Seed of the sampler.
+            distribution: The distribution :math:`p(x)` of the objective qubits, if already
+                known, e.g. from a ``SparseState``. Defaults to one statevector.
+
+        Returns:
+            An array of shape ``(powers, 2**num_objective_qubits)`` indexed by the integer value
+            of the measured bitstring, in the layout of ``construct_mlae_circuits`` with
+            ``measurement=True``, which can be passed to ``compute_mle``.
+        """
+        num_bits = len(estimation_problem.objective_qubits)
+        # the first objective qubit is the least significant bit of the measured integer
+        if distribution is None:
+            from qiskit.quantum_info import Statevector
+
+            distribution = Statevector(estimation_problem.state_preparation).probabilities(
+                estimation_problem.objective_qubits
+            )
+        good = _good_state_mask(estimation_problem, num_bits)
+        a = distribution[good].sum()
+
+        theta = np.arcsin(np.sqrt(a))
+        good_probabilities = np.sin((2 * np.array(MLAE_POWERS) + 1) * theta) ** 2
+
+        probabilities = np.zeros((len(good_probabilities), 2**num_bits))
+        if a > 0:
+            probabilities[:, good] = np.outer(good_probabilities, distribution[good] / a)
+        if a < 1:
+            probabilities[:, ~good] = np.outer(1 - good_probabilities, distribution[~good] / (1 - a))
+
+        if shots is None:
+            return probabilities
+        rng = np.random.default_rng(seed)
+        return np.vstack([rng.multinomial(shots, row / row.sum()) for row in probabilities]).astype(float)
+
 nevals = max(10000, int(np.pi / 2 * 1000 * 2 * 4))
 
 def _default_minimizer(objective_fn, bounds):
+    from scipy.optimize import brute
     return brute(objective_fn, bounds, Ns=nevals)[0]
 
+def _good_state_mask(estimation_problem: EstimationProblem, num_bits: int) -> np.ndarray:
+    """Evaluates ``is_good_state`` once for every outcome on ``num_bits`` measured bits.
+
+    Returns:
+        A boolean array indexed by the integer value of the measured bitstring.
+    """
+    return np.array(
+        [
+            estimation_problem.is_good_state(format(outcome, "0{}b".format(num_bits)))
+            for outcome in range(2**num_bits)
+        ],
+        dtype=bool,
+    )
+
 def _get_counts(
-    circuit_results: Sequence[dict[str, int]], estimation_problem: EstimationProblem
+    circuit_results: Sequence[dict[str, int]] | np.ndarray, estimation_problem: EstimationProblem
 ) -> tuple[list[int], list[int]]:
     """Get the good and total counts.
 
+    Args:
+        circuit_results: A list of counts dictionaries, or an array of shape
+            ``(experiments, 2**num_bits)`` holding the counts indexed by the integer value of the
+            measured bitstring, as returned by ``ResultsStore.mlae_counts``.
+
     Returns:
         A pair of two lists, ([1-counts per experiment], [shots per experiment]).
 
     Raises:
         AlgorithmError: If self.run() has not been called yet.
     """
+    if isinstance(circuit_results, np.ndarray):
+        mask = _good_state_mask(estimation_problem, int(np.log2(circuit_results.shape[1])))
+        return list(circuit_results[:, mask].sum(axis=1)), list(circuit_results.sum(axis=1))
+
     one_hits = []  # h_k: how often 1 has been measured, for a power Q^(m_k)
     all_hits = []
     for counts in circuit_results:
@@ -88,7 +171,7 @@ def _get_counts(
     return one_hits, all_hits
 
 def compute_mle(
-        circuit_results: list[dict[str, int]],
+        circuit_results: list[dict[str, int]] | np.ndarray,
         estimation_problem: EstimationProblem,
         return_counts: bool = False,
     ) -> float | tuple[float, list[int]]:
@@ -97,7 +180,8 @@ def compute_mle(
         This is a stable approach if sufficient grid-points are used.
 
         Args:
-            circuit_results: A list of circuit outcomes. Can be counts or statevectors.
+            circuit_results: A list of circuit outcomes. Can be counts dictionaries or an array of
+                counts indexed by outcome, one row per power, see ``ResultsStore.mlae_counts``.
             estimation_problem: The estimation problem containing the evaluation schedule and the
                 number of likelihood function evaluations used to find the minimum.
             return_counts: If True, returns the good counts.
@@ -113,7 +197,7 @@ def compute_mle(
         def loglikelihood(theta):
             # loglik contains the first `it` terms of the full loglikelihood
             loglik = 0
-            for i, k in enumerate([0,1,2,4]):
+            for i, k in enumerate(MLAE_POWERS):
                 angle = (2 * k + 1) * theta
                 loglik += np.log(np.sin(angle) ** 2) * good_counts[i]
                 loglik += np.log(np.cos(angle) ** 2) * (all_counts[i] - good_counts[i])
@@ -125,4 +209,95 @@ def compute_mle(
         if return_counts:
             return estimation, good_counts
         
-        return estimation
\ No newline at end of file
+        return estimation
+
+def compute_noise_aware_mle(
+        circuit_results: list[dict[str, int]] | np.ndarray,
+        estimation_problem: EstimationProblem,
+        depths: Optional[Sequence[float]] = None,
+        return_fidelities: bool = False,
+    ) -> float | tuple[float, np.ndarray]:
+        r"""Compute the MLE under depolarizing noise that grows with the circuit depth.
+
+        The good state probability of the circuit with ``k`` Grover operators is modelled as
+
+        .. math::
+
+            p_k = f_k \sin^2((2k+1)\theta) + (1 - f_k)/2, \quad f_k = e^{-\lambda d_k}
+
+        with the depth :math:`d_k` of the circuit, and :math:`\theta` and the decay rate
+        :math:`\lambda` are fitted jointly. The likelihood is evaluated on a 2-D grid in one
+        vectorized pass and the best grid point is refined with a bounded local optimizer.
+
+        Args:
+            circuit_results: A list of circuit outcomes, see ``compute_mle``.
+            estimation_problem: The estimation problem.
+            depths: The depth of the circuit of every power, e.g. the ``depth`` recorded in
+                the ``ResultsStore``. Defaults to the number of applications of
+                :math:`\mathcal{A}`, ``2k+1``.
+            return_fidelities: If True, also returns the fitted fidelities :math:`f_k`.
+        Returns:
+            The MLE for the provided result object.
+        """
+        from scipy.optimize import minimize
+
+        good_counts, all_counts = _get_counts(circuit_results, estimation_problem)
+        good_counts = np.asarray(good_counts, dtype=float)
+        bad_counts = np.asarray(all_counts, dtype=float) - good_counts
+
+        powers = np.array(MLAE_POWERS)
+        if depths is None:
+            depths = 2 * powers + 1
+        depths = np.asarray(depths, dtype=float)[:len(powers)]
+
+        eps = 1e-15  # to avoid invalid value in log
+
+        def loglikelihood(theta, rate):
+            fidelity = np.exp(-np.multiply.outer(rate, depths))
+            p = fidelity * np.sin(np.multiply.outer(theta, 2 * powers + 1)) ** 2 + (1 - fidelity) / 2
+            p = np.clip(p, eps, 1 - eps)
+            return (np.log(p) @ good_counts) + (np.log(1 - p) @ bad_counts)
+
+        # grid over theta and over the fidelity of the deepest circuit
+        thetas = np.linspace(eps, np.pi / 2 - eps, 2000)
+        rates = -np.log(np.linspace(1, 1e-3, 200)) / depths.max()
+        grid = loglikelihood(thetas[:, None], rates[None, :])
+        i, j = np.unravel_index(np.argmax(grid), grid.shape)
+
+        bounds = [(0, np.pi / 2), (0, rates[-1])]
+        result = minimize(lambda x: -loglikelihood(x[0], x[1]), [thetas[i], rates[j]],
+                          method="L-BFGS-B", bounds=bounds)
+        est_theta, est_rate = result.x if result.fun <= -grid[i, j] else (thetas[i], rates[j])
+        estimation = np.sin(est_theta) ** 2
+
+        if return_fidelities:
+            return estimation, np.exp(-est_rate * depths)
+
+        return estimation
+
+def compute_confidence_interval(
+        estimation: float,
+        all_counts: Sequence[int],
+        alpha: float = 0.05,
+    ) -> tuple[float, float]:
+        """Compute the Fisher information based confidence interval of the MLE.
+
+        Args:
+            estimation: The estimated amplitude, as returned by ``compute_mle``.
+            all_counts: The number of shots per power of the evaluation schedule.
+            alpha: The confidence level, the interval covers the amplitude with probability
+                ``1 - alpha`` asymptotically.
+        Returns:
+            The lower and upper bound of the amplitude.
+        """
+        from scipy.special import ndtri
+
+        # the Fisher information is singular at a = 0 and a = 1
+        eps = 1e-15
+        a = min(max(estimation, eps), 1 - eps)
+        fisher_information = sum(
+            shots * (2 * k + 1) ** 2 for shots, k in zip(all_counts, MLAE_POWERS)
+        ) / (a * (1 - a))
+
+        half_width = ndtri(1 - alpha / 2) / np.sqrt(fisher_information)
+        return max(0.0, estimation - half_width), min(1.0, estimation + half_width)
@@ -17,23 +17,55 @@ Copyright 2024 Jack Morgan
 from qiskit import QuantumCircuit
 import numpy as np
 
-class MarkovChain(QuantumCircuit):
+from .LazyCircuit import LazyCircuit, memoized_gate
+
+class MarkovChain(LazyCircuit):
     
-    def __init__(self, time_steps, prob_gb, prob_bg):
+    def __init__(self, time_steps, prob_gb, prob_bg, lazy=False, flatten=False, initial=None):
+        
+        self.time_steps = time_steps
+        self.prob_gb = prob_gb
+        self.prob_bg = prob_bg
+        
+        '''Regime before the first qubit, known classically, e.g. the last regime fixed by a
+        RegimeConditioning. None starts the chain in the steady state'''
+        self.initial = initial
+        
+        super().__init__(time_steps+1, name='MC', lazy=lazy, flatten=flatten)
+        
+    def _chain(self, circ):
+        
+        prob_gb, prob_bg = self.prob_gb, self.prob_bg
         
         theta_naught = 2*np.arccos(np.sqrt((prob_bg)/(prob_gb+prob_bg)))
         theta_0 = 2*np.arccos(np.sqrt(1-prob_gb))
         theta_1 = 2*np.arccos(np.sqrt(prob_bg))
         
-        n = time_steps+1
+        n = self.time_steps+1
         
-        circ = QuantumCircuit(n)
-        
-        circ.ry(theta_naught, [0],'theta_naught')
+        if self.initial is None:
+            circ.ry(theta_naught, [0],'theta_naught')
+        else:
+            circ.ry(theta_1 if self.initial else theta_0, [0])
         
         for i in range(n-1):
             circ.ry(theta_0, [i+1], 'theta_0')
             circ.cry(theta_1 - theta_0, [i], [i+1], 'theta_1')
+        
+    def _build(self):
+        
+        if self.flatten:
+            self._chain(self)
+            return
+        
+        circ = QuantumCircuit(self.time_steps+1)
+        self._chain(circ)
             
-        super().__init__(circ.num_qubits,name='MC')
         self.append(circ.to_gate(),range(circ.num_qubits)) 
+
+
+@memoized_gate(maxsize=64)
+def markov_chain_gate(time_steps, prob_gb, prob_bg, initial=None):
+    '''Memoized gate of the Markov chain, shared by all models with the same chain, e.g. the
+    instruments of a sensitivity run whose bumped parameter is not a transition probability'''
+    return MarkovChain(time_steps, prob_gb, prob_bg, initial=initial).to_gate()
@@ -0,0 +1,222 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+import itertools
+import time
+from typing import Optional, Sequence, Union
+
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit.providers import BackendV2, JobError, JobStatus, Options
+from qiskit.quantum_info import Statevector
+from qiskit.transpiler import Target
+
+from .MLAE import MLAE_POWERS
+from .ResultsStore import ResultsStore, counts_to_array
+
+
+class MockBackend(BackendV2):
+    '''Local stand-in for a remote backend, to exercise job orchestration offline.
+
+    Every submitted circuit either replays recorded counts, looked up by circuit name, or is
+    sampled from its statevector under global depolarizing noise of fidelity
+    ``exp(-decay_rate * depth)``. Every job waits in a simulated queue for an exponentially
+    distributed time with mean ``latency`` seconds and fails with probability
+    ``failure_rate``.
+
+    Two interfaces are exposed:
+
+    * qiskit's ``run(circuits, shots)``, returning a ``MockJob`` with ``status``, ``done``
+      and ``result``, so ``transpile`` and ``Portfolio.run`` work unchanged.
+    * the handle based ``process_circuits``/``circuit_status``/``get_result`` of the
+      Quantinuum runs in ``hardware_results``, one job per circuit.
+
+    Example:
+
+        >>> store = ResultsStore('results')
+        >>> import_json(store, 'hardware_results/probabilities.json')
+        >>> backend = MockBackend.from_store(store, 'MLAE', 'Torino', latency=0.5, failure_rate=0.1)
+        >>> job = backend.run(construct_mlae_circuits(problem, measurement=True), shots=4000)
+    '''
+
+    def __init__(self,
+                 recorded: Optional[dict] = None,
+                 decay_rate: float = 0.0,
+                 latency: float = 0.0,
+                 failure_rate: float = 0.0,
+                 seed: Optional[int] = None,
+                 name: Optional[str] = 'mock',
+                 ) -> None:
+        '''
+        Args:
+            recorded: Counts to replay, keyed by circuit name, as counts dictionaries or arrays
+                indexed by outcome.
+            decay_rate: Depolarizing decay per layer of depth of the sampled circuits.
+            latency: Mean queueing time of a job in seconds.
+            failure_rate: Probability that a job fails.
+            seed: Seed of the sampler, the queueing times and the failures.
+            name: Name of the backend.
+        '''
+        super().__init__(name=name)
+        self.recorded = {key: counts_to_array(counts) for key, counts in (recorded or {}).items()}
+        self.decay_rate = decay_rate
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._rng = np.random.default_rng(seed)
+        self._target = Target.from_configuration(
+            basis_gates=['u', 'cx', 'measure', 'reset'], num_qubits=None)
+        self._ids = itertools.count()
+        self._handles = {}
+
+    @classmethod
+    def from_store(cls,
+                   store: ResultsStore,
+                   problem: str,
+                   backend: str,
+                   powers: Sequence[int] = MLAE_POWERS,
+                   **options) -> 'MockBackend':
+        '''Replays the MLAE counts of ``problem`` on ``backend`` held in ``store``, for the
+        circuits ``qc_a_q_<k>`` built by ``construct_mlae_circuits``.'''
+        counts = store.mlae_counts(problem, backend, powers)
+        recorded = {'qc_a_q_%s' % power: row for power, row in zip(powers, counts)}
+        return cls(recorded, **options)
+
+    @property
+    def target(self) -> Target:
+        return self._target
+
+    @property
+    def max_circuits(self) -> Optional[int]:
+        return None
+
+    @classmethod
+    def _default_options(cls) -> Options:
+        return Options(shots=1000)
+
+    def run(self, run_input: Union[QuantumCircuit, list[QuantumCircuit]], **options) -> 'MockJob':
+        '''Submits the circuits as one job.'''
+        circuits = [run_input] if isinstance(run_input, QuantumCircuit) else list(run_input)
+        shots = options.get('shots', self.options.shots)
+        delay = self._rng.exponential(self.latency) if self.latency > 0 else 0.0
+        failed = self._rng.random() < self.failure_rate
+        return MockJob(self, 'mock-%d' % next(self._ids), circuits, shots, time.monotonic() + delay, failed)
+
+    def process_circuits(self, circuits: Sequence[QuantumCircuit], n_shots: int = 1000) -> list[str]:
+        '''Submits every circuit as its own job and returns their handles.'''
+        handles = []
+        for circuit in circuits:
+            job = self.run(circuit, shots=n_shots)
+            self._handles[job.job_id()] = job
+            handles.append(job.job_id())
+        return handles
+
+    def circuit_status(self, handle: str) -> JobStatus:
+        '''Polls the status of the job of a handle without blocking.'''
+        return self._handles[handle].status()
+
+    def get_result(self, handle: str, timeout: Optional[float] = None) -> dict:
+        '''The counts of a handle, waiting for its job to finish.'''
+        return self._handles[handle].result(timeout).get_counts()
+
+    def _sample(self, circuit: QuantumCircuit, shots: int) -> dict:
+        '''Counts of one circuit, replayed if recorded and sampled otherwise.'''
+        if circuit.name in self.recorded:
+            recorded = self.recorded[circuit.name]
+            probabilities = recorded / recorded.sum()
+            num_bits = int(np.log2(len(recorded)))
+            counts = recorded if recorded.sum() == shots else self._rng.multinomial(shots, probabilities)
+        else:
+            measured = {}
+            for instruction in circuit.data:
+                if instruction.operation.name == 'measure':
+                    clbit = circuit.find_bit(instruction.clbits[0]).index
+                    measured[clbit] = circuit.find_bit(instruction.qubits[0]).index
+            if not measured:
+                raise JobError('Circuit {} has no measurements.'.format(circuit.name))
+
+            num_bits = circuit.num_clbits
+            qubits = [measured.get(clbit) for clbit in range(num_bits)]
+            marginal = Statevector(circuit.remove_final_measurements(inplace=False)).probabilities(
+                [qubit for qubit in qubits if qubit is not None])
+            probabilities = np.zeros(2**num_bits)
+            present = [clbit for clbit, qubit in enumerate(qubits) if qubit is not None]
+            index = sum(((np.arange(len(marginal)) >> bit) & 1) << clbit for bit, clbit in enumerate(present))
+            probabilities[index] = marginal
+
+            fidelity = np.exp(-self.decay_rate*circuit.depth())
+            probabilities = fidelity*probabilities + (1-fidelity)/2**num_bits
+            counts = self._rng.multinomial(shots, probabilities/probabilities.sum())
+
+        return {format(outcome, '0{}b'.format(num_bits)): int(count)
+                for outcome, count in enumerate(counts) if count > 0}
+
+
+class MockJob:
+    '''Job of a ``MockBackend``. The counts are drawn when the result is first available.'''
+
+    def __init__(self, backend: MockBackend, job_id: str, circuits: list[QuantumCircuit],
+                 shots: int, ready_at: float, failed: bool) -> None:
+        self._backend = backend
+        self._job_id = job_id
+        self._circuits = circuits
+        self._shots = shots
+        self._ready_at = ready_at
+        self._failed = failed
+        self._result = None
+
+    def job_id(self) -> str:
+        return self._job_id
+
+    def backend(self) -> MockBackend:
+        return self._backend
+
+    def status(self) -> JobStatus:
+        if time.monotonic() < self._ready_at:
+            return JobStatus.QUEUED
+        return JobStatus.ERROR if self._failed else JobStatus.DONE
+
+    def done(self) -> bool:
+        return self.status() == JobStatus.DONE
+
+    def result(self, timeout: Optional[float] = None) -> 'MockResult':
+        '''Waits for the job and returns its result.
+
+        Raises:
+            JobError: If the job failed or did not finish within ``timeout`` seconds.
+        '''
+        wait = self._ready_at - time.monotonic()
+        if timeout is not None and wait > timeout:
+            time.sleep(max(timeout, 0))
+            raise JobError('Job {} did not finish within {} s.'.format(self._job_id, timeout))
+        if wait > 0:
+            time.sleep(wait)
+        if self._failed:
+            raise JobError('Job {} failed.'.format(self._job_id))
+        if self._result is None:
+            self._result = MockResult([self._backend._sample(circuit, self._shots) for circuit in self._circuits])
+        return self._result
+
+
+class MockResult:
+    '''Result of a ``MockJob``, with qiskit's ``get_counts``.'''
+
+    def __init__(self, counts: list[dict]) -> None:
+        self._counts = counts
+
+    def get_counts(self, experiment: Optional[int] = None) -> Union[dict, list[dict]]:
+        if experiment is not None:
+            return self._counts[experiment]
+        return self._counts[0] if len(self._counts) == 1 else self._counts
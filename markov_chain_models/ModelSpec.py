@@ -0,0 +1,119 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+import inspect
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Union
+
+import numpy as np
+
+from .EstimationProblem import EstimationProblem
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    '''Picklable description of a model circuit: the name of the class and its constructor
+    arguments, with lists and arrays frozen to tuples.
+
+    A spec is a few hundred bytes, so it is cheap to send to the workers of a
+    ``ProcessPoolExecutor``, where ``build`` constructs the model, at most once per process
+    and spec. Construction is deterministic, the same spec builds the same circuit in every
+    process.
+
+    Example:
+
+        >>> specs = [ModelSpec.of(DynamicCreditRisk, loss, 3) for loss in range(4)]
+        >>> with ProcessPoolExecutor() as executor:
+        ...     counts = list(executor.map(simulate, specs))
+
+    where ``simulate`` is a module level function calling ``spec.estimation_problem()``.
+    '''
+
+    model: str
+    args: tuple = ()
+    kwargs: tuple = ()
+
+    @classmethod
+    def of(cls, model: Union[type, str], *args, **kwargs) -> 'ModelSpec':
+        '''The spec of ``model(*args, **kwargs)``, ``model`` being a model class or its name.'''
+        name = model if isinstance(model, str) else model.__name__
+        if name not in _models():
+            raise ValueError('Unknown model {}, expected one of {}.'.format(name, sorted(_models())))
+        return cls(name, _freeze(args), tuple(sorted((key, _freeze(value)) for key, value in kwargs.items())))
+
+    def arguments(self, defaults: bool = False) -> dict:
+        '''The constructor arguments by name, whether they were given by position or by keyword,
+        with the defaults of the missing ones if ``defaults``.'''
+        model = _models()[self.model]
+        bound = inspect.signature(model.__init__).bind(None, *self.args, **dict(self.kwargs))
+        if defaults:
+            bound.apply_defaults()
+        return {key: value for key, value in list(bound.arguments.items())[1:]}
+
+    def replace(self, **changes) -> 'ModelSpec':
+        '''The spec with the constructor arguments in ``changes`` replaced, whether they were
+        given by position or by keyword.'''
+        arguments = self.arguments()
+        arguments.update(changes)
+        return ModelSpec.of(self.model, **arguments)
+
+    def build(self, cache: bool = True):
+        '''Constructs the model. The cached instance is shared by all callers in the process, so
+        it must not be modified, use ``copy()`` to extend it.'''
+        if cache:
+            return _build_cached(self)
+        return _models()[self.model](*self.args, **dict(self.kwargs))
+
+    def layout(self) -> dict:
+        '''Number of qubits and objective qubit of the model, without synthesizing its gates.'''
+        kwargs = dict(self.kwargs, lazy=True)
+        circuit = _models()[self.model](*self.args, **kwargs)
+        return {'num_qubits': circuit.num_qubits, 'objective': getattr(circuit, 'objective', None)}
+
+    def estimation_problem(self) -> EstimationProblem:
+        '''The estimation problem of the model, with its post processing if it has one.'''
+        circuit = self.build()
+        return EstimationProblem(state_preparation=circuit,
+                                 objective_qubits=circuit.objective,
+                                 post_processing=getattr(circuit, 'post_processing', None))
+
+
+def _freeze(value):
+    '''Converts lists and arrays, also nested, into tuples so that the spec is hashable.'''
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+@lru_cache(maxsize=None)
+def _models() -> dict:
+    from .MarkovChain import MarkovChain
+    from .MultiRegimeMarkovChain import MultiRegimeMarkovChain
+    from .DerivativePricing import DerivativePricing
+    from .DynamicCreditRisk import DynamicCreditRisk
+    from .StaticCreditRisk import StaticCreditRisk
+    return {model.__name__: model for model in
+            [MarkovChain, MultiRegimeMarkovChain, DerivativePricing, DynamicCreditRisk, StaticCreditRisk]}
+
+
+@lru_cache(maxsize=64)
+def _build_cached(spec: ModelSpec):
+    return spec.build(cache=False)
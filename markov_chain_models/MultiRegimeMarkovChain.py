@@ -0,0 +1,173 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+import math
+from typing import Optional
+
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit.circuit.library import UCRYGate
+
+from .LazyCircuit import LazyCircuit
+
+
+def stationary_distribution(transition_matrix: np.ndarray) -> np.ndarray:
+    '''Solves pi P = pi with sum(pi) = 1 for a row stochastic transition matrix P.'''
+    num_regimes = len(transition_matrix)
+    system = np.vstack([transition_matrix.T - np.eye(num_regimes), np.ones(num_regimes)])
+    rhs = np.zeros(num_regimes + 1)
+    rhs[-1] = 1
+    pi = np.linalg.lstsq(system, rhs, rcond=None)[0]
+    return np.clip(pi, 0, None) / np.clip(pi, 0, None).sum()
+
+
+def _binary_tree_angles(distributions: np.ndarray) -> list[np.ndarray]:
+    '''RY angles preparing the square roots of the rows of ``distributions`` bit by bit.
+
+    Args:
+        distributions: Array of shape ``(rows, 2**b)``, one distribution per row.
+
+    Returns:
+        One array per level, most significant bit first. Level ``l`` has shape
+        ``(rows, 2**l)`` and holds the angle of bit ``b-1-l`` for every row and value of the
+        ``l`` bits above it.
+    '''
+    rows, size = distributions.shape
+    num_bits = int(np.log2(size))
+    angles = []
+    for level in range(num_bits):
+        bit = num_bits - 1 - level
+        mass = distributions.reshape(rows, 2**level, 2, 2**bit).sum(axis=-1)
+        angles.append(2*np.arctan2(np.sqrt(mass[..., 1]), np.sqrt(mass[..., 0])))
+    return angles
+
+
+def _append_tree(circ, levels: list[np.ndarray], qubits: list[int], controls: Optional[list[int]] = None) -> None:
+    '''Appends the rotations of ``_binary_tree_angles`` to ``circ``.
+
+    Args:
+        circ: The circuit to append to.
+        levels: The angles per level, see ``_binary_tree_angles``.
+        qubits: The qubits to prepare, least significant bit first.
+        controls: Qubits whose integer value selects the row of the angles, least significant
+            bit first. The control index of level ``l`` is ``higher bits + 2**l * row``.
+    '''
+    controls = controls or []
+    num_bits = len(qubits)
+    for level, angles in enumerate(levels):
+        target = qubits[num_bits-1-level]
+        higher = qubits[num_bits-level:]
+        if level == 0 and not controls:
+            circ.ry(angles[0, 0], target)
+        else:
+            circ.append(UCRYGate(list(angles.ravel())), [target]+higher+controls)
+
+
+class MultiRegimeMarkovChain(LazyCircuit):
+    '''Markov chain over ``K`` regimes, e.g. expansion, slowdown and recession.
+
+    Every time step holds the regime as an integer on ``ceil(log2(K))`` qubits, so the width of
+    the circuit is ``(time_steps+1)*ceil(log2(K))``. Step 0 is prepared in the stationary
+    distribution of the chain, as ``theta_naught`` does in ``MarkovChain``, and every following
+    step is prepared conditionally on the previous one with one uniformly controlled RY rotation
+    per bit. For ``K = 2`` the circuit prepares the same state as ``MarkovChain``.
+
+    Args:
+        time_steps: Number of transitions after the initial regime.
+        transition_matrix: Row stochastic ``K x K`` matrix, ``transition_matrix[i, j]`` is the
+            probability to move from regime ``i`` to regime ``j`` in one step.
+    '''
+
+    def __init__(self,
+                 time_steps: int,
+                 transition_matrix: np.ndarray,
+                 lazy: Optional[bool] = False,
+                 flatten: Optional[bool] = False,
+                 ) -> None:
+
+        transition_matrix = np.asarray(transition_matrix, dtype=float)
+        if transition_matrix.ndim != 2 or transition_matrix.shape[0] != transition_matrix.shape[1]:
+            raise ValueError('The transition matrix must be square, got shape {}.'.format(transition_matrix.shape))
+        if len(transition_matrix) < 2:
+            raise ValueError('The chain needs at least two regimes.')
+        if np.any(transition_matrix < 0) or not np.allclose(transition_matrix.sum(axis=1), 1):
+            raise ValueError('The rows of the transition matrix must be probability distributions.')
+
+        self.time_steps = time_steps
+        self.transition_matrix = transition_matrix
+        self.num_regimes = len(transition_matrix)
+        self.num_regime_qubits = math.ceil(np.log2(self.num_regimes))
+        self.stationary = stationary_distribution(transition_matrix)
+
+        super().__init__((time_steps+1)*self.num_regime_qubits, name='MC', lazy=lazy, flatten=flatten)
+
+    def regime_qubits(self, step: int) -> list[int]:
+        '''The qubits holding the regime of ``step``, least significant bit first.'''
+        return list(range(step*self.num_regime_qubits, (step+1)*self.num_regime_qubits))
+
+    def _padded(self, distributions: np.ndarray) -> np.ndarray:
+        '''Pads the distributions with zero probability for the unused codes ``K..2**b-1``.'''
+        padded = np.zeros((len(distributions), 2**self.num_regime_qubits))
+        padded[:, :self.num_regimes] = distributions
+        return padded
+
+    def _chain(self, circ):
+
+        b = self.num_regime_qubits
+
+        '''Initial regime from the stationary distribution'''
+        _append_tree(circ, _binary_tree_angles(self._padded(self.stationary[None, :])), self.regime_qubits(0))
+
+        '''Transitions, conditioned on the regime of the previous step. Codes that do not
+        correspond to a regime are never prepared, their rows are left at no rotation'''
+        transitions = np.zeros((2**b, 2**b))
+        transitions[:self.num_regimes] = self._padded(self.transition_matrix)
+        transitions[self.num_regimes:, 0] = 1
+        levels = _binary_tree_angles(transitions)
+
+        for step in range(1, self.time_steps+1):
+            _append_tree(circ, levels, self.regime_qubits(step), self.regime_qubits(step-1))
+
+    def _build(self):
+
+        if self.flatten:
+            self._chain(self)
+            return
+
+        circ = QuantumCircuit(self.num_qubits)
+        self._chain(circ)
+
+        self.append(circ.to_gate(), range(circ.num_qubits))
+
+    def path_weights(self) -> np.ndarray:
+        '''Exact probability of every regime path.
+
+        Returns:
+            Array of shape ``(K,)*(time_steps+1)``, axis ``t`` being the regime at step ``t``.
+        '''
+        weights = self.stationary
+        for _ in range(self.time_steps):
+            weights = weights[..., :, None] * self.transition_matrix
+        return weights
+
+    def probabilities(self) -> np.ndarray:
+        '''Exact measurement probabilities of all qubits, in the ordering of ``Statevector``.'''
+        index = np.zeros(1, dtype=np.int64)
+        for step in range(self.time_steps+1):
+            index = index[..., None] + (np.arange(self.num_regimes, dtype=np.int64) << (step*self.num_regime_qubits))
+        probabilities = np.zeros(2**self.num_qubits)
+        probabilities[index.ravel()] = self.path_weights().ravel()
+        return probabilities
@@ -0,0 +1,167 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+from typing import Optional, Sequence
+
+import numpy as np
+from qiskit.circuit.library import LinearAmplitudeFunction
+
+from .LazyCircuit import memoized_gate
+
+
+class Payoff:
+    '''Piecewise linear payoff of the price ``x`` at maturity,
+    ``f(x) = offsets[i] + slopes[i]*(x - breakpoints[i])`` for
+    ``breakpoints[i] <= x < breakpoints[i+1]``, the convention of ``LinearAmplitudeFunction``.
+
+    The payoff is plain data, its amplitude function on a given register is built by
+    ``circuit`` and memoized, so instruments with the same payoff, precision and
+    ``rescaling_factor`` build one ``LinearAmplitudeFunction`` and each get a copy of it.
+
+    Example:
+
+        >>> DerivativePricing(None, time_steps=3, payoff=put(1.0))
+    '''
+
+    def __init__(self,
+                 breakpoints: Sequence[float],
+                 slopes: Sequence[float],
+                 offsets: Sequence[float],
+                 image: Optional[tuple[float, float]] = None,
+                 name: Optional[str] = 'payoff',
+                 ) -> None:
+        '''
+        Args:
+            breakpoints: Sorted start of every piece, the first one is the lower end of the domain.
+            slopes: Slope of every piece.
+            offsets: Value of every piece at its breakpoint.
+            image: Range ``(f_min, f_max)`` the payoff is scaled from. Defaults to the range of
+                the payoff over the domain of the circuit.
+            name: Name of the payoff.
+        '''
+        if not len(breakpoints) == len(slopes) == len(offsets):
+            raise ValueError('Every piece needs a breakpoint, a slope and an offset.')
+        if np.any(np.diff(breakpoints) <= 0):
+            raise ValueError('The breakpoints must be strictly increasing.')
+
+        self.breakpoints = tuple(float(point) for point in breakpoints)
+        self.slopes = tuple(float(slope) for slope in slopes)
+        self.offsets = tuple(float(offset) for offset in offsets)
+        self.image = tuple(image) if image is not None else None
+        self.name = name
+
+    def __repr__(self) -> str:
+        return '{}(breakpoints={}, slopes={}, offsets={})'.format(
+            self.name, list(self.breakpoints), list(self.slopes), list(self.offsets))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Payoff) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def _key(self) -> tuple:
+        return (self.breakpoints, self.slopes, self.offsets, self.image)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        '''Evaluates the payoff for an array of prices.'''
+        x = np.asarray(x, dtype=float)
+        piece = np.clip(np.searchsorted(self.breakpoints, x, side='right') - 1, 0, None)
+        return np.take(self.offsets, piece) + np.take(self.slopes, piece)*(x - np.take(self.breakpoints, piece))
+
+    def image_on(self, domain: tuple[float, float]) -> tuple[float, float]:
+        '''Range of the payoff over ``domain``, attained at the ends of the pieces.'''
+        if self.image is not None:
+            return self.image
+        starts = np.clip(self.breakpoints, *domain)
+        ends = np.append(starts[1:], domain[1])
+        values = self(starts)
+        values = np.concatenate([values, values + np.multiply(self.slopes, ends - starts)])
+        return float(values.min()), float(values.max())
+
+    def circuit(self,
+                num_state_qubits: int,
+                domain: tuple[float, float],
+                rescaling_factor: float) -> LinearAmplitudeFunction:
+        '''The amplitude function of the payoff on a price register of ``num_state_qubits``
+        qubits encoding ``domain``. Pieces starting outside the domain are dropped.'''
+        image = self.image_on(domain)
+        if image[1] <= image[0]:
+            raise ValueError('The payoff {} is constant on the domain {}.'.format(self, domain))
+
+        first = np.searchsorted(self.breakpoints, domain[0], side='right') - 1
+        if first < 0:
+            raise ValueError('The payoff {} is not defined at the lower end of the domain {}.'.format(self, domain))
+        keep = np.array(self.breakpoints) < domain[1]
+        keep[:first] = False
+        breakpoints = np.maximum(np.array(self.breakpoints)[keep], domain[0])
+        return _amplitude_function(num_state_qubits,
+                                   tuple(np.array(self.slopes)[keep]),
+                                   tuple(self(breakpoints)),
+                                   tuple(domain),
+                                   image,
+                                   rescaling_factor,
+                                   tuple(breakpoints.tolist()))
+
+    def post_processing(self,
+                        scaled_value: float,
+                        domain: tuple[float, float],
+                        rescaling_factor: float) -> float:
+        '''Maps an estimated amplitude to the expected payoff, as ``post_processing`` of the
+        circuit does. Accepts arrays.'''
+        image = self.image_on(domain)
+        value = np.asarray(scaled_value) - 1/2 + np.pi/4*rescaling_factor
+        value = value*2/np.pi/rescaling_factor
+        return value*(image[1] - image[0]) + image[0]
+
+
+@memoized_gate(maxsize=256)
+def _amplitude_function(num_state_qubits, slopes, offsets, domain, image, rescaling_factor, breakpoints):
+    '''Memoized construction of the amplitude function, every call gets a copy of the circuit.'''
+    return LinearAmplitudeFunction(
+        num_state_qubits=num_state_qubits,
+        slope=list(slopes),
+        offset=list(offsets),
+        domain=domain,
+        image=image,
+        breakpoints=list(breakpoints),
+        rescaling_factor=rescaling_factor,
+    )
+
+
+def call(strike: float) -> Payoff:
+    '''European call, ``max(x - strike, 0)``.'''
+    return Payoff([0, strike], [0, 1], [0, 0], name='call')
+
+
+def put(strike: float) -> Payoff:
+    '''European put, ``max(strike - x, 0)``.'''
+    return Payoff([0, strike], [-1, 0], [strike, 0], name='put')
+
+
+def digital(strike: float, cash: float = 1.0) -> Payoff:
+    '''Cash-or-nothing call, ``cash`` if ``x >= strike``.'''
+    return Payoff([0, strike], [0, 0], [0, cash], name='digital')
+
+
+def call_spread(lower: float, upper: float) -> Payoff:
+    '''Bull call spread, long a call at ``lower`` and short a call at ``upper``.'''
+    return Payoff([0, lower, upper], [0, 1, 0], [0, 0, upper - lower], name='call_spread')
+
+
+def capped_call(strike: float, cap: float) -> Payoff:
+    '''Call whose payout is capped at ``cap``, ``min(max(x - strike, 0), cap)``.'''
+    return Payoff([0, strike, strike + cap], [0, 1, 0], [0, 0, cap], name='capped_call')
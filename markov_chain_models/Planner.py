@@ -0,0 +1,249 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+from dataclasses import dataclass
+from itertools import product
+from typing import Optional, Sequence
+
+import numpy as np
+from scipy.special import ndtri
+
+from .Approximation import adder_phases
+from .DerivativePricing import DerivativePricing
+from .MarkovChain import MarkovChain
+from .MLAE import MLAE_POWERS, compute_confidence_interval
+from .ModelSpec import ModelSpec
+from .SparseState import SparseState
+from .StaticCreditRisk import StaticCreditRisk
+
+'''Default grids searched by plan_derivative_pricing'''
+FRACTIONAL_PRECISIONS = range(2, 11)
+INTEGER_PRECISIONS = (1, 2)
+C_APPROXS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.25)
+
+
+@dataclass
+class Plan:
+    '''A model configuration and the shots per MLAE circuit, with its error budget.
+
+    Attributes:
+        spec: The configured model, see ``ModelSpec``.
+        shots: Shots per MLAE circuit.
+        discretization_error: Error of the fixed-point registers (and of the approximate QFTs).
+        approximation_error: Error of the ``c_approx`` linearization of the payoff.
+        statistical_error: Half width of the Fisher information interval of the MLE.
+        gate_count: Two-qubit gates of the state preparation A.
+    '''
+    spec: ModelSpec
+    shots: int
+    discretization_error: float
+    approximation_error: float
+    statistical_error: float
+    gate_count: int
+
+    @property
+    def total_error(self) -> float:
+        '''The errors add up, the biases in the worst case.'''
+        return self.discretization_error + self.approximation_error + self.statistical_error
+
+    @property
+    def cost(self) -> int:
+        '''Two-qubit gates run over all shots, a circuit ``A Q^k`` applying A ``2k+1`` times.
+        The reflections of Q are not counted.'''
+        return self.shots*sum(2*k + 1 for k in MLAE_POWERS)*self.gate_count
+
+
+def two_qubit_gate_count(circuit, _counts: Optional[dict] = None) -> int:
+    '''Number of two-qubit gates of ``circuit``, or of a gate, after unrolling every gate
+    through its definition. Gates shared by several instructions, e.g. the memoized adders of
+    ``DerivativePricing``, are unrolled once.'''
+    counts = {} if _counts is None else _counts
+    key = id(circuit)
+    if key not in counts:
+        if hasattr(circuit, 'data'):
+            count = sum(two_qubit_gate_count(instruction.operation, counts) for instruction in circuit.data)
+        elif circuit.num_qubits < 2 or circuit.name == 'barrier':
+            count = 0
+        elif circuit.definition is None:
+            count = 1
+        else:
+            count = two_qubit_gate_count(circuit.definition, counts)
+        # keep the operation alive so that its id is not reused
+        counts[key] = (circuit, count)
+    return counts[key][1]
+
+
+def _shots(amplitude: float, slope: float, budget: float, alpha: float) -> int:
+    '''Fewest shots per circuit whose Fisher information interval, mapped by the post
+    processing of the given slope, has a half width of at most ``budget``.'''
+    fisher_per_shot = sum((2*k + 1)**2 for k in MLAE_POWERS)/max(amplitude*(1 - amplitude), 1e-15)
+    return max(1, int(np.ceil((ndtri(1 - alpha/2)*slope/budget)**2/fisher_per_shot)))
+
+
+def _statistical_error(amplitude: float, slope: float, shots: int, alpha: float) -> float:
+    lower, upper = compute_confidence_interval(amplitude, [shots]*len(MLAE_POWERS), alpha)
+    return float(slope*(upper - lower)/2)
+
+
+def _paths(model: DerivativePricing) -> tuple[np.ndarray, np.ndarray]:
+    '''Probability and log price increments of every path of the Markov chain and the binomial
+    tree, indexed by regime path and binomial path. Up moves are on '0' as in _BinTreeIncrements.'''
+    time_steps = model.time_steps
+    regimes = SparseState.from_circuit(MarkovChain(time_steps, model.prob_gb, model.prob_bg)).probabilities(
+        range(1, time_steps+1))
+    paths = (np.arange(2**time_steps)[:, None] >> np.arange(time_steps)) & 1
+    lu, ld = model.increments()
+    steps = np.arange(time_steps)
+    up, down = lu[paths, steps], ld[paths, steps]
+    increments = np.where(paths[None, :, :] == 1, down[:, None, :], up[:, None, :])
+    return regimes/2**time_steps, increments
+
+
+def _reference_price(model: DerivativePricing) -> float:
+    '''The expected payoff of the model without registers.'''
+    probabilities, increments = _paths(model)
+    price = 1 + np.log(model.starting_price) + increments.sum(axis=2)
+    return float(probabilities @ model.payoff(price).sum(axis=1))
+
+
+def _register_distribution(model: DerivativePricing) -> np.ndarray:
+    '''Distribution of the price register after ``price_evolution``.
+
+    On every path the controlled adders reduce to phases in the QFT basis, which add up. With
+    exact QFTs the register is then the inverse QFT of a product state, an FFT of the bit
+    reversed state, computed for all binomial paths of a regime path at once. Approximate
+    QFTs and the ripple-carry arithmetic are simulated with ``SparseState``.'''
+    num_size, time_steps = model.num_size, model.time_steps
+    if model.approximation_degree > 0 or model.arithmetic != 'qft':
+        register = range(1+2*time_steps, 1+2*time_steps+num_size)
+        return SparseState.from_circuit(model.price_evolution().definition).probabilities(register)
+
+    probabilities, increments = _paths(model)
+    fixed = (adder_phases(np.log(model.starting_price), num_size, model.fractional_precision)
+             + adder_phases(1, num_size, model.fractional_precision))
+    bits = (np.arange(2**num_size)[:, None] >> np.arange(num_size)) & 1
+    distribution = np.zeros(2**num_size)
+    for probability, path in zip(probabilities, increments):
+        if probability == 0:
+            continue
+        phases = fixed + adder_phases(path[..., None], num_size, model.fractional_precision).sum(axis=1)
+        amplitudes = np.fft.fft(np.exp(1j*phases[:, ::-1] @ bits.T), axis=1)
+        distribution += probability*(np.abs(amplitudes)**2).sum(axis=0)/2**(2*num_size)
+    return distribution
+
+
+def plan_derivative_pricing(target: float,
+                            strike_price: Optional[float],
+                            time_steps: int,
+                            alpha: float = 0.05,
+                            fractional_precision: Sequence[int] = FRACTIONAL_PRECISIONS,
+                            integer_precision: Sequence[int] = INTEGER_PRECISIONS,
+                            c_approx: Sequence[float] = C_APPROXS,
+                            approximation_degree: Sequence[int] = (0,),
+                            **kwargs) -> Plan:
+    '''The cheapest configuration of ``DerivativePricing`` whose price is within ``target`` of
+    the price of the model without registers, with confidence ``1 - alpha``.
+
+    For every precision the distribution of the price register is computed once, by an FFT
+    with exact QFTs and otherwise with ``SparseState``, see ``_register_distribution``. It
+    gives exactly the discretization error, i.e. the rounding of the increments and the
+    overflow of the register, and for every ``c_approx`` the error of the linearized payoff
+    and the amplitude. The remaining budget fixes the shots through the
+    Fisher information of the MLE: a small ``c_approx`` trades payoff error for shots, as the
+    post processing scales the amplitude by ``1/c_approx``.
+
+    Example:
+
+        >>> plan = plan_derivative_pricing(0.01, 1.0, 3)
+        >>> model, shots = plan.spec.build(), plan.shots
+
+    Args:
+        target: Total error of the price.
+        strike_price: Passed to ``DerivativePricing``, None with a ``payoff`` in ``kwargs``.
+        time_steps: Passed to ``DerivativePricing``.
+        alpha: Confidence level of the statistical error.
+        fractional_precision: Candidate fractional bits of the price register.
+        integer_precision: Candidate integer bits of the price register.
+        c_approx: Candidate rescaling factors of the payoff.
+        approximation_degree: Candidate approximation degrees of the QFTs.
+        kwargs: Further arguments of ``DerivativePricing``, fixed.
+
+    Raises:
+        ValueError: If no candidate reaches the target.
+    '''
+    plans, counts = [], {}
+    reference = None
+    for fractional, integer, degree in product(fractional_precision, integer_precision, approximation_degree):
+        model = DerivativePricing(strike_price, time_steps, integer_precision=integer,
+                                  fractional_precision=fractional, approximation_degree=degree, lazy=True, **kwargs)
+        if reference is None:
+            reference = _reference_price(model)
+
+        probabilities = _register_distribution(model)
+        values = model.payoff(np.arange(2**model.num_size)*2.0**-fractional)
+        discretization = abs(probabilities @ values - reference)
+        gates = None
+
+        '''The payoff circuit maps the normalized payoff f to sin^2(pi/4 + c pi/2 (f - 1/2))'''
+        domain = (0, 2**(integer+1) - 2.0**-fractional)
+        image = model.payoff.image_on(domain)
+        normalized = (values - image[0])/(image[1] - image[0])
+        for c in c_approx:
+            amplitude = float(probabilities @ np.sin(np.pi/4 + c*np.pi/2*(normalized - 1/2))**2)
+            processed = model.payoff.post_processing(amplitude, domain, c)
+            approximation = abs(processed - probabilities @ values)
+            budget = target - discretization - approximation
+            if budget <= 0:
+                continue
+            slope = 2/(np.pi*c)*(image[1] - image[0])
+            shots = _shots(amplitude, slope, budget, alpha)
+            if gates is None:
+                gates = two_qubit_gate_count(model, counts)
+            spec = ModelSpec.of(DerivativePricing, strike_price, time_steps, integer_precision=integer,
+                                fractional_precision=fractional, approximation_degree=degree, c_approx=c, **kwargs)
+            plans.append(Plan(spec, shots, float(discretization), float(approximation),
+                              _statistical_error(amplitude, slope, shots, alpha), gates))
+
+    if not plans:
+        raise ValueError('No configuration reaches the target error {}, increase the precisions.'.format(target))
+    return min(plans, key=lambda plan: (plan.cost, plan.total_error))
+
+
+def plan_credit_risk(target: float,
+                     loss: int,
+                     time_steps: int,
+                     alpha: float = 0.05,
+                     **kwargs) -> Plan:
+    '''The shots of ``StaticCreditRisk`` that estimate the probability of a loss of at most
+    ``loss``, one step of a VaR search, within ``target`` with confidence ``1 - alpha``.
+
+    The model has no precision to trade: ``z_qubits`` sets the range of the latent variable
+    of the default probabilities, not its resolution, so it is a model parameter and is passed
+    through ``kwargs``. The whole budget is statistical.
+
+    Args:
+        target: Error of the loss probability.
+        loss: Passed to ``StaticCreditRisk``.
+        time_steps: Passed to ``StaticCreditRisk``.
+        alpha: Confidence level.
+        kwargs: Further arguments of ``StaticCreditRisk``.
+    '''
+    spec = ModelSpec.of(StaticCreditRisk, loss, time_steps, **kwargs)
+    model = spec.build()
+    amplitude = float(SparseState.from_circuit(model).probabilities([model.objective])[1])
+    shots = _shots(amplitude, 1.0, target, alpha)
+    return Plan(spec, shots, 0.0, 0.0, _statistical_error(amplitude, 1.0, shots, alpha),
+                two_qubit_gate_count(model))
@@ -0,0 +1,134 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+from typing import Optional, Sequence, Union
+
+import numpy as np
+from qiskit import QuantumCircuit, transpile
+
+from .DerivativePricing import DerivativePricing
+from .EstimationProblem import EstimationProblem
+from .MLAE import construct_mlae_circuits, compute_mle, compute_confidence_interval, simulate_mlae_counts, _get_counts
+
+
+class Portfolio:
+    '''A book of ``DerivativePricing`` instruments priced in one backend job.
+
+    Instruments with the same ``time_steps`` and maturity ``time_tot`` share one price
+    evolution gate (Markov chain, binomial tree, adders and inverse QFT), see
+    ``DerivativePricing.price_evolution``, so only the payoff is built per strike. The MLAE
+    circuits of all instruments are transpiled and submitted together.
+
+    Example:
+
+        >>> book = Portfolio(strike_prices=[0.9, 1.0, 1.1], maturities=[1/12, 1/12, 1/4], time_steps=3)
+        >>> prices, intervals = book.run(AerSimulator(), shots=2000)
+    '''
+
+    def __init__(self,
+                 strike_prices: Sequence[float],
+                 maturities: Optional[Union[float, Sequence[float]]] = 1/12,
+                 time_steps: Optional[Union[int, Sequence[int]]] = 3,
+                 **params) -> None:
+        '''
+        Args:
+            strike_prices: Strike of every instrument.
+            maturities: Maturity ``time_tot`` of every instrument, or one for all of them.
+            time_steps: Number of time steps of every instrument, or one for all of them.
+            params: Any other keyword argument of ``DerivativePricing``, shared by all
+                instruments (``prob_gb``, ``fractional_precision``, ``sigma``, ...).
+        '''
+        strike_prices, maturities, time_steps = np.broadcast_arrays(
+            np.asarray(strike_prices, dtype=float), maturities, time_steps)
+
+        self.strike_prices = strike_prices
+        self.maturities = maturities
+        self.time_steps = time_steps.astype(int)
+
+        '''Indices of the instruments per (time_steps, time_tot)'''
+        self.groups = {}
+        for index, key in enumerate(zip(self.time_steps.tolist(), self.maturities.tolist())):
+            self.groups.setdefault(key, []).append(index)
+
+        self.instruments = [None]*len(strike_prices)
+        for (steps, time_tot), indices in self.groups.items():
+            evolution = None
+            for index in indices:
+                instrument = DerivativePricing(self.strike_prices[index], steps, time_tot=time_tot,
+                                               evolution=evolution, **params)
+                evolution = instrument.price_evolution()
+                self.instruments[index] = instrument
+
+    def __len__(self) -> int:
+        return len(self.instruments)
+
+    def estimation_problems(self) -> list[EstimationProblem]:
+        '''One estimation problem per instrument, the estimates post processed to prices.'''
+        return [EstimationProblem(state_preparation=instrument,
+                                  objective_qubits=instrument.objective,
+                                  post_processing=instrument.post_processing)
+                for instrument in self.instruments]
+
+    def circuits(self, measurement: bool = True) -> list[QuantumCircuit]:
+        '''The MLAE circuits of all instruments, instrument after instrument in the order of the
+        evaluation schedule.'''
+        circuits = []
+        for problem in self.estimation_problems():
+            circuits += construct_mlae_circuits(problem, measurement=measurement)
+        return circuits
+
+    def prices(self,
+               circuit_results: Sequence[dict] | np.ndarray,
+               alpha: float = 0.05) -> tuple[np.ndarray, np.ndarray]:
+        '''Computes the prices from the results of ``circuits``.
+
+        Args:
+            circuit_results: The counts of every circuit, in the order of ``circuits``.
+            alpha: Confidence level of the intervals.
+
+        Returns:
+            The prices, of shape ``(instruments,)``, and their confidence intervals, of shape
+            ``(instruments, 2)``.
+        '''
+        problems = self.estimation_problems()
+        num_powers = len(circuit_results)//len(problems)
+
+        prices = np.zeros(len(problems))
+        intervals = np.zeros((len(problems), 2))
+        for index, problem in enumerate(problems):
+            results = circuit_results[index*num_powers:(index+1)*num_powers]
+            estimation = compute_mle(results, problem)
+            _, all_counts = _get_counts(results, problem)
+            low, high = compute_confidence_interval(estimation, all_counts, alpha)
+
+            prices[index] = problem.post_processing(estimation)
+            intervals[index] = sorted([problem.post_processing(low), problem.post_processing(high)])
+        return prices, intervals
+
+    def run(self, backend, shots: int = 1000, alpha: float = 0.05, **transpile_options) -> tuple[np.ndarray, np.ndarray]:
+        '''Transpiles the circuits of all instruments together, runs them as one job on
+        ``backend`` and returns the prices and confidence intervals, see ``prices``.'''
+        circuits = transpile(self.circuits(), backend, **transpile_options)
+        job = backend.run(circuits, shots=shots)
+        return self.prices(job.result().get_counts(), alpha)
+
+    def simulate(self, shots: int = 1000, alpha: float = 0.05, seed: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+        '''Noiseless counterpart of ``run``: the counts are sampled from one statevector per
+        instrument, see ``simulate_mlae_counts``, without building any Grover circuit.'''
+        rng = np.random.default_rng(seed)
+        results = np.vstack([simulate_mlae_counts(problem, shots, rng.integers(2**32))
+                             for problem in self.estimation_problems()])
+        return self.prices(results, alpha)
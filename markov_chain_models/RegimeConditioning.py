@@ -0,0 +1,256 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+from concurrent.futures import Executor
+from itertools import product
+from typing import Optional, Sequence, Union
+
+import numpy as np
+from qiskit import QuantumCircuit, transpile
+from qiskit.circuit import ControlledGate
+
+from .EstimationProblem import EstimationProblem
+from .MarkovChain import markov_chain_gate
+from .MLAE import construct_mlae_circuits, compute_mle, compute_confidence_interval, simulate_mlae_counts, _get_counts
+from .ModelSpec import ModelSpec
+
+
+class RegimeConditioning:
+    '''Splits a model into conditional circuits, one per path of its first regimes.
+
+    In ``DerivativePricing``, ``DynamicCreditRisk`` and ``StaticCreditRisk`` the regime
+    qubits of the Markov chain only control the rest of the circuit. Fixing the first
+    ``num_fixed`` of them (the steady state regime and the regimes of the first steps) to a
+    path leaves a circuit without those qubits: the controlled gates lose the fixed controls,
+    or vanish if the path does not match their control state, and the Markov chain starts from
+    the last fixed regime. The amplitude of the model is the average of the conditional
+    amplitudes weighted by the exact path probabilities,
+
+        a = sum_path P(path) a_path,
+
+    so the ``2**num_fixed`` narrower circuits can be estimated independently, on several
+    processes or backends, and recombined. The estimates are independent, their variances add
+    with the squared weights.
+
+    Only the path encoding of the Markov chain has regime qubits, ``DynamicCreditRisk`` with
+    ``encoding='count'`` can not be conditioned. Flattened models are conditioned through
+    their nested construction.
+
+    Example:
+
+        >>> split = RegimeConditioning(ModelSpec.of(DerivativePricing, 1.0, 3), num_fixed=2)
+        >>> estimate, interval = split.simulate(shots=1000, executor=ProcessPoolExecutor())
+    '''
+
+    def __init__(self, spec: ModelSpec, num_fixed: int) -> None:
+        '''
+        Args:
+            spec: The model, see ``ModelSpec``.
+            num_fixed: Number of regime qubits fixed classically, at most ``time_steps+1``.
+        '''
+        '''The parameters are read from the spec and the model without its gates, only the
+        conditional circuits are synthesized'''
+        arguments = spec.arguments(defaults=True)
+        if arguments.get('encoding', 'path') != 'path':
+            raise ValueError('Only the path encoding has regime qubits to condition on.')
+        time_steps = arguments['time_steps']
+        if not 0 < num_fixed <= time_steps+1:
+            raise ValueError('num_fixed must be in [1, {}], got {}.'.format(time_steps+1, num_fixed))
+
+        self.spec = spec
+        self.num_fixed = num_fixed
+        self.time_steps = time_steps
+        self.prob_gb = arguments['prob_gb']
+        self.prob_bg = arguments['prob_bg']
+        self.post_processing = getattr(spec.replace(lazy=True).build(cache=False), 'post_processing',
+                                       lambda value: value)
+
+    def paths(self) -> list[tuple[tuple[int, ...], float]]:
+        '''Every path of the fixed regimes, 0 good and 1 bad, with its probability. Paths of
+        probability 0 are left out.'''
+        prob_gb, prob_bg = self.prob_gb, self.prob_bg
+        steady = [prob_bg/(prob_gb+prob_bg), prob_gb/(prob_gb+prob_bg)]
+        transition = [[1-prob_gb, prob_gb], [prob_bg, 1-prob_bg]]
+
+        paths = []
+        for path in product([0, 1], repeat=self.num_fixed):
+            probability = steady[path[0]]
+            for previous, regime in zip(path, path[1:]):
+                probability *= transition[previous][regime]
+            if probability > 0:
+                paths.append((path, probability))
+        return paths
+
+    def circuit(self, path: Sequence[int]) -> tuple[QuantumCircuit, int]:
+        '''The conditional circuit of ``path`` and the index of its objective qubit.'''
+        return _conditional_circuit(self.spec, tuple(path))
+
+    def estimation_problems(self) -> list[EstimationProblem]:
+        '''One conditional estimation problem per path, without post processing.'''
+        problems = []
+        for path, _ in self.paths():
+            circuit, objective = self.circuit(path)
+            problems.append(EstimationProblem(state_preparation=circuit, objective_qubits=objective))
+        return problems
+
+    def combine(self,
+                estimations: Sequence[float],
+                intervals: Sequence[tuple[float, float]]) -> tuple[float, np.ndarray]:
+        '''Recombines the conditional amplitudes of all paths.
+
+        The amplitude is the weighted sum of the estimations. The half widths of the intervals,
+        normal with the same confidence level for Fisher information intervals, add in
+        quadrature with the weights. Both are post processed like the model.
+
+        Returns:
+            The post processed estimate and its confidence interval.
+        '''
+        weights = np.array([probability for _, probability in self.paths()])
+        intervals = np.asarray(intervals, dtype=float)
+        estimation = float(weights @ np.asarray(estimations, dtype=float))
+        half_width = np.sqrt(np.sum((weights*(intervals[:, 1] - intervals[:, 0])/2)**2))
+        low, high = max(0.0, estimation - half_width), min(1.0, estimation + half_width)
+        return (float(self.post_processing(estimation)),
+                np.sort([self.post_processing(low), self.post_processing(high)]))
+
+    def circuits(self, measurement: bool = True) -> list[QuantumCircuit]:
+        '''The MLAE circuits of all paths, path after path in the order of the evaluation schedule.'''
+        circuits = []
+        for problem in self.estimation_problems():
+            circuits += construct_mlae_circuits(problem, measurement=measurement)
+        return circuits
+
+    def results(self,
+                circuit_results: Sequence[dict] | np.ndarray,
+                alpha: float = 0.05,
+                problems: Optional[Sequence[EstimationProblem]] = None) -> tuple[float, np.ndarray]:
+        '''The estimate and confidence interval from the results of ``circuits``, see ``combine``.
+        ``problems`` are those of ``estimation_problems``, built again if not given.'''
+        if problems is None:
+            problems = self.estimation_problems()
+        num_powers = len(circuit_results)//len(problems)
+
+        estimations, intervals = [], []
+        for index, problem in enumerate(problems):
+            results = circuit_results[index*num_powers:(index+1)*num_powers]
+            estimation = compute_mle(results, problem)
+            _, all_counts = _get_counts(results, problem)
+            estimations.append(estimation)
+            intervals.append(compute_confidence_interval(estimation, all_counts, alpha))
+        return self.combine(estimations, intervals)
+
+    def run(self, backends, shots: int = 1000, alpha: float = 0.05, **transpile_options) -> tuple[float, np.ndarray]:
+        '''Runs the MLAE circuits of the paths on one backend or spread over a list of backends,
+        one job per backend submitted before any result is awaited, see ``results``.'''
+        backends = list(backends) if isinstance(backends, (list, tuple)) else [backends]
+        problems = self.estimation_problems()
+        num_powers = len(construct_mlae_circuits(problems[0]))
+
+        jobs = []
+        for index, backend in enumerate(backends):
+            circuits = []
+            for problem in problems[index::len(backends)]:
+                circuits += construct_mlae_circuits(problem, measurement=True)
+            if circuits:
+                jobs.append(backend.run(transpile(circuits, backend, **transpile_options), shots=shots))
+
+        '''Back to the order of the paths'''
+        counts = [job.result().get_counts() for job in jobs]
+        circuit_results = []
+        for index in range(len(problems)):
+            job_counts = counts[index % len(backends)]
+            start = (index//len(backends))*num_powers
+            circuit_results += list(job_counts[start:start+num_powers])
+        return self.results(circuit_results, alpha, problems)
+
+    def simulate(self,
+                 shots: Union[int, Sequence[int]] = 1000,
+                 alpha: float = 0.05,
+                 seed: Optional[int] = None,
+                 executor: Optional[Executor] = None) -> tuple[float, np.ndarray]:
+        '''Noiseless counterpart of ``run``: the counts of every path are sampled from one
+        statevector of its conditional circuit, see ``simulate_mlae_counts``, optionally in
+        parallel on an ``Executor``. The conditional circuits are built once, here, and sent
+        to the workers.
+
+        Args:
+            shots: Shots per circuit, for all paths or per path in the order of ``paths``.
+            alpha: Confidence level of the interval.
+            seed: Seed of the samplers.
+            executor: Simulates the paths in parallel, e.g. a ``ProcessPoolExecutor``.
+        '''
+        problems = self.estimation_problems()
+        shots = np.broadcast_to(shots, len(problems)).tolist()
+        seeds = np.random.default_rng(seed).integers(2**32, size=len(problems)).tolist()
+
+        mapper = executor.map if executor is not None else map
+        results = np.vstack(list(mapper(simulate_mlae_counts, problems, shots, seeds)))
+        return self.results(results, alpha, problems)
+
+
+def _conditional_circuit(spec: ModelSpec, path: tuple) -> tuple[QuantumCircuit, int]:
+    model = spec.build()
+    if model.flatten:
+        model = spec.replace(flatten=False).build()
+
+    num_fixed = len(path)
+    kept = [qubit for qubit in range(model.num_qubits) if qubit >= num_fixed]
+    positions = {qubit: index for index, qubit in enumerate(kept)}
+    circuit = QuantumCircuit(len(kept), name='{}_{}'.format(model.name, ''.join(map(str, path))))
+
+    '''The chain on the regimes that are not fixed, started from the last fixed regime'''
+    chain = None
+    if num_fixed <= model.time_steps:
+        chain = markov_chain_gate(model.time_steps-num_fixed, model.prob_gb, model.prob_bg, path[-1])
+
+    _append_conditional(circuit, model, list(range(model.num_qubits)), dict(enumerate(path)), positions,
+                        chain, {})
+    return circuit, positions[model.objective]
+
+
+def _append_conditional(circuit, source, qargs, values, positions, chain, conditioned):
+    '''Appends the instructions of ``source`` on ``qargs`` with the qubits of ``values`` fixed
+    to their basis states. ``conditioned`` memoizes the reduced controlled gates.'''
+    for instruction in source.data:
+        operation = instruction.operation
+        targets = [qargs[source.find_bit(qubit).index] for qubit in instruction.qubits]
+        fixed = [target for target in targets if target in values]
+
+        if not fixed:
+            circuit.append(operation, [positions[target] for target in targets])
+        elif operation.name == 'MC':
+            if chain is not None:
+                circuit.append(chain, [positions[target] for target in targets if target not in values])
+        elif isinstance(operation, ControlledGate) and set(fixed) <= set(targets[:operation.num_ctrl_qubits]):
+            controls = targets[:operation.num_ctrl_qubits]
+            states = [(operation.ctrl_state >> index) & 1 for index in range(len(controls))]
+            if any(values[control] != state for control, state in zip(controls, states) if control in values):
+                continue
+            free = [index for index, control in enumerate(controls) if control not in values]
+            key = (id(operation), tuple(free))
+            if key not in conditioned:
+                gate = operation.base_gate
+                if free:
+                    gate = gate.control(len(free), ctrl_state=sum(states[index] << bit for bit, index in enumerate(free)))
+                # keep the operation alive so that its id is not reused
+                conditioned[key] = (operation, gate)
+            qubits = [controls[index] for index in free]+targets[operation.num_ctrl_qubits:]
+            circuit.append(conditioned[key][1], [positions[qubit] for qubit in qubits])
+        elif operation.definition is not None:
+            _append_conditional(circuit, operation.definition, targets, values, positions, chain, conditioned)
+        else:
+            raise ValueError('The regime qubits {} are not only controls of {}.'.format(fixed, operation.name))
+    circuit.global_phase += source.global_phase
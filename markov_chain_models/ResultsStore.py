@@ -0,0 +1,278 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+import ast
+import json
+import os
+import re
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from .MLAE import MLAE_POWERS
+
+
+class ResultsStore:
+    '''Compact on-disk store for measurement counts and their metadata.
+
+    The store is a directory holding two files:
+
+    * ``counts.bin``: every count histogram, appended one after the other as a flat float64
+      array. The histogram of a result on ``m`` measured bits is a dense array of length
+      ``2**m`` indexed by the integer value of the measured bitstring. It is read back through
+      ``numpy.memmap``, so loading a store does not parse or copy any counts.
+    * ``index.json``: one record per result with the ``problem``, Grover ``power`` and
+      ``backend`` it belongs to, the ``offset``/``num_bits`` of its histogram in ``counts.bin``
+      and any other metadata (``shots``, ``depth``, ``handle``, ``cost``, ...). Records without
+      counts, such as result handles of jobs that were never retrieved, have ``offset`` -1.
+
+    Counts are stored as float64 so that quasi-distributions (normalized probabilities) can
+    be stored alongside integer shot counts.
+
+    Example:
+
+        >>> store = ResultsStore('results')
+        >>> import_json(store, 'hardware_results/probabilities.json')
+        >>> store.save()
+        >>> counts = store.mlae_counts('MLAE', 'Torino')
+        >>> compute_mle(counts, problem)
+    '''
+
+    def __init__(self, path: str) -> None:
+        '''
+        Args:
+            path: Directory of the store. It is created if it does not exist.
+        '''
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._index_path = os.path.join(path, 'index.json')
+        self._counts_path = os.path.join(path, 'counts.bin')
+
+        if os.path.exists(self._index_path):
+            with open(self._index_path, 'r') as file:
+                self._records = json.load(file)['records']
+        else:
+            self._records = []
+
+        if not os.path.exists(self._counts_path):
+            open(self._counts_path, 'wb').close()
+
+        self._memmap = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __enter__(self) -> 'ResultsStore':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.save()
+
+    def save(self) -> None:
+        '''Writes the metadata index. The counts are written as they are added.'''
+        with open(self._index_path, 'w') as file:
+            json.dump({'records': self._records}, file)
+
+    def add(self,
+            problem: str,
+            power: int,
+            backend: str,
+            counts: Optional[Union[dict, np.ndarray]] = None,
+            **metadata) -> int:
+        '''Adds one result to the store.
+
+        Args:
+            problem: Label of the estimation problem, e.g. ``'dcr(1,3)'``.
+            power: Number of Grover operator applications of the measured circuit.
+            backend: Name of the backend the circuit was run on.
+            counts: The measurement outcomes, either as a qiskit counts dictionary keyed by
+                bitstring or as a dense array indexed by the integer value of the outcome.
+                ``None`` stores only the metadata.
+            metadata: Any other JSON serializable fields to keep in the index.
+
+        Returns:
+            The id of the new record.
+        '''
+        record = {'problem': problem, 'power': power, 'backend': backend, 'offset': -1, 'num_bits': 0}
+
+        if counts is not None:
+            array = counts_to_array(counts)
+            offset = os.path.getsize(self._counts_path) // array.itemsize
+            with open(self._counts_path, 'ab') as file:
+                file.write(array.tobytes())
+            record['offset'] = offset
+            record['num_bits'] = int(np.log2(len(array)))
+            self._memmap = None
+
+        record.update(metadata)
+        self._records.append(record)
+        return len(self._records) - 1
+
+    def records(self,
+                problem: Optional[str] = None,
+                power: Optional[int] = None,
+                backend: Optional[str] = None,
+                with_counts: bool = False) -> list[tuple[int, dict]]:
+        '''Returns the ``(id, record)`` pairs matching all of the given fields.'''
+        selected = []
+        for record_id, record in enumerate(self._records):
+            if problem is not None and record['problem'] != problem:
+                continue
+            if power is not None and record['power'] != power:
+                continue
+            if backend is not None and record['backend'] != backend:
+                continue
+            if with_counts and record['offset'] < 0:
+                continue
+            selected.append((record_id, record))
+        return selected
+
+    def counts(self, record_id: int) -> np.ndarray:
+        '''Returns the histogram of a record as a read-only view into the memory map.'''
+        record = self._records[record_id]
+        if record['offset'] < 0:
+            raise ValueError('Record {} has no counts stored.'.format(record_id))
+        if self._memmap is None:
+            self._memmap = np.memmap(self._counts_path, dtype=np.float64, mode='r')
+        return self._memmap[record['offset']:record['offset'] + 2**record['num_bits']]
+
+    def mlae_counts(self,
+                    problem: str,
+                    backend: str,
+                    powers: Sequence[int] = MLAE_POWERS,
+                    experiment: Optional[int] = None) -> np.ndarray:
+        '''Stacks the histograms of one MLAE run into an array of shape ``(len(powers), 2**m)``
+        that can be passed to ``compute_mle`` as ``circuit_results``.
+
+        Args:
+            problem: Label of the estimation problem.
+            backend: Name of the backend.
+            powers: The Grover powers, in the order of the evaluation schedule.
+            experiment: Selects one repetition if the store holds several runs of the problem.
+
+        Raises:
+            ValueError: If no result or more than one result is stored for one of the powers.
+        '''
+        rows = []
+        for power in powers:
+            matches = [record_id for record_id, record in self.records(problem, power, backend, with_counts=True)
+                       if experiment is None or record.get('experiment') == experiment]
+            if len(matches) != 1:
+                raise ValueError(
+                    'Expected one result for problem {}, power {} on {}, found {}.'
+                    ''.format(problem, power, backend, len(matches))
+                )
+            rows.append(self.counts(matches[0]))
+        return np.vstack(rows)
+
+    def mlae_metadata(self,
+                      problem: str,
+                      backend: str,
+                      field: str = 'depth',
+                      powers: Sequence[int] = MLAE_POWERS) -> list:
+        '''Collects one metadata field, e.g. the ``depth`` passed to ``compute_noise_aware_mle``,
+        per power of an MLAE run. Powers without the field give ``None``.'''
+        values = []
+        for power in powers:
+            matches = [record[field] for _, record in self.records(problem, power, backend) if field in record]
+            values.append(matches[0] if matches else None)
+        return values
+
+
+def counts_to_array(counts: Union[dict, np.ndarray]) -> np.ndarray:
+    '''Converts a counts dictionary keyed by bitstring into a dense float64 array indexed
+    by the integer value of the bitstring.'''
+    if not isinstance(counts, dict):
+        return np.ascontiguousarray(counts, dtype=np.float64)
+
+    keys = [str(key).replace(' ', '') for key in counts.keys()]
+    num_bits = max(len(key) for key in keys)
+    array = np.zeros(2**num_bits, dtype=np.float64)
+    for key, value in zip(keys, counts.values()):
+        array[int(key, 2)] += value
+    return array
+
+
+def _parse_handles(handles: str) -> list[list]:
+    '''Parses the stringified result handles recorded by the hardware runs, either a single
+    tuple ``"('id', 'null', 1, '[[\\"c\\", 0]]')"`` or a list ``"[ResultHandle(...), ...]"``'''
+    if handles.lstrip().startswith('['):
+        return [list(ast.literal_eval('(' + handle + ')'))
+                for handle in re.findall(r'ResultHandle\((.*?)\)', handles)]
+    return [list(ast.literal_eval(handles))]
+
+
+def import_json(store: ResultsStore, path: str, backend: Optional[str] = None) -> list[int]:
+    '''Imports one of the ``hardware_results/*.json`` files into ``store``.
+
+    Two layouts are understood:
+
+    * counts files such as ``probabilities.json``, mapping ``'<backend>_<problem>'`` to a list
+      of counts dictionaries. A list with one entry per MLAE power is stored under those
+      powers, any other list as power 0 with an ``experiment`` index.
+    * handle files such as ``quantinuum.json``, ``quantinuum_MLAE.json`` and
+      ``quantinuum_MSE.json``, mapping circuit labels to result handles plus per-label
+      metadata tables (``depth``, ``cost``, ...). These are stored as records without counts.
+      Labels of the form ``qc_a_q_<k>`` are stored as power ``k`` of a problem named after the
+      file.
+
+    Args:
+        store: The store to add the records to.
+        path: Path of the JSON file.
+        backend: Backend name for handle files. Defaults to the file name up to the first '_'.
+
+    Returns:
+        The ids of the new records.
+    '''
+    with open(path, 'r') as file:
+        content = json.load(file)
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    added = []
+
+    if all(isinstance(value, list) for value in content.values()):
+        for key, results in content.items():
+            run_backend, _, problem = key.partition('_')
+            if problem.endswith('MLAE') and len(results) == len(MLAE_POWERS):
+                for power, counts in zip(MLAE_POWERS, results):
+                    added.append(store.add(problem, power, run_backend, counts, source=stem))
+            else:
+                for experiment, counts in enumerate(results):
+                    added.append(store.add(problem, 0, run_backend, counts, source=stem, experiment=experiment))
+        return added
+
+    backend = backend or stem.split('_')[0]
+    handle_key = 'handles' if 'handles' in content else 'handle'
+    tables = {key.lower(): value for key, value in content.items()
+              if isinstance(value, dict) and key != handle_key}
+    notes = {key: value for key, value in content.items() if isinstance(value, str)}
+
+    for label, handles in content[handle_key].items():
+        match = re.fullmatch(r'qc_a_q_(\d+)', label)
+        problem, power = (stem, int(match.group(1))) if match else (label, 0)
+        metadata = {name: _to_number(table[label]) for name, table in tables.items() if label in table}
+        for experiment, handle in enumerate(_parse_handles(handles)):
+            added.append(store.add(problem, power, backend, handle=handle, experiment=experiment,
+                                   source=stem, notes=notes, **metadata))
+    return added
+
+
+def _to_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return value
+    return int(number) if number.is_integer() and '.' not in str(value) else number
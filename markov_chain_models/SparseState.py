@@ -0,0 +1,197 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+from typing import Optional, Sequence
+
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit.quantum_info import Operator, Statevector
+
+'''Gates on at most this many qubits are applied as matrices, larger ones via their definition'''
+MAX_MATRIX_QUBITS = 5
+
+
+class SparseState:
+    '''Statevector that only stores its non-zero amplitudes, as an array of basis state
+    indices and an array of amplitudes.
+
+    The model circuits keep most of their registers in computational basis states: the
+    Markov chain and the binomial tree only span the paths, and the comparators, weighted
+    adders and QFT-basis adders permute or phase those paths. The memory and time of the
+    simulation then scale with the number of non-zero amplitudes (the support) rather than
+    with ``2**num_qubits``. If the support grows beyond ``dense_fraction`` of the full
+    state, the simulation continues on a dense vector.
+
+    Gates on up to ``MAX_MATRIX_QUBITS`` qubits are applied through their matrix, with fast
+    paths for diagonal gates (phases) and for permutations with phases (X, CX, MCX, ...),
+    which never change the support. Larger gates are unrolled through their definition.
+
+    Example:
+
+        >>> model = StaticCreditRisk(1, 3)
+        >>> SparseState.from_circuit(model).probabilities([model.objective])
+    '''
+
+    def __init__(self,
+                 num_qubits: int,
+                 indices: Optional[np.ndarray] = None,
+                 amplitudes: Optional[np.ndarray] = None,
+                 tolerance: float = 1e-12,
+                 dense_fraction: float = 0.5,
+                 ) -> None:
+        '''
+        Args:
+            num_qubits: Number of qubits.
+            indices: Basis states with a non-zero amplitude. Defaults to ``|0...0>``.
+            amplitudes: The amplitudes of ``indices``.
+            tolerance: Amplitudes of smaller magnitude are dropped.
+            dense_fraction: Fraction of the ``2**num_qubits`` amplitudes above which the
+                simulation switches to a dense vector.
+        '''
+        self.num_qubits = num_qubits
+        self.tolerance = tolerance
+        self.dense_fraction = dense_fraction
+        if indices is None:
+            indices, amplitudes = np.zeros(1, dtype=np.int64), np.ones(1, dtype=complex)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.amplitudes = np.asarray(amplitudes, dtype=complex)
+        self._dense = None
+        self._matrices = {}
+
+    @classmethod
+    def from_circuit(cls, circuit: QuantumCircuit, **options) -> 'SparseState':
+        '''Simulates ``circuit`` from ``|0...0>``, see ``SparseState`` for the options.'''
+        state = cls(circuit.num_qubits, **options)
+        return state.evolve(circuit)
+
+    def __len__(self) -> int:
+        '''The size of the support.'''
+        self._to_sparse()
+        return len(self.indices)
+
+    def evolve(self, circuit: QuantumCircuit, qargs: Optional[Sequence[int]] = None) -> 'SparseState':
+        '''Applies ``circuit`` on ``qargs``, in place, and returns the state.'''
+        qargs = list(range(self.num_qubits)) if qargs is None else list(qargs)
+        for instruction in circuit.data:
+            operation = instruction.operation
+            targets = [qargs[circuit.find_bit(qubit).index] for qubit in instruction.qubits]
+            if operation.name == 'barrier':
+                continue
+            if operation.name in ('measure', 'reset') or instruction.clbits:
+                raise ValueError('SparseState only simulates unitary circuits, found {}.'.format(operation.name))
+            if operation.num_qubits > MAX_MATRIX_QUBITS and operation.definition is not None:
+                self.evolve(operation.definition, targets)
+            else:
+                self._apply(self._matrix(operation), targets)
+        self._phase(circuit.global_phase)
+        return self
+
+    def _matrix(self, operation) -> np.ndarray:
+        key = id(operation)
+        if key not in self._matrices:
+            # keep the operation alive so that its id is not reused during the simulation
+            self._matrices[key] = (operation, Operator(operation).data)
+        return self._matrices[key][1]
+
+    def _phase(self, phase) -> None:
+        phase = float(phase)
+        if phase != 0:
+            if self._dense is not None:
+                self._dense *= np.exp(1j*phase)
+            else:
+                self.amplitudes *= np.exp(1j*phase)
+
+    def _apply(self, matrix: np.ndarray, qargs: list[int]) -> None:
+        if self._dense is not None:
+            self._apply_dense(matrix, qargs)
+            return
+
+        num_targets = len(qargs)
+        local = np.zeros(len(self.indices), dtype=np.int64)
+        for bit, qubit in enumerate(qargs):
+            local |= ((self.indices >> qubit) & 1) << bit
+        deposit = np.zeros(2**num_targets, dtype=np.int64)
+        for bit, qubit in enumerate(qargs):
+            deposit |= ((np.arange(2**num_targets) >> bit) & 1) << qubit
+        cleared = self.indices & ~deposit[-1]
+
+        nonzero = np.abs(matrix) > self.tolerance
+        if np.all(nonzero.sum(axis=0) == 1):
+            # permutation with phases, diagonal gates included: the support only moves
+            image = np.argmax(nonzero, axis=0)
+            self.amplitudes = self.amplitudes * matrix[image, np.arange(2**num_targets)][local]
+            self.indices = cleared | deposit[image[local]]
+            return
+
+        rows, columns = np.nonzero(nonzero)
+        order = np.argsort(columns, kind='stable')
+        rows, columns = rows[order], columns[order]
+        starts = np.searchsorted(columns, np.arange(2**num_targets))
+        counts = np.bincount(columns, minlength=2**num_targets)
+
+        '''Every amplitude branches into the non-zero entries of its column'''
+        repeats = counts[local]
+        source = np.repeat(np.arange(len(local)), repeats)
+        offset = np.arange(len(source)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        entry = starts[local[source]] + offset
+        indices = cleared[source] | deposit[rows[entry]]
+        amplitudes = self.amplitudes[source] * matrix[rows[entry], columns[entry]]
+
+        indices, inverse = np.unique(indices, return_inverse=True)
+        summed = (np.bincount(inverse, weights=amplitudes.real, minlength=len(indices))
+                  + 1j*np.bincount(inverse, weights=amplitudes.imag, minlength=len(indices)))
+        keep = np.abs(summed) > self.tolerance
+        self.indices, self.amplitudes = indices[keep], summed[keep]
+
+        if len(self.indices) > self.dense_fraction * 2**self.num_qubits:
+            self._to_dense()
+
+    def _to_dense(self) -> None:
+        self._dense = np.zeros(2**self.num_qubits, dtype=complex)
+        self._dense[self.indices] = self.amplitudes
+        self.indices = self.amplitudes = None
+
+    def _to_sparse(self) -> None:
+        if self._dense is not None:
+            self.indices = np.flatnonzero(np.abs(self._dense) > self.tolerance)
+            self.amplitudes = self._dense[self.indices]
+            self._dense = None
+
+    def _apply_dense(self, matrix: np.ndarray, qargs: list[int]) -> None:
+        # qubit q is axis num_qubits-1-q of the tensor, the first qarg the last axis of the matrix
+        num_targets = len(qargs)
+        tensor = self._dense.reshape([2]*self.num_qubits)
+        gate = matrix.reshape([2]*(2*num_targets))
+        axes = [self.num_qubits-1-qubit for qubit in reversed(qargs)]
+        tensor = np.tensordot(gate, tensor, axes=(list(range(num_targets, 2*num_targets)), axes))
+        self._dense = np.moveaxis(tensor, list(range(num_targets)), axes).reshape(-1)
+
+    def probabilities(self, qargs: Optional[Sequence[int]] = None) -> np.ndarray:
+        '''Measurement probabilities of ``qargs``, in the ordering of ``Statevector``. Only an
+        array of ``2**len(qargs)`` entries is allocated.'''
+        self._to_sparse()
+        qargs = list(range(self.num_qubits)) if qargs is None else list(qargs)
+        outcome = np.zeros(len(self.indices), dtype=np.int64)
+        for bit, qubit in enumerate(qargs):
+            outcome |= ((self.indices >> qubit) & 1) << bit
+        return np.bincount(outcome, weights=np.abs(self.amplitudes)**2, minlength=2**len(qargs))
+
+    def to_statevector(self) -> Statevector:
+        '''The dense statevector.'''
+        self._to_sparse()
+        data = np.zeros(2**self.num_qubits, dtype=complex)
+        data[self.indices] = self.amplitudes
+        return Statevector(data)
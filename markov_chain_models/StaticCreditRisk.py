@@ -15,8 +15,9 @@ Copyright 2024 Jack Morgan
 '''
 
 # Importing standard Qiskit libraries
-from .MarkovChain import MarkovChain
+from .MarkovChain import MarkovChain, markov_chain_gate
 from .NormalDistribution import NormalDistribution
+from .LazyCircuit import LazyCircuit
 
 from qiskit import QuantumCircuit
 
@@ -25,44 +26,70 @@ from qiskit import QuantumCircuit
 from qiskit.circuit.library.arithmetic import PolynomialPauliRotations, WeightedAdder, IntegerComparator
 from qiskit.circuit.library import IntegerComparator
 from typing import Optional
-from scipy.stats import norm, linregress
+from scipy.special import ndtr
 
-class StaticCreditRisk(QuantumCircuit):
+def linear_default_model(default_probs, sensitivities, z_qubits, time_steps):
+    '''Slopes and intercepts of the linear fit, over the grid 0..2**z_qubits-1 of the systemic
+    factor, of the rotation angle per time step that loads the default probability of a group.
+    The parameters are arrays of the same shape, e.g. (groups,) or (scenarios, groups), fitted
+    all at once'''
+    default_probs, sensitivities = np.broadcast_arrays(np.asarray(default_probs, dtype=float),
+                                                       np.asarray(sensitivities, dtype=float))
+    j = np.arange(2**z_qubits)
+    pk = ndtr((default_probs[..., None] - (np.sqrt(sensitivities)[..., None]*j))/(np.sqrt(1-sensitivities)[..., None]))
+    theta = 2*np.arcsin(np.sqrt(pk))
+    slopes, intercepts = np.polyfit(j, (theta/time_steps).reshape(-1, len(j)).T, 1)
+    return slopes.reshape(default_probs.shape), intercepts.reshape(default_probs.shape)
+
+class StaticCreditRisk(LazyCircuit):
+    
+    def _LinearDefaultModel(self, default_probs, sensitivities):
+        '''Classically computes a linear approximation of the probability of default given the model 
+        parameters determined by the state of the economy. Returns the slopes and intercepts of the
+        rotation angle per group, see linear_default_model'''
+        slopes, intercepts = linear_default_model(np.asarray(default_probs, dtype=float)[:self.groups],
+                                                  np.asarray(sensitivities, dtype=float)[:self.groups],
+                                                  self.z_qubits, self.time_steps)
+        return list(slopes), list(intercepts)
+    
+    def _FactorRotations(self, slope, intercept, sector):
+        '''The rotations of a group in ``sector`` as (coefficients, factor) pairs, one linear
+        polynomial per factor register it loads on.
+        
+        The registers hold independent innovations e_j centered like the single factor Z. The
+        factor of the sector is Z_k = c + sum_j L_kj (e_j - c), L being the Cholesky factor of
+        the correlation and c the center of the grid, so the angle slope*Z_k + intercept is linear
+        in the registers and the correlation costs no controlled loader'''
+        loadings = self._cholesky[sector]
+        center = (2**self.z_qubits-1)/2
+        intercept = intercept + slope*center*(1-loadings.sum())
+        rotations = []
+        for factor, loading in enumerate(loadings):
+            if loading != 0:
+                rotations.append(([intercept if not rotations else 0, slope*loading], factor))
+        return rotations
     
     def _OneStepUncertainty(self, default_probs, sensitivities):
         '''Note: default probs is a variable in the model that determines the probability of a loan defaulting
         This function returns a circuit that adds the probability of loan x defaulting in a single time step
         via a RY Pauli Polynomial'''
         
-        '''Classically computes a linear approximation of the probability of default given the model 
-        parameters determined by the state of the economy'''
-        a_list = []
-        b_list = []
-        for i in range(self.groups):
-            x_axis = []
-            y_axis = []
-            for j in range(2**self.z_qubits):
-                pk = norm.cdf((default_probs[i] - (np.sqrt(sensitivities[i])*j))/(np.sqrt(1-sensitivities[i])))
-                theta = 2*np.arcsin(np.sqrt(pk))
-                x_axis.append(j)
-                y_axis.append(theta/self.time_steps)
-            approx = linregress(x_axis,y_axis)
-            a_list.append(approx.slope)
-            b_list.append(approx.intercept)
+        a_list, b_list = self._LinearDefaultModel(default_probs, sensitivities)
         
         '''Circuit that applies default probability to each qubit that represents a group of loans'''
-        circ_u = QuantumCircuit(self.z_qubits+self.groups)
+        circ_u = QuantumCircuit(self.num_factor_qubits+self.groups)
         
         for i in range(self.groups):
-            poly = PolynomialPauliRotations(self.z_qubits,coeffs=[b_list[i], a_list[i]], basis='Y').to_gate()
-            circ_u.append(poly,list(range(self.z_qubits))+[self.z_qubits+i])
+            for coeffs, factor in self._FactorRotations(a_list[i], b_list[i], self.sectors[i]):
+                poly = PolynomialPauliRotations(self.z_qubits,coeffs=coeffs, basis='Y').to_gate()
+                circ_u.append(poly,list(range(factor*self.z_qubits,(factor+1)*self.z_qubits))+[self.num_factor_qubits+i])
             
         return circ_u.to_gate()
     
     def _MCUncertainty(self):
         '''Circuit that controlls the appropriate "one step Uncertainty" circuit for the good and bad economy 
         for each step in the Markov Chain'''
-        circ_mcu = QuantumCircuit(self.time_steps+self.z_qubits+self.groups)
+        circ_mcu = QuantumCircuit(self.time_steps+self.num_factor_qubits+self.groups)
         
         Uncert_good = self._OneStepUncertainty(self.default_probs[0], self.sensitivities[0])
         Uncert_bad = self._OneStepUncertainty(self.default_probs[1], self.sensitivities[1])
@@ -70,7 +97,7 @@ class StaticCreditRisk(QuantumCircuit):
         for i in range(self.time_steps):
             circ_mcu.append(Uncert_good.control(ctrl_state='0'), [i]+list(range(self.time_steps,circ_mcu.num_qubits)))
             
-            circ_mcu.append(Uncert_good.control(ctrl_state='1'), [i]+list(range(self.time_steps,circ_mcu.num_qubits)))
+            circ_mcu.append(Uncert_bad.control(ctrl_state='1'), [i]+list(range(self.time_steps,circ_mcu.num_qubits)))
             
         return circ_mcu.to_gate()
     
@@ -84,31 +111,96 @@ class StaticCreditRisk(QuantumCircuit):
                  sensitivities: Optional[list[list]] = [[0.1,0.05],[0.15,0.1]],
                  weights: Optional[list] = [1, 2],
                  z_qubits: Optional[int] = 3,
+                 lazy: Optional[bool] = False,
+                 flatten: Optional[bool] = False,
+                 factor_correlation: Optional[list[list]] = None,
+                 sectors: Optional[list] = None,
                 ) -> None :
          # circuit
         
         self.time_steps = time_steps #not including the steady state solution
         self.groups = len(default_probs[0]) #number of loans Y
-        self.z_qubits = z_qubits #number of qubits used to represent our random variable
+        self.z_qubits = z_qubits #number of qubits used to represent our random variable, per factor
+        
+        '''Systemic factors: one by default, or one per sector with the given correlation. Each
+        group of loans loads on the factor of its sector, see _FactorRotations'''
+        self.factor_correlation = factor_correlation
+        self._cholesky = np.ones((1, 1))
+        if factor_correlation is not None:
+            correlation = np.asarray(factor_correlation, dtype=float)
+            if correlation.ndim != 2 or correlation.shape[0] != correlation.shape[1] or not np.allclose(correlation, correlation.T) \
+                    or not np.allclose(np.diag(correlation), 1):
+                raise ValueError('factor_correlation must be a symmetric matrix with unit diagonal.')
+            try:
+                self._cholesky = np.linalg.cholesky(correlation)
+            except np.linalg.LinAlgError:
+                raise ValueError('factor_correlation must be positive definite.')
+        self.num_factors = len(self._cholesky)
+        self.num_factor_qubits = self.num_factors*z_qubits
+        self.sectors = [0]*self.groups if sectors is None else list(sectors)
+        if len(self.sectors) != self.groups or not all(0 <= sector < self.num_factors for sector in self.sectors):
+            raise ValueError('sectors must give a factor in [0, {}) for each of the {} groups, got {}.'.format(
+                self.num_factors, self.groups, sectors))
         self.default_probs = default_probs #model parameters
         self.sensitivities = sensitivities #model parameters
         
         
+        self.loss = loss
+        self.weights = weights
+        self.prob_gb = prob_gb
+        self.prob_bg = prob_bg
+        
+        self._S = WeightedAdder(self.groups, list(weights)) #manually adjust weights here, copied as WeightedAdder modifies them
+        self._C = IntegerComparator(self._S.num_sum_qubits, loss+1, geq=False)
+        
+        qubits = 1+time_steps+self.num_factor_qubits+self.groups+self._S.num_ancillas+self._C.num_qubits
+        self.objective = qubits-self._C.num_ancillas-1 #qubit to measure and/or objective in QAE
+        
+        super().__init__(qubits, lazy=lazy, flatten=flatten)
+        
+    def _build(self):
+        
+        time_steps = self.time_steps
+        z_qubits = self.z_qubits
+        F = self.num_factor_qubits
+        S = self._S
+        C = self._C
+        
         N = NormalDistribution(z_qubits, mu=((2**z_qubits)-1)/2, sigma=((2**z_qubits)-1)/4, bounds=(0,(2**z_qubits)-1))
-        M = MarkovChain(time_steps, prob_gb, prob_bg).to_gate()
+        z_registers = [list(range(1+time_steps+k*z_qubits,1+time_steps+(k+1)*z_qubits)) for k in range(self.num_factors)]
+        
+        if self.flatten:
+            for z_register in z_registers:
+                self._inline(N, z_register)
+            self._inline(MarkovChain(time_steps, self.prob_gb, self.prob_bg, flatten=True), range(time_steps+1))
+            
+            '''Same controlled uncertainty as _MCUncertainty, one controlled rotation per group and
+            factor, with the default model of the good regime for '0' and of the bad one for '1' '''
+            controlled = {}
+            for ctrl_state, regime in [('0', 0), ('1', 1)]:
+                a_list, b_list = self._LinearDefaultModel(self.default_probs[regime], self.sensitivities[regime])
+                controlled[ctrl_state] = [(PolynomialPauliRotations(z_qubits,coeffs=coeffs, basis='Y').to_gate().control(ctrl_state=ctrl_state), factor, j)
+                                          for j in range(self.groups) for coeffs, factor in self._FactorRotations(a_list[j], b_list[j], self.sectors[j])]
+            for i in range(time_steps):
+                for ctrl_state in ['0','1']:
+                    for poly, factor, j in controlled[ctrl_state]:
+                        self.append(poly, [1+i]+z_registers[factor]+[1+time_steps+F+j])
+            
+            self._inline(S, range(1+time_steps+F,1+time_steps+F+S.num_qubits))
+            self._inline(C, list(range(1+time_steps+F+self.groups, 1+time_steps+F+self.groups+S.num_sum_qubits))+list(range(self.num_qubits-C.num_ancillas-1,self.num_qubits)))
+            return
+        
+        M = markov_chain_gate(time_steps, self.prob_gb, self.prob_bg)
         U = self._MCUncertainty()
-        S = WeightedAdder(self.groups, weights) #manually adjust weights here
-        C = IntegerComparator(S.num_sum_qubits, loss+1, geq=False)
           
-        circ = QuantumCircuit(1+time_steps+z_qubits+self.groups+S.num_ancillas+C.num_qubits)
-
-        self.objective = circ.num_qubits-C.num_ancillas-1 #qubit to measure and/or objective in QAE
+        circ = QuantumCircuit(self.num_qubits)
         
-        circ.append(N.to_gate(), qargs=range(1+time_steps,1+time_steps+z_qubits)) #prepare our random variable in a gaussian probability distribution
+        N = N.to_gate()
+        for z_register in z_registers:
+            circ.append(N, qargs=z_register) #prepare our random variables in gaussian probability distributions
         circ.append(M, qargs=range(time_steps+1)) #prepare Markov Chain Qubits
-        circ.append(U, qargs=range(1,1+time_steps+z_qubits+self.groups)) #encode the probability of a loan defaulting to the |1> state
-        circ.append(S.to_gate(), qargs=range(1+time_steps+z_qubits,1+time_steps+z_qubits+S.num_qubits)) #add the loss from each group y if the loan's qubit is |1>
-        circ.append(C.to_gate(), qargs=list(range(1+time_steps+z_qubits+self.groups, 1+time_steps+z_qubits+self.groups+S.num_sum_qubits))+list(range(-C.num_ancillas-1,0))) #Compare the sum of the losses to our input value
+        circ.append(U, qargs=range(1,1+time_steps+F+self.groups)) #encode the probability of a loan defaulting to the |1> state
+        circ.append(S.to_gate(), qargs=range(1+time_steps+F,1+time_steps+F+S.num_qubits)) #add the loss from each group y if the loan's qubit is |1>
+        circ.append(C.to_gate(), qargs=list(range(1+time_steps+F+self.groups, 1+time_steps+F+self.groups+S.num_sum_qubits))+list(range(-C.num_ancillas-1,0))) #Compare the sum of the losses to our input value
         
-        super().__init__(circ.num_qubits)
-        self.append(circ.to_gate(),range(circ.num_qubits))           
+        self.append(circ.to_gate(),range(circ.num_qubits))
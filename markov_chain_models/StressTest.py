@@ -0,0 +1,318 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+import json
+import os
+from itertools import product
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from .DynamicCreditRisk import count_distribution
+from .MLAE import construct_mlae_circuits, compute_mle, compute_confidence_interval, simulate_mlae_counts, _get_counts
+from .ModelSpec import ModelSpec
+from .NormalDistribution import NormalDistribution
+from .SparseState import SparseState
+from .StaticCreditRisk import StaticCreditRisk, linear_default_model
+
+'''Parameters a scenario may stress, per model. The others fix the structure of the circuits
+and of the loss distributions, they are shared by all scenarios'''
+STRESSED = {
+    'StaticCreditRisk': ('loss', 'prob_gb', 'prob_bg', 'default_probs', 'sensitivities'),
+    'DynamicCreditRisk': ('loss', 'prob_gb', 'prob_bg', 'growth_possibilities'),
+}
+
+'''Columns of the table before the loss distribution'''
+COLUMNS = ['scenario', 'loss', 'probability', 'expected_loss', 'value_at_risk', 'estimate', 'lower', 'upper']
+
+
+class ScenarioTable:
+    '''Compact on-disk table of the results of a stress test.
+
+    The table is a directory holding two files:
+
+    * ``table.bin``: the rows, appended one after the other as a flat float64 array and read
+      back through ``numpy.memmap``.
+    * ``columns.json``: the names of the columns.
+
+    Rows are appended as they are computed, so a long stress test can be read while it runs
+    and keeps what it computed if it stops. Missing values, e.g. the quantum estimate of a
+    scenario that was not flagged, are NaN.
+
+    Example:
+
+        >>> table = ScenarioTable('stress')
+        >>> table.column('value_at_risk')
+    '''
+
+    def __init__(self, path: str, columns: Optional[Sequence[str]] = None) -> None:
+        '''
+        Args:
+            path: Directory of the table. It is created if it does not exist.
+            columns: Names of the columns, required for a new table and checked against those
+                of an existing one.
+        '''
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._columns_path = os.path.join(path, 'columns.json')
+        self._table_path = os.path.join(path, 'table.bin')
+
+        if os.path.exists(self._columns_path):
+            with open(self._columns_path, 'r') as file:
+                self.columns = json.load(file)['columns']
+            if columns is not None and list(columns) != self.columns:
+                raise ValueError('The table at {} has the columns {}, not {}.'.format(path, self.columns, list(columns)))
+        elif columns is None:
+            raise ValueError('No table at {}, the columns of a new table are required.'.format(path))
+        else:
+            self.columns = list(columns)
+            with open(self._columns_path, 'w') as file:
+                json.dump({'columns': self.columns}, file)
+
+        if not os.path.exists(self._table_path):
+            open(self._table_path, 'wb').close()
+
+    def __len__(self) -> int:
+        return os.path.getsize(self._table_path)//(8*len(self.columns))
+
+    def append(self, rows: np.ndarray) -> None:
+        '''Appends rows of shape ``(n, len(columns))``.'''
+        rows = np.ascontiguousarray(np.atleast_2d(rows), dtype=np.float64)
+        if rows.shape[1] != len(self.columns):
+            raise ValueError('Rows need {} columns, got {}.'.format(len(self.columns), rows.shape[1]))
+        with open(self._table_path, 'ab') as file:
+            file.write(rows.tobytes())
+
+    def rows(self) -> np.ndarray:
+        '''All rows as a read-only array of shape ``(len(self), len(columns))``.'''
+        if len(self) == 0:
+            return np.zeros((0, len(self.columns)))
+        return np.memmap(self._table_path, dtype=np.float64, mode='r', shape=(len(self), len(self.columns)))
+
+    def column(self, name: str) -> np.ndarray:
+        return self.rows()[:, self.columns.index(name)]
+
+
+class StressTest:
+    '''Loss distributions of ``StaticCreditRisk`` or ``DynamicCreditRisk`` under a table of
+    stressed scenarios.
+
+    Every scenario is a dictionary of the parameters in ``STRESSED`` it changes from the base
+    model, optionally with ``'quantum': True``. All scenarios are evaluated classically, in
+    one vectorized pass over a chunk of scenarios, from the same model the circuits encode:
+
+    * ``StaticCreditRisk``: the linear default models of both regimes on the grid of the
+      systemic factors, see ``linear_default_model``, mixed over the number of bad steps of
+      the Markov chain and convolved over the groups of loans.
+    * ``DynamicCreditRisk``: the number of bad steps of the Markov chain, see
+      ``count_distribution``, without the rounding of the sum register.
+
+    Only the flagged scenarios run MLAE, all the circuits of a chunk in one backend job, or
+    noiselessly sampled from ``SparseState``. The scenarios share every sub-circuit the
+    stressed parameters do not change through the memoized gates of the models, e.g. the
+    Markov chain of equal regime probabilities or the adders of equal growths.
+
+    The results stream to a ``ScenarioTable``, one row per scenario: the probability
+    ``P(L <= loss)`` that the circuit estimates, the expected loss, the value at risk at
+    ``confidence``, the quantum estimate of the probability and its interval, and the loss
+    distribution as columns ``value_i`` and ``prob_i``.
+
+    Example:
+
+        >>> scenarios = [{'prob_gb': p, 'quantum': p == 0.3} for p in np.linspace(0.01, 0.5, 50)]
+        >>> test = StressTest(DynamicCreditRisk, scenarios, loss=1, time_steps=3)
+        >>> table = test.run('stress', shots=1000)
+        >>> table.column('value_at_risk')
+    '''
+
+    def __init__(self, model: Union[type, str], scenarios: Sequence[dict], **base) -> None:
+        '''
+        Args:
+            model: ``StaticCreditRisk`` or ``DynamicCreditRisk``, or its name.
+            scenarios: The stressed parameters of every scenario.
+            base: Constructor arguments of the model shared by all scenarios, at least ``loss``
+                and ``time_steps``.
+        '''
+        self.model = model if isinstance(model, str) else model.__name__
+        if self.model not in STRESSED:
+            raise ValueError('Stress tests support {}, got {}.'.format(sorted(STRESSED), self.model))
+        for index, scenario in enumerate(scenarios):
+            unknown = set(scenario) - set(STRESSED[self.model]) - {'quantum'}
+            if unknown:
+                raise ValueError('Scenario {} stresses {}, only {} can be stressed.'.format(
+                    index, sorted(unknown), STRESSED[self.model]))
+        self.scenarios = [dict(scenario) for scenario in scenarios]
+        self.base = base
+        self._structure = ModelSpec.of(self.model, **base).replace(lazy=True).build(cache=False)
+
+    def __len__(self) -> int:
+        return len(self.scenarios)
+
+    def parameters(self, index: int) -> dict:
+        '''The constructor arguments of the model of a scenario.'''
+        scenario = {key: value for key, value in self.scenarios[index].items() if key != 'quantum'}
+        return dict(self.base, **scenario)
+
+    def spec(self, index: int) -> ModelSpec:
+        return ModelSpec.of(self.model, **self.parameters(index))
+
+    def flagged(self) -> list[int]:
+        '''The scenarios run on the quantum pipeline.'''
+        return [index for index, scenario in enumerate(self.scenarios) if scenario.get('quantum', False)]
+
+    @property
+    def columns(self) -> list[str]:
+        width = self._width()
+        return COLUMNS + ['value_{}'.format(i) for i in range(width)] + ['prob_{}'.format(i) for i in range(width)]
+
+    def _width(self) -> int:
+        if self.model == 'StaticCreditRisk':
+            return int(sum(self._structure.weights))+1
+        return self._structure.time_steps+1
+
+    def _stacked(self, indices: Sequence[int], name: str) -> np.ndarray:
+        return np.array([self.parameters(index).get(name, getattr(self._structure, name)) for index in indices],
+                        dtype=float)
+
+    def loss_distributions(self, indices: Optional[Sequence[int]] = None) -> tuple[np.ndarray, np.ndarray]:
+        '''The losses and their probabilities of the scenarios, each of shape
+        ``(scenarios, width)``, the losses sorted in increasing order.'''
+        indices = range(len(self)) if indices is None else indices
+        if self.model == 'StaticCreditRisk':
+            probabilities = static_loss_distribution(self._structure, self._stacked(indices, 'default_probs'),
+                                                     self._stacked(indices, 'sensitivities'),
+                                                     self._stacked(indices, 'prob_gb'), self._stacked(indices, 'prob_bg'))
+            values = np.broadcast_to(np.arange(probabilities.shape[1], dtype=float), probabilities.shape)
+            return values, probabilities
+
+        growths = self._stacked(indices, 'growth_possibilities')
+        probabilities = count_distribution(self._structure.time_steps, self._stacked(indices, 'prob_gb'),
+                                           self._stacked(indices, 'prob_bg')).sum(axis=-2)
+        counts = np.arange(self._structure.time_steps+1)
+        values = self._structure.time_steps*growths[:, :1] + counts*(growths[:, 1:2] - growths[:, :1])
+        order = np.argsort(values, axis=1)
+        return np.take_along_axis(values, order, axis=1), np.take_along_axis(probabilities, order, axis=1)
+
+    def run(self,
+            path: str,
+            backend=None,
+            shots: int = 1000,
+            alpha: float = 0.05,
+            confidence: float = 0.99,
+            seed: Optional[int] = None,
+            chunk_size: int = 64,
+            **transpile_options) -> ScenarioTable:
+        '''Evaluates all scenarios chunk after chunk and appends their rows to the table at
+        ``path``, see the class description.
+
+        Args:
+            path: Directory of the ``ScenarioTable``.
+            backend: Backend of the flagged scenarios. ``None`` samples noiselessly.
+            shots: Shots per MLAE circuit.
+            alpha: Confidence level of the intervals of the estimates.
+            confidence: Level of the value at risk.
+            seed: Seed of the noiseless sampler.
+            chunk_size: Scenarios evaluated and written at once.
+            transpile_options: Keyword arguments of ``transpile``.
+        '''
+        table = ScenarioTable(path, self.columns)
+        rng = np.random.default_rng(seed)
+        for start in range(0, len(self), chunk_size):
+            indices = list(range(start, min(start+chunk_size, len(self))))
+            values, probabilities = self.loss_distributions(indices)
+            losses = np.array([self.parameters(index)['loss'] for index in indices], dtype=float)
+
+            cdf = np.cumsum(probabilities, axis=1)
+            rows = np.full((len(indices), len(table.columns)), np.nan)
+            rows[:, 0] = indices
+            rows[:, 1] = losses
+            rows[:, 2] = np.sum(probabilities*(values <= losses[:, None]), axis=1)
+            rows[:, 3] = np.sum(probabilities*values, axis=1)
+            rows[:, 4] = values[np.arange(len(indices)), np.argmax(cdf >= confidence - 1e-12, axis=1)]
+            rows[:, len(COLUMNS):] = np.hstack([values, probabilities])
+
+            flagged = [index for index in indices if self.scenarios[index].get('quantum', False)]
+            if flagged:
+                estimates = self._estimate([self.spec(index) for index in flagged], backend, shots, alpha, rng,
+                                           transpile_options)
+                rows[[index - start for index in flagged], 5:8] = estimates
+            table.append(rows)
+        return table
+
+    def _estimate(self, specs, backend, shots, alpha, rng, transpile_options) -> np.ndarray:
+        '''The MLAE estimate and interval of every spec, one backend job for all of them.'''
+        problems = [spec.estimation_problem() for spec in specs]
+        if backend is None:
+            results = [simulate_mlae_counts(problem, shots, rng.integers(2**32),
+                                            SparseState.from_circuit(problem.state_preparation).probabilities(
+                                                problem.objective_qubits))
+                       for problem in problems]
+        else:
+            from qiskit import transpile
+
+            circuits = [construct_mlae_circuits(problem, measurement=True) for problem in problems]
+            job = backend.run(transpile([circuit for group in circuits for circuit in group], backend,
+                                        **transpile_options), shots=shots)
+            counts = job.result().get_counts()
+            offsets = np.cumsum([0]+[len(group) for group in circuits])
+            results = [counts[begin:end] for begin, end in zip(offsets, offsets[1:])]
+
+        estimates = np.zeros((len(problems), 3))
+        for row, (problem, circuit_results) in enumerate(zip(problems, results)):
+            estimation = compute_mle(circuit_results, problem)
+            _, all_counts = _get_counts(circuit_results, problem)
+            estimates[row] = [estimation, *compute_confidence_interval(estimation, all_counts, alpha)]
+        return estimates
+
+
+def static_loss_distribution(model: StaticCreditRisk,
+                             default_probs: np.ndarray,
+                             sensitivities: np.ndarray,
+                             prob_gb: np.ndarray,
+                             prob_bg: np.ndarray) -> np.ndarray:
+    '''Distribution of the total loss 0..sum(weights) encoded by the circuit of ``model``, for
+    every row of ``default_probs`` and ``sensitivities``, of shape ``(scenarios, 2, groups)``,
+    and of ``prob_gb`` and ``prob_bg``, of shape ``(scenarios,)``. The weights, factors and
+    sectors are those of ``model``, see ``_FactorRotations``.
+
+    Every bad step rotates by the angle of the bad regime and every good one by that of the
+    good regime, so the default probabilities only depend on the number of bad steps, whose
+    distribution is ``count_distribution``.'''
+    z_qubits, time_steps = model.z_qubits, model.time_steps
+    slopes, intercepts = linear_default_model(default_probs[..., :model.groups], sensitivities[..., :model.groups],
+                                              z_qubits, time_steps)
+
+    '''Grid of the independent innovations and the sector factors on it'''
+    center = (2**z_qubits-1)/2
+    density = NormalDistribution(z_qubits, mu=center, sigma=center/2, bounds=(0, 2**z_qubits-1)).probabilities
+    innovations = np.array(list(product(range(2**z_qubits), repeat=model.num_factors)), dtype=float)
+    weights = np.prod(density[innovations.astype(int)], axis=1)
+    factors = (center + (innovations - center) @ model._cholesky.T)[:, model.sectors]
+
+    '''Default probability of every group for every number of bad steps on every grid point,
+    (scenarios, counts, grid, groups)'''
+    steps = slopes[:, :, None, :]*factors[None, None, :, :] + intercepts[:, :, None, :]
+    bad = np.arange(time_steps+1)[None, :, None, None]
+    angles = (time_steps - bad)*steps[:, :1] + bad*steps[:, 1:]
+    defaults = np.sin(angles/2)**2
+
+    distribution = np.zeros(defaults.shape[:3]+(int(sum(model.weights))+1,))
+    distribution[..., 0] = 1
+    for group, weight in enumerate(model.weights):
+        probability = defaults[..., group, None]
+        distribution = distribution*(1 - probability) + np.roll(distribution, int(weight), axis=-1)*probability
+    counts = count_distribution(time_steps, prob_gb, prob_bg).sum(axis=-2)
+    return np.einsum('scgl,sc,g->sl', distribution, counts, weights)
@@ -0,0 +1,381 @@
+'''
+Copyright 2024 Jack Morgan
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+'''
+
+import argparse
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Optional
+
+import numpy as np
+
+from .EstimationProblem import EstimationProblem
+from .MLAE import construct_mlae_circuits, compute_mle, compute_confidence_interval, simulate_mlae_counts, _get_counts
+from .ModelSpec import ModelSpec, _build_cached
+from .SparseState import SparseState
+
+'''Number of latencies kept for the metrics'''
+LATENCY_WINDOW = 1000
+
+'''Default number of specs whose problem, circuits and distribution are kept warm'''
+MAX_WARM_SPECS = 128
+
+
+class _LRUCache:
+    '''Values per spec, the least recently used evicted beyond ``maxsize``.'''
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._values = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, key, compute: Callable):
+        '''The value of ``key``, computed by ``compute()`` if it is not cached.'''
+        if key in self._values:
+            self._values.move_to_end(key)
+            return self._values[key]
+        value = compute()
+        self._values[key] = value
+        while len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+            self.evictions += 1
+        return value
+
+
+class Worker:
+    '''Long-running pricing and risk service that keeps its circuits warm.
+
+    Requests are ``ModelSpec`` of the models and are answered with the MLAE estimate and
+    confidence interval, see ``price``, or a VaR search over the ``loss`` of a credit risk
+    model, see ``value_at_risk``. Per spec the worker builds the model, its Grover operator
+    and the MLAE circuits once, and transpiles them once for its backend; later requests only
+    run them. Without a backend the counts are sampled from one ``SparseState`` of the model,
+    also kept, see ``simulate_mlae_counts``.
+
+    Concurrent identical requests, same spec and shots, are coalesced into one estimation.
+    Requests arriving within ``batch_window`` seconds of each other are submitted together,
+    one backend job per number of shots, while the next batch gathers. The estimation runs in
+    a thread, the event loop keeps accepting requests. The warm state is kept for the
+    ``max_warm_specs`` most recently used specs, e.g. the steps of recent VaR searches.
+
+    ``serve`` exposes the worker over a local TCP socket, one JSON object per line, and
+    ``python -m markov_chain_models.Worker`` runs it, see ``main``.
+
+    Example:
+
+        >>> async with Worker(MockBackend(seed=1)) as worker:
+        ...     prices = await asyncio.gather(*[worker.price(spec) for spec in specs])
+        ...     worker.metrics()
+    '''
+
+    def __init__(self,
+                 backend=None,
+                 shots: int = 1000,
+                 alpha: float = 0.05,
+                 batch_window: float = 0.01,
+                 seed: Optional[int] = None,
+                 max_warm_specs: int = MAX_WARM_SPECS,
+                 **transpile_options) -> None:
+        '''
+        Args:
+            backend: Backend to run the circuits on, e.g. ``AerSimulator()`` or a
+                ``MockBackend``. ``None`` samples noiselessly.
+            shots: Default shots per MLAE circuit.
+            alpha: Confidence level of the intervals.
+            batch_window: Seconds a batch waits for further requests after its first one.
+            seed: Seed of the noiseless sampler.
+            max_warm_specs: Number of specs whose problem, transpiled circuits and distribution
+                are kept, the least recently used are evicted.
+            transpile_options: Keyword arguments of ``transpile``.
+        '''
+        self.backend = backend
+        self.shots = shots
+        self.alpha = alpha
+        self.batch_window = batch_window
+        self.transpile_options = transpile_options
+        self._rng = np.random.default_rng(seed)
+
+        '''Warm state per spec'''
+        self._problems = _LRUCache(max_warm_specs)
+        self._circuits = _LRUCache(max_warm_specs)
+        self._distributions = _LRUCache(max_warm_specs)
+
+        self._inflight = {}
+        self._queue = None
+        self._batcher = None
+
+        self._started = None
+        self._counters = {'requests': 0, 'coalesced': 0, 'completed': 0, 'failed': 0, 'batches': 0,
+                          'jobs': 0, 'circuits': 0}
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def __aenter__(self) -> 'Worker':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        '''Stops the batching task, pending requests are cancelled.'''
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+        for future in self._inflight.values():
+            future.cancel()
+        self._inflight.clear()
+
+    async def price(self, spec: ModelSpec, shots: Optional[int] = None) -> tuple[float, np.ndarray]:
+        '''The post processed MLAE estimate of the model and its confidence interval.'''
+        key = (spec, shots or self.shots)
+        self._counters['requests'] += 1
+        if key in self._inflight:
+            self._counters['coalesced'] += 1
+            return await asyncio.shield(self._inflight[key])
+
+        if self._batcher is None:
+            self._queue = asyncio.Queue()
+            self._batcher = asyncio.create_task(self._batches())
+            self._started = self._started or time.monotonic()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        await self._queue.put((key, time.monotonic()))
+        return await asyncio.shield(future)
+
+    async def value_at_risk(self,
+                            spec: ModelSpec,
+                            confidence: float = 0.95,
+                            max_loss: Optional[int] = None,
+                            shots: Optional[int] = None) -> int:
+        '''The smallest loss whose estimated probability of not being exceeded is at least
+        ``confidence``, by bisection over the ``loss`` of a model estimating that probability,
+        e.g. ``StaticCreditRisk``. Every step is a ``price`` request, so the steps of concurrent
+        searches are batched together.
+
+        Args:
+            spec: The model, its ``loss`` is replaced.
+            confidence: Level of the VaR.
+            max_loss: Upper end of the search, defaults to the sum of the ``weights`` of the model.
+            shots: Shots per MLAE circuit.
+        '''
+        if max_loss is None:
+            weights = spec.arguments(defaults=True).get('weights')
+            if weights is None:
+                raise ValueError('{} has no weights, give max_loss.'.format(spec.model))
+            max_loss = int(sum(weights))
+        low, high = 0, max_loss
+        while low < high:
+            middle = (low + high)//2
+            estimation, _ = await self.price(spec.replace(loss=middle), shots)
+            if estimation >= confidence:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def metrics(self) -> dict:
+        '''Request counters, latencies in seconds from submission to answer of the estimations,
+        throughput in answered requests per second since the first request, the number of warm
+        specs, of their evicted problems, circuits and distributions, and of cached models.'''
+        latencies = np.array(self._latencies)
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        answered = self._counters['completed'] + self._counters['coalesced']
+        return dict(self._counters,
+                    latency_mean=float(latencies.mean()) if len(latencies) else None,
+                    latency_p50=float(np.percentile(latencies, 50)) if len(latencies) else None,
+                    latency_p95=float(np.percentile(latencies, 95)) if len(latencies) else None,
+                    throughput=answered/elapsed if elapsed > 0 else None,
+                    warm_specs=len(self._problems),
+                    evictions=sum(cache.evictions for cache in (self._problems, self._circuits, self._distributions)),
+                    cached_models=_build_cached.cache_info().currsize)
+
+    async def _batches(self) -> None:
+        '''Gathers the requests of a batch window and estimates them in a thread.'''
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.batch_window)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            keys = [key for key, _ in batch]
+            results = await asyncio.to_thread(self._process, keys)
+            self._counters['batches'] += 1
+
+            now = time.monotonic()
+            for (key, submitted), result in zip(batch, results):
+                future = self._inflight.pop(key)
+                if isinstance(result, Exception):
+                    self._counters['failed'] += 1
+                    future.set_exception(result)
+                else:
+                    self._counters['completed'] += 1
+                    self._latencies.append(now - submitted)
+                    future.set_result(result)
+
+    def _process(self, keys: list) -> list:
+        '''The estimate of every (spec, shots), or the exception that prevented it. One job is
+        submitted per number of shots.'''
+        results = [None]*len(keys)
+        groups = {}
+        for index, (_, shots) in enumerate(keys):
+            groups.setdefault(shots, []).append(index)
+
+        for shots, indices in groups.items():
+            try:
+                counts = self._counts([keys[index][0] for index in indices], shots)
+                for index, circuit_results in zip(indices, counts):
+                    results[index] = self._estimate(keys[index][0], circuit_results)
+            except Exception as error:
+                for index in indices:
+                    results[index] = error
+        return results
+
+    def _counts(self, specs: list[ModelSpec], shots: int) -> list:
+        '''The MLAE counts of every spec, from one backend job or sampled noiselessly.'''
+        if self.backend is None:
+            return [simulate_mlae_counts(self._problem(spec), shots, self._rng.integers(2**32),
+                                         self._distribution(spec)) for spec in specs]
+
+        circuits = [self._transpiled(spec) for spec in specs]
+        job = self.backend.run([circuit for group in circuits for circuit in group], shots=shots)
+        self._counters['jobs'] += 1
+        self._counters['circuits'] += sum(len(group) for group in circuits)
+
+        counts = job.result().get_counts()
+        offsets = np.cumsum([0]+[len(group) for group in circuits])
+        return [counts[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def _estimate(self, spec: ModelSpec, circuit_results) -> tuple[float, np.ndarray]:
+        problem = self._problem(spec)
+        estimation = compute_mle(circuit_results, problem)
+        _, all_counts = _get_counts(circuit_results, problem)
+        low, high = compute_confidence_interval(estimation, all_counts, self.alpha)
+        return float(problem.post_processing(estimation)), np.sort([problem.post_processing(low),
+                                                                    problem.post_processing(high)])
+
+    def _problem(self, spec: ModelSpec) -> EstimationProblem:
+        '''The estimation problem of a spec with its Grover operator built once.'''
+        def build():
+            problem = spec.estimation_problem()
+            problem.grover_operator = problem.grover_operator
+            return problem
+        return self._problems.get(spec, build)
+
+    def _distribution(self, spec: ModelSpec) -> np.ndarray:
+        def simulate():
+            problem = self._problem(spec)
+            return SparseState.from_circuit(problem.state_preparation).probabilities(problem.objective_qubits)
+        return self._distributions.get(spec, simulate)
+
+    def _transpiled(self, spec: ModelSpec) -> list:
+        def transpiled():
+            from qiskit import transpile
+
+            circuits = construct_mlae_circuits(self._problem(spec), measurement=True)
+            return transpile(circuits, self.backend, **self.transpile_options)
+        return self._circuits.get(spec, transpiled)
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765) -> asyncio.AbstractServer:
+        '''Starts answering requests on a local TCP socket, one JSON object per line:
+
+            {"id": 1, "type": "price", "model": "DerivativePricing", "args": [1.0, 3], "kwargs": {}, "shots": 1000}
+            {"id": 2, "type": "var", "model": "StaticCreditRisk", "args": [0, 3], "confidence": 0.95}
+            {"id": 3, "type": "metrics"}
+
+        answered with ``{"id", "estimate", "interval"}``, ``{"id", "var"}``, ``{"id", "metrics"}``
+        or ``{"id", "error"}``, in the order the answers are ready. The requests of a
+        connection are handled concurrently.'''
+        return await asyncio.start_server(self._connection, host, port)
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        tasks = set()
+        while line := await reader.readline():
+            task = asyncio.create_task(self._answer(line, writer))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        writer.close()
+
+    async def _answer(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        request = {}
+        try:
+            request = json.loads(line)
+            kind = request.get('type', 'price')
+            if kind == 'metrics':
+                answer = {'metrics': self.metrics()}
+            else:
+                spec = ModelSpec.of(request['model'], *request.get('args', ()), **request.get('kwargs', {}))
+                if kind == 'price':
+                    estimation, interval = await self.price(spec, request.get('shots'))
+                    answer = {'estimate': estimation, 'interval': interval.tolist()}
+                elif kind == 'var':
+                    answer = {'var': await self.value_at_risk(spec, request.get('confidence', 0.95),
+                                                              request.get('max_loss'), request.get('shots'))}
+                else:
+                    raise ValueError('Unknown request type {}.'.format(kind))
+        except Exception as error:
+            answer = {'error': '{}: {}'.format(type(error).__name__, error)}
+        writer.write((json.dumps(dict(answer, id=request.get('id') if isinstance(request, dict) else None))
+                      + '\n').encode())
+        await writer.drain()
+
+
+def main(argv: Optional[list] = None) -> None:
+    '''Runs a worker until interrupted:
+
+        python -m markov_chain_models.Worker --backend mock --port 8765
+    '''
+    parser = argparse.ArgumentParser(description='Pricing and risk worker with warm circuits.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--backend', choices=['noiseless', 'mock', 'aer'], default='noiseless')
+    parser.add_argument('--shots', type=int, default=1000)
+    parser.add_argument('--batch-window', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    backend = None
+    if args.backend == 'mock':
+        from .MockBackend import MockBackend
+        backend = MockBackend(seed=args.seed)
+    elif args.backend == 'aer':
+        from qiskit_aer import AerSimulator
+        backend = AerSimulator(seed_simulator=args.seed)
+
+    async def serve_forever():
+        async with Worker(backend, args.shots, batch_window=args.batch_window, seed=args.seed) as worker:
+            server = await worker.serve(args.host, args.port)
+            print('Serving on {}:{}'.format(*server.sockets[0].getsockname()[:2]), flush=True)
+            async with server:
+                await server.serve_forever()
+
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,79 @@
+'''The classes named like their submodules, e.g. ``MarkovChain``, are imported eagerly: importing
+a submodule binds it on the package under its own name, which would hide the class. The
+remaining names are loaded on first access (PEP 562), and the models import scipy.stats and
+scipy.optimize where they use them, so that e.g. ``compute_mle`` is imported without them.'''
+
+import importlib
+import importlib.util
+
 from .MarkovChain import MarkovChain
+from .MultiRegimeMarkovChain import MultiRegimeMarkovChain
 from .DerivativePricing import DerivativePricing
 from .DynamicCreditRisk import DynamicCreditRisk
 from .StaticCreditRisk import StaticCreditRisk
 from .EstimationProblem import EstimationProblem
-from .MLAE import construct_mlae_circuits, compute_mle
+from .ResultsStore import ResultsStore
+from .Calibration import Calibration
+from .Portfolio import Portfolio
+from .MockBackend import MockBackend
+from .ModelSpec import ModelSpec
+from .SparseState import SparseState
+from .GroverSampler import GroverSampler
+from .Greeks import Greeks
+from .RegimeConditioning import RegimeConditioning
+from .ControlVariate import ControlVariate
+from .Worker import Worker
+from .StressTest import StressTest
+
+'''Public name -> module defining it, of the names loaded on first access'''
+_MODULES = {
+    "construct_mlae_circuits": "MLAE",
+    "compute_mle": "MLAE",
+    "compute_confidence_interval": "MLAE",
+    "simulate_mlae_counts": "MLAE",
+    "compute_noise_aware_mle": "MLAE",
+    "import_json": "ResultsStore",
+    "Payoff": "Payoffs",
+    "IterativeAmplitudeEstimation": "IAE",
+    "FasterAmplitudeEstimation": "FAE",
+    "ScenarioTable": "StressTest",
+    "Plan": "Planner",
+    "plan_derivative_pricing": "Planner",
+    "plan_credit_risk": "Planner",
+}
 
 __all__ = [
     "MarkovChain",
+    "MultiRegimeMarkovChain",
     "DerivativePricing",
     "DynamicCreditRisk",
     "StaticCreditRisk",
     "EstimationProblem",
-    "construct_mlae_circuits",
-    "compute_mle",
-]
\ No newline at end of file
+    "ResultsStore",
+    "Calibration",
+    "Portfolio",
+    "MockBackend",
+    "ModelSpec",
+    "SparseState",
+    "GroverSampler",
+    "Greeks",
+    "RegimeConditioning",
+    "ControlVariate",
+    "Worker",
+    "StressTest",
+] + list(_MODULES)
+
+
+def __getattr__(name):
+    if name not in _MODULES:
+        # submodules, e.g. markov_chain_models.MLAE, as the eager imports used to bind them
+        if name.startswith("_") or importlib.util.find_spec("." + name, __name__) is None:
+            raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+        return importlib.import_module("." + name, __name__)
+    value = getattr(importlib.import_module("." + _MODULES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,56 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+
+from markov_chain_models import Calibration, MarkovChain, DerivativePricing
+from markov_chain_models.Calibration import label_regimes, NBER_CYCLES
+
+@ddt
+class TestCalibration(unittest.TestCase):
+    """Test the historical calibration against the values of ClassicalBenchmarking.ipynb."""
+    def setUp(self):
+         self.calibration = Calibration()
+
+    def test_transition_probabilities(self):
+         self.assertEqual(self.calibration.total_months, 448)
+         self.assertAlmostEqual(self.calibration.prob_gb, 0.009708737864077669)
+         self.assertAlmostEqual(self.calibration.prob_bg, 0.1111111111111111)
+
+    def test_regime_statistics(self):
+         self.assertEqual(self.calibration.observations, [7818, 747])
+         np.testing.assert_array_almost_equal(self.calibration.mean,
+                                              [[2.31114607, 3.23254925], [2.78427041, 4.32749665]])
+         np.testing.assert_array_almost_equal(self.calibration.covariance,
+                                              [[[0.18018464, 0.21486784], [0.21486784, 0.30936353]],
+                                               [[0.38344241, 0.65279315], [0.65279315, 1.54384688]]])
+
+    @data(
+         ('1990-06-29', 0),
+         ('1990-07-01', 1),
+         ('1991-02-28', 1),
+         ('1991-03-01', 0),
+         ('2020-03-15', 1),
+         ('2021-01-04', -1),
+    )
+    @unpack
+    def test_label_regimes(self, date, expected):
+         labels = label_regimes(np.array([date], dtype='datetime64[D]'), NBER_CYCLES)
+         self.assertEqual(labels[0], expected)
+
+    def test_model_params(self):
+         chain = MarkovChain(time_steps=3, **self.calibration.markov_chain_params(), lazy=True)
+         pricing = DerivativePricing(1.0, 3, **self.calibration.derivative_pricing_params(), lazy=True)
+         self.assertEqual(chain.prob_gb, pricing.prob_gb)
+         self.assertEqual(chain.prob_bg, self.calibration.prob_bg)
+
+         '''The rates and volatilities of the regimes are those of the BAA spread'''
+         np.testing.assert_array_almost_equal(pricing.rates, [[0.0223254925]*3, [0.0332749665]*3])
+         np.testing.assert_array_almost_equal(pricing.sigma[:, 0], [0.55620458/3.23254925, 1.24251635/4.32749665])
+         aaa = self.calibration.derivative_pricing_params(series='AAA', sigma=0.2)
+         np.testing.assert_array_almost_equal(aaa['rates'], [0.0131114607, 0.0178427041])
+         self.assertEqual(aaa['sigma'], 0.2)
+         with self.assertRaises(ValueError):
+              self.calibration.derivative_pricing_params(series='CCC')
+
+if __name__ == '__main__':
+     unittest.main()
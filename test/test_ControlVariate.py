@@ -0,0 +1,107 @@
+import unittest
+from types import SimpleNamespace
+from ddt import ddt, data
+import numpy as np
+
+from markov_chain_models import ControlVariate, DerivativePricing, MockBackend, ModelSpec
+from markov_chain_models.ControlVariate import _coupled_counts
+from markov_chain_models.Greeks import price
+
+class IndependentBackend(MockBackend):
+     '''Samples the circuits of ControlVariate.circuits, in their order, from their exact
+     distributions with independent shot noise, like separate circuits on a backend'''
+     def __init__(self, distributions, seed):
+          super().__init__(seed=seed)
+          self.distributions = np.vstack(distributions)
+
+     def run(self, circuits, shots):
+          rows = np.tile(self.distributions, (len(circuits)//len(self.distributions), 1))
+          counts = np.vstack([self._rng.multinomial(shots, row/row.sum()) for row in rows]).astype(float)
+          return SimpleNamespace(result=lambda: SimpleNamespace(get_counts=lambda: counts))
+
+@ddt
+class TestControlVariate(unittest.TestCase):
+    """Test the control variate correction of MLAE estimates."""
+    def setUp(self):
+         self.spec = ModelSpec.of(DerivativePricing, 1.0, 2, fractional_precision=5)
+         self.cv = ControlVariate(self.spec, self.spec.replace(fractional_precision=3))
+
+    def test_control_value(self):
+         self.assertAlmostEqual(self.cv.control_value, price(self.cv.control))
+         self.assertEqual(ControlVariate(self.spec, self.cv.control, 0.5).control_value, 0.5)
+
+    @data(0, 1, 2)
+    def test_coupled_counts(self, seed):
+         probabilities = np.array([[0.2, 0.3, 0.5], [0.6, 0.4, 0.0]])
+         uniforms = np.random.default_rng(seed).random((2, 4000))
+         counts = _coupled_counts(probabilities, uniforms)
+         np.testing.assert_array_equal(counts.sum(axis=1), [4000, 4000])
+         np.testing.assert_allclose(counts/4000, probabilities, atol=0.03)
+         '''More weight on the first outcome never lowers its count'''
+         shifted = _coupled_counts(probabilities + [[0.1, -0.1, 0], [0.1, 0, -0.1]], uniforms)
+         self.assertTrue(np.all(shifted[:, 0] >= counts[:, 0]))
+
+    def test_calibrate(self):
+         rng = np.random.default_rng(0)
+         control = rng.normal(0.3, 0.01, 50)
+         samples = np.column_stack([2*control + rng.normal(0, 0.001, 50), control])
+         self.assertAlmostEqual(self.cv.calibrate(samples), 2, delta=0.05)
+         self.assertGreater(self.cv.correlation, 0.99)
+
+         self.cv.control_value = 0.3
+         estimation, interval = self.cv.correct(0.62, 0.31, (0.5, 0.7), (0.26, 0.36))
+         self.assertAlmostEqual(estimation, 0.62 - self.cv.beta*0.01)
+         '''At the optimal beta of the intervals the interval narrows by variance_reduction'''
+         self.cv.beta = self.cv.correlation*0.1/0.05
+         estimation, interval = self.cv.correct(0.62, 0.31, (0.5, 0.7), (0.26, 0.36))
+         self.assertAlmostEqual(interval[1] - interval[0], 0.2*np.sqrt(self.cv.variance_reduction))
+
+         '''Without correlation the correction widens the interval'''
+         self.cv.correlation = 0
+         estimation, interval = self.cv.correct(0.62, 0.31, (0.5, 0.7), (0.26, 0.36))
+         self.assertAlmostEqual((interval[1] - interval[0])/2, np.sqrt(0.1**2 + (self.cv.beta*0.05)**2))
+
+    def test_not_calibrated(self):
+         with self.assertRaises(ValueError):
+              self.cv.correct(0.5, 0.5, (0.4, 0.6), (0.4, 0.6))
+         with self.assertRaises(ValueError):
+              self.cv.calibrate([(0.5, 0.5), (0.6, 0.5)])
+         with self.assertRaises(ValueError):
+              self.cv.calibrate([(0.5, 0.5), (0.6, 0.5), (0.7, 0.5)])
+
+    def test_variance_reduction(self):
+         self.cv.simulate_calibration(runs=8, shots=200, seed=0)
+         self.assertGreater(self.cv.correlation, 0.9)
+
+         problem = self.spec.estimation_problem()
+         circuits = self.cv.circuits()
+         self.assertEqual(len(circuits), 8)
+         self.assertEqual(circuits[0].num_qubits, problem.state_preparation.num_qubits)
+
+         '''Fresh runs: the corrected estimates spread much less than the plain ones'''
+         samples = self.cv.simulate_samples(runs=6, shots=200, seed=1)
+         corrected = samples[:, 0] - self.cv.beta*(samples[:, 1] - self.cv.control_value)
+         self.assertLess(np.std(corrected), 0.5*np.std(samples[:, 0]))
+
+         estimation, interval = self.cv.simulate(shots=200, seed=2)
+         self.assertAlmostEqual(estimation, np.mean(interval))
+         self.assertAlmostEqual(estimation, price(self.spec), delta=max(interval[1] - interval[0], 0.01))
+
+    def test_backend_calibration(self):
+         '''Common random numbers do not calibrate separate runs on a backend, and vice versa'''
+         backend = IndependentBackend(self.cv._distributions(), seed=0)
+         self.cv.simulate_calibration(runs=4, shots=200, seed=0)
+         with self.assertRaises(ValueError):
+              self.cv.run(backend, shots=200)
+
+         samples = self.cv.run_samples(backend, runs=4, shots=200)
+         self.assertEqual(samples.shape, (4, 2))
+         self.cv.calibrate(samples)
+         self.assertFalse(self.cv.common_random_numbers)
+         with self.assertRaises(ValueError):
+              self.cv.simulate(shots=200)
+         estimation, interval = self.cv.run(backend, shots=200)
+         self.assertAlmostEqual(estimation, np.mean(interval))
+
+if __name__ == '__main__':
+     unittest.main()
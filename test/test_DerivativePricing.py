@@ -2,7 +2,7 @@ import unittest
 from ddt import ddt, data, unpack
 import numpy as np
 
-from markov_chain_models import DerivativePricing
+from markov_chain_models import DerivativePricing, MarkovChain, SparseState
 from qiskit.quantum_info import Statevector
 from qiskit.circuit.library import QFT
 from qiskit import QuantumCircuit
@@ -94,11 +94,56 @@ class TestDerivativePricing(unittest.TestCase):
          self.AssertExpectedCiruitResult(expected=expected,
                                          circuit=circ
                                          )
-         
 
-         
-        
-         
+    def test_schedules(self):
+         dp = DerivativePricing(1.0, 3, lazy=True)
+         lu, ld = dp.increments()
+         self.assertEqual(lu.shape, (2, 3))
+         np.testing.assert_array_almost_equal(dp.sigma[:, 0], [0.2, 0.3])
+         np.testing.assert_array_almost_equal(lu - ld, 2*dp.sigma*np.sqrt(dp.time_tot/3))
+         with self.assertRaises(ValueError):
+              DerivativePricing(1.0, 3, sigma=[0.1, 0.2, 0.3], lazy=True)
+
+         '''The scalar rate r is the rate of both regimes'''
+         np.testing.assert_array_equal(DerivativePricing(1.0, 3, r=0.05, lazy=True).rates, 0.05)
+         with self.assertRaises(ValueError):
+              DerivativePricing(1.0, 3, r=0.05, rates=[0.2, 0.1], lazy=True)
+
+    def test_regime_independent_schedule(self):
+         # with the same increments in both regimes the adders are only controlled on the
+         # binomial qubits, and the price no longer depends on the transition probabilities
+         prices = []
+         for prob_gb in [0.1, 0.4]:
+              circuit = DerivativePricing(1.0, 2, prob_gb, 0.3, 1, 3, sigma=[[0.2, 0.25]], rates=0.1, flatten=True)
+              self.assertEqual(len(list(circuit._BinTreeIncrements())), 4)
+              prices.append(Statevector(circuit).probabilities([circuit.objective]))
+         np.testing.assert_array_almost_equal(prices[0], prices[1])
+
+    def test_ripple_arithmetic(self):
+         # the price register holds the rounded log price of every path exactly
+         dp = DerivativePricing(1.0, 2, 0.1, 0.3, 1, 4, arithmetic='ripple')
+         scale, size = 2**dp.fractional_precision, 2**dp.num_size
+         self.assertEqual(dp.num_qubits, DerivativePricing(1.0, 2, 0.1, 0.3, 1, 4, lazy=True).num_qubits+dp.num_size+1)
+         self.assertEqual(dp.error_bound(), 0)
+
+         lu, ld = dp.increments()
+         expected = np.zeros(size)
+         regimes = Statevector(MarkovChain(2, 0.1, 0.3)).probabilities([1, 2])
+         for regime in range(4):
+              for moves in range(4):
+                   value = np.round(np.log(dp.starting_price)*scale)+scale
+                   for step in range(2):
+                        r, move = (regime >> step) & 1, (moves >> step) & 1
+                        value += np.round((ld if move else lu)[r, step]*scale)
+                   expected[int(value) % size] += regimes[regime]/4
+         evolution = SparseState.from_circuit(dp.price_evolution().definition).probabilities(range(5, 5+dp.num_size))
+         np.testing.assert_array_almost_equal(evolution, expected)
+
+         flat = DerivativePricing(1.0, 2, 0.1, 0.3, 1, 4, arithmetic='ripple', flatten=True)
+         np.testing.assert_array_almost_equal(SparseState.from_circuit(dp).probabilities([dp.objective]),
+                                              SparseState.from_circuit(flat).probabilities([flat.objective]))
+         with self.assertRaises(ValueError):
+              DerivativePricing(1.0, 2, arithmetic='ripple', approximation_degree=1, lazy=True)
+
 if __name__ == '__main__':
     unittest.main()
-            
\ No newline at end of file
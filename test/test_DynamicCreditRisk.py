@@ -44,6 +44,64 @@ class TestDynamicCreditRisk(unittest.TestCase):
          np.testing.assert_array_almost_equal(expected, 
                                                  probabilities,
                                                  decimal=3)
-         
+
+    @data(
+         (1, 3, 0.1, 0.3, [0.771,0], 2),
+         (1, 4, 0.009708737864077669, 0.1111111111111111, [0.771,0], 4),
+         (2, 5, 0.1, 0.3, [0.771,0.3], 3),
+    )
+    @unpack
+    def test_count_encoding(self, *args):
+         path = DynamicCreditRisk(*args)
+         for flatten in [False, True]:
+              count = DynamicCreditRisk(*args, flatten=flatten, encoding='count')
+              self.assertLess(count.num_qubits, path.num_qubits)
+              np.testing.assert_array_almost_equal(Statevector(path).probabilities([path.objective]),
+                                                   Statevector(count).probabilities([count.objective]))
+
+    def test_count_encoding_width(self):
+         # 60 monthly steps fit into 6 count qubits instead of 61 path qubits
+         circuit = DynamicCreditRisk(5, 60, 0.1, 0.3, encoding='count', lazy=True)
+         self.assertEqual(circuit.num_qubits, 6+1+circuit.num_sum_qubits)
+         np.testing.assert_almost_equal(circuit.count_distribution().sum(), 1)
+         with self.assertRaises(ValueError):
+              DynamicCreditRisk(1, 3, 0.1, 0.3, encoding='binary')
+
+    @data(1, 2, 3)
+    def test_approximation_degree(self, degree):
+         exact = DynamicCreditRisk(1, 3, 0.1, 0.3)
+         approx = DynamicCreditRisk(1, 3, 0.1, 0.3, approximation_degree=degree, flatten=True)
+         self.assertEqual(exact.error_bound(), 0)
+
+         # fewer gates, and the deviation of the loss probability is within the reported bound
+         self.assertLess(len(approx.data), len(DynamicCreditRisk(1, 3, 0.1, 0.3, flatten=True).data))
+         deviation = abs(Statevector(exact).probabilities([exact.objective])[1]
+                         - Statevector(approx).probabilities([approx.objective])[1])
+         self.assertLessEqual(deviation, approx.error_bound())
+
+    @data((0, 'path'), (1, 'path'), (2, 'count'))
+    @unpack
+    def test_ripple_arithmetic(self, loss, encoding):
+         # the loss is compared exactly on the grid of the register: the growths of the good
+         # steps, rounded to the fractional precision, against the rounded loss
+         reference = None
+         for flatten in [False, True]:
+              circuit = DynamicCreditRisk(loss, 3, 0.1, 0.3, encoding=encoding, flatten=flatten, arithmetic='ripple')
+              self.assertEqual(circuit.num_qubits,
+                               DynamicCreditRisk(loss, 3, 0.1, 0.3, encoding=encoding, lazy=True).num_qubits+circuit.num_sum_qubits+1)
+              self.assertEqual(circuit.error_bound(), 0)
+              probability = Statevector(circuit).probabilities([circuit.objective])[1]
+              reference = probability if reference is None else reference
+              self.assertAlmostEqual(probability, reference)
+
+         scale = 2**circuit.fractional_precision
+         good_steps = 3-np.arange(4)
+         below = good_steps*np.round(0.771*scale) < np.round(circuit.scaled_loss*scale)
+         self.assertAlmostEqual(reference, circuit.count_distribution().sum(axis=0)[below].sum())
+         with self.assertRaises(ValueError):
+              DynamicCreditRisk(loss, 3, arithmetic='cuccaro')
+         with self.assertRaises(ValueError):
+              DynamicCreditRisk(loss, 3, arithmetic='ripple', approximation_degree=2, lazy=True)
+
 if __name__ == '__main__':
      unittest.main()
\ No newline at end of file
@@ -0,0 +1,37 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+
+from markov_chain_models import EstimationProblem
+from markov_chain_models.FAE import FasterAmplitudeEstimation
+from markov_chain_models.GroverSampler import GroverSampler
+from qiskit import QuantumCircuit
+
+@ddt
+class TestFAE(unittest.TestCase):
+    """Test Faster Amplitude Estimation."""
+    @data(0.0, 0.02, 0.2, 0.5, 1.0)
+    def test_amplitude(self, a):
+         circuit = QuantumCircuit(1)
+         circuit.ry(2*np.arcsin(np.sqrt(a)), 0)
+         problem = EstimationProblem(circuit, [0], post_processing=lambda x: 10*x)
+         result = FasterAmplitudeEstimation(epsilon_target=0.005, shots=(200, 200)).estimate(problem, GroverSampler(seed=1))
+
+         low, high = result.confidence_interval
+         self.assertLessEqual(low, a + 1e-9)
+         self.assertGreaterEqual(high, a - 1e-9)
+         self.assertLessEqual(high - low, 2*0.005 + 1e-12)
+         self.assertAlmostEqual(result.estimation_processed, 10*result.estimation)
+
+    def test_shots(self):
+         # the guaranteed shots follow the confidence level of one cosine estimate
+         fae = FasterAmplitudeEstimation.guaranteed(epsilon_target=0.01, alpha=0.05)
+         self.assertEqual(fae.shots, (int(1944*np.log(2/fae.delta)), int(972*np.log(2/fae.delta))))
+         self.assertAlmostEqual(fae.delta, 0.05/(2*fae.maxiter))
+         with self.assertRaises(TypeError):
+              FasterAmplitudeEstimation(epsilon_target=0.01)
+         with self.assertRaises(ValueError):
+              FasterAmplitudeEstimation(epsilon_target=0.01, shots=(100, 0))
+
+if __name__ == '__main__':
+    unittest.main()
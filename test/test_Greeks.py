@@ -0,0 +1,64 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+
+from markov_chain_models import DerivativePricing, DynamicCreditRisk, Greeks, ModelSpec
+from markov_chain_models.Greeks import price
+from markov_chain_models.Arithmetic import qft_adder_gate
+
+@ddt
+class TestGreeks(unittest.TestCase):
+    """Test the bump-and-reprice sensitivities."""
+    def setUp(self):
+         self.spec = ModelSpec.of(DerivativePricing, 1.0, 2)
+
+    def test_replace(self):
+         spec = ModelSpec.of(DynamicCreditRisk, 1, 3, prob_gb=0.1)
+         self.assertEqual(spec.replace(time_steps=2), ModelSpec.of(DynamicCreditRisk, loss=1, time_steps=2, prob_gb=0.1))
+         self.assertEqual(spec.replace(prob_gb=0.2).build().prob_gb, 0.2)
+         self.assertEqual(spec.arguments(), {'loss': 1, 'time_steps': 3, 'prob_gb': 0.1})
+         self.assertEqual(spec.arguments(defaults=True)['prob_bg'], DynamicCreditRisk(1, 3, lazy=True).prob_bg)
+
+    @data(('delta', 'starting_price', 0.01), ('vega', 'sigma', 0.01), ('prob_gb', 'prob_gb', 0.005))
+    @unpack
+    def test_exact_sensitivity(self, greek, parameter, bump):
+         value = getattr(self.spec.build(), parameter)
+         expected = (price(self.spec.replace(**{parameter: value + bump}))
+                     - price(self.spec.replace(**{parameter: value - bump})))/(2*bump)
+         self.assertAlmostEqual(Greeks(self.spec).sensitivities([greek])[greek], expected)
+
+    def test_rho_of_scalar_rate(self):
+         '''The rates schedule derived from the legacy rate r is bumped, r is dropped'''
+         spec = ModelSpec.of(DerivativePricing, 1.0, 2, r=0.1)
+         down, up, width = Greeks(spec).bumped('rho')
+         self.assertNotIn('r', up.arguments())
+         np.testing.assert_allclose(up.build().rates, spec.build().rates + 0.01)
+         rates = spec.build().rates
+         expected = (price(ModelSpec.of(DerivativePricing, 1.0, 2, rates=rates + 0.01))
+                     - price(ModelSpec.of(DerivativePricing, 1.0, 2, rates=rates - 0.01)))/0.02
+         self.assertAlmostEqual(Greeks(spec).sensitivities(['rho'])['rho'], expected)
+
+    def test_common_random_numbers(self):
+         exact = Greeks(self.spec).sensitivities(['delta'])['delta']
+         sampled = Greeks(self.spec, bumps={'starting_price': 0.05}, shots=2000, seed=3).sensitivities(['delta'])
+         self.assertAlmostEqual(sampled['delta'], exact, delta=0.2)
+
+    def test_shared_adders(self):
+         self.spec.build()
+         misses = qft_adder_gate.cache_info().misses
+         self.spec.replace(starting_price=1.37).build()
+         self.assertLessEqual(qft_adder_gate.cache_info().misses, misses + 1)
+
+    def test_clipped_probability(self):
+         greeks = Greeks(ModelSpec.of(DynamicCreditRisk, 1, 3, prob_gb=0.0))
+         down, up, width = greeks.bumped('prob_gb')
+         self.assertEqual(down.build().prob_gb, 0.0)
+         self.assertEqual(width, 0.005)
+         self.assertEqual(set(greeks.sensitivities(['prob_gb', 'prob_bg'])), {'prob_gb', 'prob_bg'})
+
+    def test_unknown_parameter(self):
+         with self.assertRaises(ValueError):
+              Greeks(self.spec).bumped('gamma')
+
+if __name__ == '__main__':
+     unittest.main()
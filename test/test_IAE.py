@@ -0,0 +1,52 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+
+from markov_chain_models import DynamicCreditRisk, EstimationProblem, MockBackend
+from markov_chain_models.IAE import IterativeAmplitudeEstimation
+from markov_chain_models.GroverSampler import GroverSampler
+from qiskit import QuantumCircuit
+from qiskit.quantum_info import Statevector
+
+@ddt
+class TestIAE(unittest.TestCase):
+    """Test Iterative Amplitude Estimation."""
+    @data(
+         (0.0, 'beta'),
+         (0.2, 'beta'),
+         (0.5, 'beta'),
+         (0.83, 'chernoff'),
+         (1.0, 'chernoff'),
+    )
+    @unpack
+    def test_amplitude(self, a, confint_method):
+         circuit = QuantumCircuit(1)
+         circuit.ry(2*np.arcsin(np.sqrt(a)), 0)
+         iae = IterativeAmplitudeEstimation(epsilon_target=0.005, alpha=0.05, confint_method=confint_method)
+         result = iae.estimate(EstimationProblem(circuit, [0]), GroverSampler(seed=2))
+
+         low, high = result.confidence_interval
+         self.assertLessEqual(low, a + 1e-9)
+         self.assertGreaterEqual(high, a - 1e-9)
+         self.assertLessEqual(high - low, 2*0.005)
+         self.assertEqual(result.num_oracle_queries, sum((2*k+1)*s for k, s in zip(result.powers, result.shots)))
+
+    def test_backend(self):
+         # the circuits run on the backend and the queries accumulate on the sampler
+         circuit = DynamicCreditRisk(1, 3)
+         problem = EstimationProblem(circuit, circuit.objective)
+         a = Statevector(circuit).probabilities([circuit.objective])[1]
+
+         sampler = GroverSampler(MockBackend(seed=4), optimization_level=0)
+         result = IterativeAmplitudeEstimation(epsilon_target=0.02, shots=200).estimate(problem, sampler)
+         self.assertLessEqual(abs(result.estimation - a), 0.02)
+         self.assertEqual(sampler.num_oracle_queries, result.num_oracle_queries)
+
+    def test_invalid(self):
+         with self.assertRaises(ValueError):
+              IterativeAmplitudeEstimation(epsilon_target=0)
+         with self.assertRaises(ValueError):
+              IterativeAmplitudeEstimation(confint_method='wald')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+import pickle
+
+from markov_chain_models import MarkovChain, DerivativePricing, DynamicCreditRisk, StaticCreditRisk
+from markov_chain_models.MarkovChain import markov_chain_gate
+from qiskit.quantum_info import Statevector
+
+@ddt
+class TestLazyCircuit(unittest.TestCase):
+    """Test the lazy construction mode of the model circuits."""
+    @data(
+         (MarkovChain, (3, 0.1, 0.3)),
+         (DerivativePricing, (1.0, 3)),
+         (DynamicCreditRisk, (1, 3)),
+         (StaticCreditRisk, (1, 3)),
+    )
+    @unpack
+    def test_layout_without_build(self, model, args):
+         lazy = model(*args, lazy=True)
+         eager = model(*args)
+
+         # the layout and metadata are known before any gate is synthesized
+         self.assertFalse(lazy.is_built)
+         self.assertEqual(lazy.num_qubits, eager.num_qubits)
+         self.assertEqual(len(lazy.qubits), eager.num_qubits)
+         self.assertEqual(getattr(lazy, 'objective', None), getattr(eager, 'objective', None))
+         self.assertFalse(lazy.is_built)
+
+         # first access to the circuit data builds it
+         self.assertEqual(len(lazy.data), len(eager.data))
+         self.assertTrue(lazy.is_built)
+
+    @data(
+         (MarkovChain, (3, 0.1, 0.3)),
+         (DynamicCreditRisk, (1, 3)),
+         (StaticCreditRisk, (1, 3)),
+    )
+    @unpack
+    def test_lazy_statevector(self, model, args):
+         lazy = model(*args, lazy=True)
+         eager = model(*args)
+         np.testing.assert_array_almost_equal(Statevector(eager).probabilities(),
+                                              Statevector(lazy).probabilities())
+
+    @data(
+         (MarkovChain, (3, 0.1, 0.3)),
+         (DerivativePricing, (1.0, 2, 0.1, 0.3, 1, 3)),
+         (DynamicCreditRisk, (1, 3)),
+         (DynamicCreditRisk, (1, 3, 0.1, 0.3, [0.771, 0.3], 3)),
+         (StaticCreditRisk, (2, 3, 0.1, 0.3, [[0.4,0.5],[0.10,0.20]])),
+    )
+    @unpack
+    def test_flatten_statevector(self, model, args):
+         nested = model(*args)
+         flat = model(*args, flatten=True)
+
+         # no wrapper gates around the model blocks
+         self.assertGreater(len(flat.data), 1)
+         self.assertNotIn('circuit', ''.join(flat.count_ops()))
+         np.testing.assert_array_almost_equal(Statevector(nested).data,
+                                              Statevector(flat).data)
+
+    def test_copy_and_pickle_unbuilt(self):
+         circuit = DynamicCreditRisk(1, 3, lazy=True)
+         for other in [circuit.copy(), pickle.loads(pickle.dumps(DynamicCreditRisk(1, 3, lazy=True)))]:
+              self.assertEqual(len(other.data), 1)
+              np.testing.assert_array_almost_equal(Statevector(other).probabilities([other.objective]),
+                                                   [0.91995611, 0.08004389])
+
+    def test_memoized_gate_copies(self):
+         gate = markov_chain_gate(2, 0.15, 0.35)
+         misses = markov_chain_gate.cache_info().misses
+         gate.label = 'changed'
+         gate.definition.x(0)
+         other = markov_chain_gate(2, 0.15, 0.35)
+         self.assertEqual(markov_chain_gate.cache_info().misses, misses)
+         self.assertNotEqual(other.label, 'changed')
+         np.testing.assert_array_almost_equal(Statevector(other.definition).probabilities(),
+                                              Statevector(MarkovChain(2, 0.15, 0.35)).probabilities())
+
+if __name__ == '__main__':
+     unittest.main()
@@ -0,0 +1,96 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+
+from markov_chain_models import DynamicCreditRisk, EstimationProblem, construct_mlae_circuits, compute_mle
+from markov_chain_models import compute_noise_aware_mle, ResultsStore, import_json
+from markov_chain_models.MLAE import simulate_mlae_counts
+from qiskit.quantum_info import Statevector
+from qiskit import QuantumCircuit
+
+HARDWARE_RESULTS = os.path.join(os.path.dirname(__file__), '..', 'hardware_results')
+
+@ddt
+class TestMLAE(unittest.TestCase):
+    """Test the statevector shortcut of the MLAE circuits."""
+    def setUp(self):
+         circuit = QuantumCircuit(3)
+         circuit.ry(0.7, 0)
+         circuit.ry(1.1, 1)
+         circuit.cry(0.4, 0, 2)
+         self.problems = {
+              'dcr': EstimationProblem(DynamicCreditRisk(1, 3, 0.1, 0.3), DynamicCreditRisk(1, 3).objective),
+              'two_objectives': EstimationProblem(circuit, [0, 1]),
+         }
+
+    @data('dcr', 'two_objectives')
+    def test_exact_probabilities(self, name):
+         problem = self.problems[name]
+         exact = simulate_mlae_counts(problem)
+         for row, circuit in zip(exact, construct_mlae_circuits(problem)):
+              np.testing.assert_array_almost_equal(row, Statevector(circuit).probabilities(problem.objective_qubits))
+
+    def test_sampled_counts(self):
+         problem = self.problems['dcr']
+         counts = simulate_mlae_counts(problem, shots=20000, seed=7)
+         self.assertEqual(counts.shape, (4, 2))
+         np.testing.assert_array_equal(counts.sum(axis=1), 20000)
+         np.testing.assert_array_equal(counts, simulate_mlae_counts(problem, shots=20000, seed=7))
+         self.assertAlmostEqual(compute_mle(counts, problem), 0.22838713, places=2)
+
+    @data(
+         (0.2, 1e-4, [30, 2116, 4203, 8377]),
+         (0.05, 0, None),
+         (0.6, 0.05, None),
+    )
+    @unpack
+    def test_noise_aware_mle(self, a, rate, depths):
+         # exact probabilities of depolarized circuits
+         powers = np.array([0, 1, 2, 4])
+         fidelities = np.exp(-rate*np.array(depths if depths else 2*powers+1, dtype=float))
+         p = fidelities*np.sin((2*powers+1)*np.arcsin(np.sqrt(a)))**2 + (1-fidelities)/2
+         counts = np.stack([1-p, p], axis=1)*1e6
+
+         problem = EstimationProblem(QuantumCircuit(1), [0])
+         estimation, fitted = compute_noise_aware_mle(counts, problem, depths, return_fidelities=True)
+         self.assertAlmostEqual(estimation, a, places=3)
+         np.testing.assert_array_almost_equal(fitted, fidelities, decimal=2)
+
+    def test_noise_aware_mle_hardware(self):
+         # the counts of dcr(1,3) on Torino decay to 50/50, the ideal likelihood is biased
+         with open(os.path.join(HARDWARE_RESULTS, 'probabilities.json'), 'r') as file:
+              counts = json.load(file)['Torino_MLAE']
+         problem = self.problems['dcr']
+         exact = 0.08004389
+         self.assertLess(abs(compute_noise_aware_mle(counts, problem) - exact), abs(compute_mle(counts, problem) - exact))
+
+    def test_depths_from_store(self):
+         with tempfile.TemporaryDirectory() as directory:
+              store = ResultsStore(directory)
+              import_json(store, os.path.join(HARDWARE_RESULTS, 'quantinuum_MLAE.json'))
+              self.assertEqual(store.mlae_metadata('quantinuum_MLAE', 'quantinuum'), [30, 2116, 4203, 8377])
+
+    def test_lazy_import(self):
+         # the post processing must not pull in scipy at import time
+         probe = ("import sys; from markov_chain_models import compute_mle, compute_confidence_interval; "
+                  "print([name for name in ('scipy.optimize', 'scipy.stats') if name in sys.modules])")
+         output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True,
+                                 cwd=os.path.join(os.path.dirname(__file__), '..')).stdout
+         self.assertEqual(output.strip(), '[]')
+
+         # importing a submodule first binds it on the package, the package keeps the classes
+         probe = ("import markov_chain_models.DerivativePricing; from markov_chain_models.Greeks import Greeks; "
+                  "from markov_chain_models import DerivativePricing, MarkovChain, Greeks, MLAE; "
+                  "print(all(isinstance(value, type) for value in (DerivativePricing, MarkovChain, Greeks)), "
+                  "MLAE.__name__)")
+         output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True,
+                                 cwd=os.path.join(os.path.dirname(__file__), '..')).stdout
+         self.assertEqual(output.strip(), 'True markov_chain_models.MLAE')
+
+if __name__ == '__main__':
+     unittest.main()
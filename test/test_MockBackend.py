@@ -0,0 +1,60 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+import os
+import tempfile
+import time
+
+from markov_chain_models import DynamicCreditRisk, EstimationProblem, ResultsStore, import_json, construct_mlae_circuits, compute_mle
+from markov_chain_models.MockBackend import MockBackend
+from qiskit import QuantumCircuit, transpile
+from qiskit.providers import JobError, JobStatus
+
+HARDWARE_RESULTS = os.path.join(os.path.dirname(__file__), '..', 'hardware_results')
+
+@ddt
+class TestMockBackend(unittest.TestCase):
+    """Test the local stand-in backend."""
+    def setUp(self):
+         self.directory = tempfile.TemporaryDirectory()
+         self.store = ResultsStore(self.directory.name)
+         import_json(self.store, os.path.join(HARDWARE_RESULTS, 'probabilities.json'))
+         self.circuits = construct_mlae_circuits(EstimationProblem(QuantumCircuit(1), [0]), measurement=True)
+
+    def tearDown(self):
+         self.directory.cleanup()
+
+    def test_replay(self):
+         backend = MockBackend.from_store(self.store, 'MLAE', 'Torino')
+         counts = backend.run(self.circuits, shots=4000).result().get_counts()
+         self.assertEqual(counts[0], {'0': 2700, '1': 1300})
+
+         # other shot budgets are resampled from the recorded frequencies
+         counts = backend.run(self.circuits[0], shots=100).result().get_counts()
+         self.assertEqual(sum(counts.values()), 100)
+
+    def test_sampled(self):
+         circuit = DynamicCreditRisk(1, 3)
+         problem = EstimationProblem(circuit, circuit.objective)
+         backend = MockBackend(seed=3)
+         circuits = transpile(construct_mlae_circuits(problem, measurement=True), backend)
+         counts = backend.run(circuits, shots=20000).result().get_counts()
+         self.assertAlmostEqual(compute_mle(counts, problem), 0.08004389, places=2)
+
+    def test_latency_and_handles(self):
+         backend = MockBackend.from_store(self.store, 'MLAE', 'Torino', latency=0.05, seed=0)
+         handles = backend.process_circuits(self.circuits, n_shots=4000)
+         self.assertIn(JobStatus.QUEUED, [backend.circuit_status(handle) for handle in handles])
+         self.assertEqual(backend.get_result(handles[1]), {'0': 2140, '1': 1860})
+         time.sleep(0.5)
+         self.assertTrue(all(backend.circuit_status(handle) == JobStatus.DONE for handle in handles))
+
+    def test_failures(self):
+         backend = MockBackend.from_store(self.store, 'MLAE', 'Torino', failure_rate=1.0)
+         job = backend.run(self.circuits)
+         self.assertEqual(job.status(), JobStatus.ERROR)
+         with self.assertRaises(JobError):
+              job.result()
+
+if __name__ == '__main__':
+     unittest.main()
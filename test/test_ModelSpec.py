@@ -0,0 +1,58 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from markov_chain_models import DynamicCreditRisk, DerivativePricing, StaticCreditRisk, EstimationProblem, ModelSpec
+from markov_chain_models.MLAE import simulate_mlae_counts
+from qiskit.quantum_info import Statevector
+
+def _loss_probability(spec):
+     problem = spec.estimation_problem()
+     return simulate_mlae_counts(problem)[0, 1]
+
+@ddt
+class TestModelSpec(unittest.TestCase):
+    """Test the picklable model specs."""
+    @data(
+         (DynamicCreditRisk, (1, 3), {'growth_possibilities': [0.771, 0.3], 'flatten': True}),
+         (DerivativePricing, (1.0, 2), {'fractional_precision': 3, 'sigma': np.array([0.2, 0.3])}),
+         (StaticCreditRisk, (1, 3), {'weights': [1, 2]}),
+    )
+    @unpack
+    def test_round_trip(self, model, args, kwargs):
+         circuit = model(*args, **kwargs)
+         spec = pickle.loads(pickle.dumps(circuit.spec))
+         self.assertEqual(spec, ModelSpec.of(model, *args, **kwargs))
+         self.assertLess(len(pickle.dumps(spec)), 1000)
+         self.assertEqual(spec.layout(), {'num_qubits': circuit.num_qubits, 'objective': circuit.objective})
+         self.assertIs(spec.build(), spec.build())
+         np.testing.assert_array_almost_equal(Statevector(spec.build()).data, Statevector(circuit).data)
+
+    def test_process_pool(self):
+         specs = [ModelSpec.of(DynamicCreditRisk, loss, 3) for loss in range(3)]
+         with ProcessPoolExecutor(max_workers=2) as executor:
+              probabilities = list(executor.map(_loss_probability, specs))
+         self.assertAlmostEqual(probabilities[1], 0.08004389)
+         self.assertEqual(probabilities, [_loss_probability(spec) for spec in specs])
+
+    def test_concurrent_build(self):
+         circuit = DynamicCreditRisk(1, 3, lazy=True)
+         with ThreadPoolExecutor(max_workers=8) as executor:
+              lengths = list(executor.map(lambda _: len(circuit.data), range(8)))
+         self.assertEqual(lengths, [1]*8)
+
+    def test_pickle_rescaled_problem(self):
+         circuit = DynamicCreditRisk(1, 3)
+         problem = EstimationProblem(circuit, circuit.objective).rescale(0.5)
+         restored = pickle.loads(pickle.dumps(problem))
+         self.assertTrue(restored.is_good_state('11'))
+         self.assertFalse(restored.is_good_state('01'))
+
+    def test_unknown_model(self):
+         with self.assertRaises(ValueError):
+              ModelSpec.of('QFT', 3)
+
+if __name__ == '__main__':
+     unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+
+from markov_chain_models import MarkovChain, MultiRegimeMarkovChain
+from qiskit.quantum_info import Statevector
+
+@ddt
+class TestMultiRegimeMarkovChain(unittest.TestCase):
+    """Test the K regime Markov chain circuit."""
+    @data(
+         (3, 0.1, 0.3),
+         (4, 0.009708737864077669, 0.1111111111111111),
+    )
+    @unpack
+    def test_two_regimes_match_MarkovChain(self, time_steps, prob_gb, prob_bg):
+         chain = MultiRegimeMarkovChain(time_steps, [[1-prob_gb, prob_gb], [prob_bg, 1-prob_bg]])
+         expected = Statevector(MarkovChain(time_steps, prob_gb, prob_bg)).probabilities()
+
+         self.assertEqual(chain.num_qubits, time_steps+1)
+         np.testing.assert_array_almost_equal(expected, Statevector(chain).probabilities())
+         np.testing.assert_array_almost_equal(expected, chain.probabilities())
+
+    @data(
+         ([[0.8, 0.15, 0.05], [0.2, 0.6, 0.2], [0.1, 0.3, 0.6]], 2, 6),
+         ([[0.7, 0.1, 0.1, 0.1], [0.2, 0.5, 0.2, 0.1], [0.0, 0.3, 0.6, 0.1], [0.25, 0.25, 0.25, 0.25]], 2, 6),
+         ([[0.6, 0.1, 0.1, 0.1, 0.1], [0.1, 0.6, 0.1, 0.1, 0.1], [0.1, 0.1, 0.6, 0.1, 0.1],
+           [0.1, 0.1, 0.1, 0.6, 0.1], [0.1, 0.1, 0.1, 0.1, 0.6]], 1, 6),
+    )
+    @unpack
+    def test_K_regimes(self, transition_matrix, time_steps, num_qubits):
+         chain = MultiRegimeMarkovChain(time_steps, transition_matrix, flatten=True)
+         weights = chain.path_weights()
+
+         self.assertEqual(chain.num_qubits, num_qubits)
+         self.assertAlmostEqual(weights.sum(), 1)
+         # the initial regime is stationary
+         np.testing.assert_array_almost_equal(weights.sum(axis=tuple(range(1, time_steps+1))),
+                                              weights.sum(axis=tuple(range(time_steps))))
+         np.testing.assert_array_almost_equal(chain.probabilities(), Statevector(chain).probabilities())
+
+    def test_invalid_transition_matrix(self):
+         with self.assertRaises(ValueError):
+              MultiRegimeMarkovChain(2, [[0.5, 0.6], [0.3, 0.7]])
+
+if __name__ == '__main__':
+     unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+
+from markov_chain_models import DerivativePricing
+from markov_chain_models.Payoffs import Payoff, call, put, digital, call_spread, capped_call
+from qiskit.quantum_info import Statevector
+from qiskit import QuantumCircuit
+
+@ddt
+class TestPayoffs(unittest.TestCase):
+    """Test the piecewise linear payoff library."""
+    @data(
+         (call(1.0), [0, 0, 0.5]),
+         (put(1.0), [0.5, 0, 0]),
+         (digital(1.0, 2.0), [0, 2, 2]),
+         (call_spread(0.9, 1.1), [0, 0.1, 0.2]),
+         (capped_call(1.0, 0.1), [0, 0, 0.1]),
+    )
+    @unpack
+    def test_payoff_values(self, payoff, expected):
+         np.testing.assert_array_almost_equal(payoff([0.5, 1.0, 1.5]), expected)
+
+    def test_default_payoff(self):
+         # the default payoff is the call the circuit has always priced
+         default = DerivativePricing(1.0, 2, 0.1, 0.3, 1, 3)
+         explicit = DerivativePricing(None, 2, 0.1, 0.3, 1, 3, payoff=call(1.0))
+         # the payoff circuit is built once, every model gets its own copy
+         self.assertIsNot(default._payoff, explicit._payoff)
+         self.assertEqual(default._payoff, explicit._payoff)
+         np.testing.assert_array_almost_equal(Statevector(default).data, Statevector(explicit).data)
+
+    @data(put(1.0), digital(1.0), call_spread(0.9, 1.1), capped_call(1.0, 0.1))
+    def test_expected_payoff(self, payoff):
+         circuit = DerivativePricing(None, 2, 0.1, 0.3, 1, 3, payoff=payoff)
+
+         # expected payoff over the distribution of the price register
+         evolution = QuantumCircuit(1+2*2+circuit.num_size)
+         evolution.append(circuit.price_evolution(), evolution.qubits)
+         probabilities = Statevector(evolution).probabilities(range(1+2*2, evolution.num_qubits))
+         f_max = 2**2-2**-3
+         expected = probabilities @ payoff(np.linspace(0, f_max, 2**circuit.num_size))
+
+         amplitude = Statevector(circuit).probabilities([circuit.objective])[1]
+         self.assertAlmostEqual(circuit.post_processing(amplitude), expected, places=2)
+         self.assertAlmostEqual(payoff.post_processing(amplitude, (0, f_max), circuit.c_approx),
+                                circuit.post_processing(amplitude))
+
+    def test_invalid_payoff(self):
+         with self.assertRaises(ValueError):
+              Payoff([0, 1], [0], [0, 0])
+         with self.assertRaises(ValueError):
+              Payoff([0, 1], [0, 0], [0, 0]).circuit(3, (0, 2), 0.05)
+         with self.assertRaises(ValueError):
+              DerivativePricing(1.0, 2, payoff=put(1.0), lazy=True)
+         with self.assertRaises(ValueError):
+              DerivativePricing(None, 2, lazy=True)
+
+if __name__ == '__main__':
+     unittest.main()
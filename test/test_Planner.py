@@ -0,0 +1,54 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+
+from markov_chain_models import DerivativePricing, SparseState, plan_derivative_pricing, plan_credit_risk
+from markov_chain_models.Planner import _reference_price, _register_distribution, two_qubit_gate_count
+from qiskit import QuantumCircuit
+
+@ddt
+class TestPlanner(unittest.TestCase):
+    """Test the accuracy/cost planner."""
+    @data(({'fractional_precision': 3}), ({'fractional_precision': 4, 'sigma': np.array([0.2, 0.5])}),
+          ({'fractional_precision': 3, 'approximation_degree': 1}))
+    def test_register_distribution(self, kwargs):
+         model = DerivativePricing(1.0, 2, lazy=True, **kwargs)
+         register = range(5, 5+model.num_size)
+         expected = SparseState.from_circuit(model.price_evolution().definition).probabilities(register)
+         np.testing.assert_array_almost_equal(_register_distribution(model), expected)
+
+    @data(0.03, 0.01)
+    def test_bias(self, target):
+         plan = plan_derivative_pricing(target, 1.0, 2, fractional_precision=range(3, 9), c_approx=(0.05, 0.1, 0.2))
+         self.assertLessEqual(plan.total_error, target)
+         model = plan.spec.build()
+         value = model.post_processing(SparseState.from_circuit(model).probabilities([model.objective])[1])
+         # the two biases may have opposite signs
+         self.assertLessEqual(abs(value - _reference_price(model)),
+                              plan.discretization_error + plan.approximation_error + 1e-9)
+
+    def test_tighter_target_costs_more(self):
+         loose = plan_derivative_pricing(0.03, 1.0, 2, fractional_precision=range(3, 9))
+         tight = plan_derivative_pricing(0.01, 1.0, 2, fractional_precision=range(3, 9))
+         self.assertLess(loose.cost, tight.cost)
+
+    def test_unreachable_target(self):
+         with self.assertRaises(ValueError):
+              plan_derivative_pricing(0.001, 1.0, 2, fractional_precision=[3])
+
+    @data((0.02, 1), (0.005, 2))
+    @unpack
+    def test_credit_risk(self, target, loss):
+         plan = plan_credit_risk(target, loss, 2)
+         self.assertLessEqual(plan.statistical_error, target)
+         self.assertGreater(plan_credit_risk(target/2, loss, 2).shots, 3*plan.shots)
+
+    def test_two_qubit_gate_count(self):
+         circuit = QuantumCircuit(3)
+         circuit.h(0)
+         circuit.cx(0, 1)
+         circuit.ccx(0, 1, 2)
+         self.assertEqual(two_qubit_gate_count(circuit), 7)
+
+if __name__ == '__main__':
+     unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+
+from markov_chain_models import Portfolio, DerivativePricing
+from qiskit.quantum_info import Statevector
+
+@ddt
+class TestPortfolio(unittest.TestCase):
+    """Test the batched pricing of several strikes and maturities."""
+    def setUp(self):
+         self.book = Portfolio([0.9, 1.0, 1.1], [1/12, 1/12, 1/4], 1, fractional_precision=2)
+
+    def test_shared_evolution(self):
+         self.assertEqual(self.book.groups, {(1, 1/12): [0, 1], (1, 1/4): [2]})
+         self.assertIs(self.book.instruments[0].price_evolution(), self.book.instruments[1].price_evolution())
+         self.assertIsNot(self.book.instruments[0].price_evolution(), self.book.instruments[2].price_evolution())
+
+    @data(False, True)
+    def test_instruments(self, flatten):
+         book = Portfolio([0.9, 1.0, 1.1], [1/12, 1/12, 1/4], 1, fractional_precision=2, flatten=flatten)
+         for index, instrument in enumerate(book.instruments):
+              single = DerivativePricing(book.strike_prices[index], 1, time_tot=book.maturities[index], fractional_precision=2)
+              np.testing.assert_array_almost_equal(Statevector(instrument).probabilities([instrument.objective]),
+                                                   Statevector(single).probabilities([single.objective]))
+
+    def test_prices(self):
+         # counts of the exact amplitudes for the evaluation schedule [0,1,2,4]
+         shots = 10000
+         amplitudes = [Statevector(instrument).probabilities([instrument.objective])[1]
+                       for instrument in self.book.instruments]
+         results = []
+         for a in amplitudes:
+              for k in [0, 1, 2, 4]:
+                   good = int(round(shots*np.sin((2*k+1)*np.arcsin(np.sqrt(a)))**2))
+                   results.append({'1': good, '0': shots-good})
+
+         prices, intervals = self.book.prices(results)
+         expected = [instrument.post_processing(a) for instrument, a in zip(self.book.instruments, amplitudes)]
+         np.testing.assert_array_almost_equal(prices, expected, decimal=2)
+         self.assertEqual(intervals.shape, (3, 2))
+         self.assertTrue(np.all(intervals[:, 0] <= prices) and np.all(prices <= intervals[:, 1]))
+
+    def test_simulate(self):
+         prices, intervals = self.book.simulate(shots=20000, seed=1)
+         expected = [instrument.post_processing(Statevector(instrument).probabilities([instrument.objective])[1])
+                     for instrument in self.book.instruments]
+         np.testing.assert_array_less(intervals[:, 0], prices + 1e-12)
+         np.testing.assert_array_almost_equal(prices, expected, decimal=1)
+
+if __name__ == '__main__':
+     unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from markov_chain_models import (DerivativePricing, DynamicCreditRisk, StaticCreditRisk, MarkovChain, MockBackend,
+                                 ModelSpec, RegimeConditioning, SparseState)
+from markov_chain_models.ModelSpec import _build_cached
+
+def _amplitude(circuit, objective):
+     return SparseState.from_circuit(circuit).probabilities([objective])[1]
+
+@ddt
+class TestRegimeConditioning(unittest.TestCase):
+    """Test the decomposition into conditional circuits."""
+    @data(
+         (ModelSpec.of(DynamicCreditRisk, 1, 3), 2),
+         (ModelSpec.of(DynamicCreditRisk, 1, 2, prob_gb=0.2, flatten=True), 3),
+         (ModelSpec.of(StaticCreditRisk, 1, 2), 1),
+         (ModelSpec.of(DerivativePricing, 1.0, 2, fractional_precision=3), 2),
+    )
+    @unpack
+    def test_recombination(self, spec, num_fixed):
+         model = spec.build()
+         split = RegimeConditioning(spec, num_fixed)
+         total = 0
+         for path, probability in split.paths():
+              circuit, objective = split.circuit(path)
+              self.assertEqual(circuit.num_qubits, model.num_qubits-num_fixed)
+              total += probability*_amplitude(circuit, objective)
+         self.assertAlmostEqual(total, _amplitude(model, model.objective))
+
+    def test_paths(self):
+         split = RegimeConditioning(ModelSpec.of(DynamicCreditRisk, 1, 3, prob_gb=0.1, prob_bg=0.3), 3)
+         paths = dict(split.paths())
+         self.assertEqual(len(paths), 8)
+         self.assertAlmostEqual(sum(paths.values()), 1)
+         self.assertAlmostEqual(paths[(0, 1, 1)], 0.75*0.1*0.7)
+
+    def test_initial_regime(self):
+         probabilities = SparseState.from_circuit(MarkovChain(1, 0.1, 0.3, initial=1)).probabilities([0])
+         np.testing.assert_array_almost_equal(probabilities, [0.3, 0.7])
+
+    def test_combine(self):
+         split = RegimeConditioning(ModelSpec.of(DynamicCreditRisk, 1, 2, prob_gb=0.1, prob_bg=0.3), 1)
+         estimate, interval = split.combine([0.2, 0.6], [(0.1, 0.3), (0.5, 0.7)])
+         self.assertAlmostEqual(estimate, 0.75*0.2+0.25*0.6)
+         half_width = np.sqrt((0.75*0.1)**2+(0.25*0.1)**2)
+         np.testing.assert_array_almost_equal(interval, [estimate-half_width, estimate+half_width])
+
+    def test_simulate(self):
+         split = RegimeConditioning(ModelSpec.of(DynamicCreditRisk, 1, 3), 2)
+         estimate, interval = split.simulate(shots=2000, seed=1)
+         self.assertLess(interval[0], 0.08004389)
+         self.assertLess(0.08004389, interval[1])
+         with ProcessPoolExecutor(max_workers=2) as executor:
+              self.assertEqual(split.simulate(shots=2000, seed=1, executor=executor)[0], estimate)
+
+    def test_run(self):
+         spec = ModelSpec.of(DynamicCreditRisk, 1, 2)
+         split = RegimeConditioning(spec, 2)
+         estimate, interval = split.run([MockBackend(seed=1), MockBackend(seed=2)], shots=4000, optimization_level=0)
+         self.assertAlmostEqual(estimate, _amplitude(spec.build(), spec.build().objective), delta=3*(interval[1]-interval[0]))
+
+    def test_parameters_without_build(self):
+         spec = ModelSpec.of(DerivativePricing, 1.0, 2, prob_gb=0.15, fractional_precision=3)
+         builds = _build_cached.cache_info().misses
+         split = RegimeConditioning(spec, 2)
+         self.assertEqual(_build_cached.cache_info().misses, builds)
+         self.assertEqual((split.time_steps, split.prob_gb, split.prob_bg), (2, 0.15, 0.3))
+         self.assertAlmostEqual(split.post_processing(0.5), spec.build().post_processing(0.5))
+
+    def test_invalid(self):
+         with self.assertRaises(ValueError):
+              RegimeConditioning(ModelSpec.of(DynamicCreditRisk, 1, 3, encoding='count'), 1)
+         with self.assertRaises(ValueError):
+              RegimeConditioning(ModelSpec.of(DynamicCreditRisk, 1, 3), 5)
+
+if __name__ == '__main__':
+     unittest.main()
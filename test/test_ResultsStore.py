@@ -0,0 +1,63 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+import json
+import os
+import tempfile
+
+from markov_chain_models import ResultsStore, import_json, compute_mle, EstimationProblem
+from qiskit import QuantumCircuit
+
+HARDWARE_RESULTS = os.path.join(os.path.dirname(__file__), '..', 'hardware_results')
+
+@ddt
+class TestResultsStore(unittest.TestCase):
+    """Test the columnar results store."""
+    def setUp(self):
+         self.directory = tempfile.TemporaryDirectory()
+         self.store = ResultsStore(self.directory.name)
+         circuit = QuantumCircuit(1)
+         circuit.ry(0.5, 0)
+         self.problem = EstimationProblem(circuit, objective_qubits=[0])
+
+    def tearDown(self):
+         self.directory.cleanup()
+
+    def test_counts_round_trip(self):
+         record = self.store.add('dcr(1,3)', 2, 'aer', {'00': 3, '10': 5, '11': 2}, shots=10)
+         self.store.save()
+
+         reloaded = ResultsStore(self.directory.name)
+         np.testing.assert_array_equal(reloaded.counts(record), [3, 0, 5, 2])
+         self.assertEqual(reloaded.records(power=2)[0][1]['shots'], 10)
+
+    @data('Torino', 'Quantinuum')
+    def test_mle_from_store(self, backend):
+         with open(os.path.join(HARDWARE_RESULTS, 'probabilities.json'), 'r') as file:
+              expected = compute_mle(json.load(file)[backend+'_MLAE'], self.problem)
+
+         import_json(self.store, os.path.join(HARDWARE_RESULTS, 'probabilities.json'))
+         self.store.save()
+
+         counts = ResultsStore(self.directory.name).mlae_counts('MLAE', backend)
+         self.assertEqual(counts.shape, (4, 2))
+         self.assertAlmostEqual(compute_mle(counts, self.problem), expected)
+
+    @data(
+         ('quantinuum.json', 'dp(1,3,fp=4)', 1, 755),
+         ('quantinuum_MLAE.json', 'quantinuum_MLAE', 1, 30),
+         ('quantinuum_MSE.json', 'dcr(1,3)', 64, None),
+    )
+    @unpack
+    def test_import_handles(self, filename, problem, num_handles, depth):
+         import_json(self.store, os.path.join(HARDWARE_RESULTS, filename))
+         records = self.store.records(problem=problem, power=0, backend='quantinuum')
+
+         self.assertEqual(len(records), num_handles)
+         self.assertEqual(records[0][1].get('depth'), depth)
+         self.assertEqual(len(records[0][1]['handle']), 4)
+         with self.assertRaises(ValueError):
+              self.store.counts(records[0][0])
+
+if __name__ == '__main__':
+     unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+
+from markov_chain_models import MarkovChain, DerivativePricing, DynamicCreditRisk, StaticCreditRisk, SparseState
+from qiskit import QuantumCircuit
+from qiskit.circuit.library import QFTGate
+from qiskit.quantum_info import Statevector
+
+@ddt
+class TestSparseState(unittest.TestCase):
+    """Test the sparse simulation against the dense statevector."""
+    @data(
+        (MarkovChain, (3, 0.1, 0.3), {}),
+        (DynamicCreditRisk, (1, 3), {}),
+        (DynamicCreditRisk, (1, 3), {'flatten': True}),
+        (DynamicCreditRisk, (1, 3), {'encoding': 'count'}),
+        (StaticCreditRisk, (1, 3), {}),
+        (StaticCreditRisk, (1, 3), {'flatten': True}),
+        (DerivativePricing, (1.0, 2, 0.1, 0.3, 1, 3), {}),
+    )
+    @unpack
+    def test_statevector(self, model, args, kwargs):
+         circuit = model(*args, **kwargs)
+         state = SparseState.from_circuit(circuit)
+         np.testing.assert_allclose(state.to_statevector().data, Statevector(circuit).data, atol=1e-10)
+         np.testing.assert_allclose(state.probabilities([circuit.num_qubits-1]),
+                                    Statevector(circuit).probabilities([circuit.num_qubits-1]), atol=1e-10)
+
+    def test_support(self):
+         # the ancillas of the comparator and the weighted adder stay in a basis state
+         circuit = StaticCreditRisk(1, 3)
+         state = SparseState.from_circuit(circuit)
+         self.assertLess(len(state), 2**circuit.num_qubits/16)
+
+    def test_dense_fallback(self):
+         circuit = QuantumCircuit(6)
+         circuit.h(range(6))
+         circuit.append(QFTGate(6), range(6))
+         circuit.cx(0, 5)
+         circuit.p(0.3, 2)
+         state = SparseState.from_circuit(circuit, dense_fraction=0.25)
+         np.testing.assert_allclose(state.to_statevector().data, Statevector(circuit).data, atol=1e-10)
+         self.assertEqual(len(state), 1)
+
+    def test_measure(self):
+         circuit = QuantumCircuit(1, 1)
+         circuit.measure(0, 0)
+         with self.assertRaises(ValueError):
+              SparseState.from_circuit(circuit)
+
+if __name__ == '__main__':
+    unittest.main()
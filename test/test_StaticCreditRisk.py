@@ -1,8 +1,10 @@
 import unittest
+from itertools import product
 from ddt import ddt, data, unpack
 import numpy as np
 
-from markov_chain_models import StaticCreditRisk
+from markov_chain_models import StaticCreditRisk, SparseState
+from markov_chain_models.NormalDistribution import NormalDistribution
 from qiskit.quantum_info import Statevector
 
 @ddt
@@ -25,14 +27,14 @@ class TestStaticCreditRisk(unittest.TestCase):
                                                  decimal=3)
 
     @data(
-         ([0.28998934, 0.71001066], 1, 3, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [1,2], 3),
-         ([0.06236322, 0.93763678], 2, 3, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [1,2], 3),
-         ([0.28998934, 0.71001066], 1, 4, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [1,2], 3),
-         ([0.28998934, 0.71001066], 1, 3, 0.07, 0.11, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [1,2], 3),
-         ([0.39416232, 0.60583768], 1, 3, 0.1, 0.3, [[0.4,0.5],[0.10,0.20]], [[0.1,0.05],[0.15,0.1]], [1,2], 3),
-         ([0.04833608, 0.95166392], 1, 3, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.5,0.65],[0.10,0.2]], [1,2], 3),
-         ([0.40967211, 0.59032789], 1, 3, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [2,2], 3),
-         ([0.1166377, 0.8833623], 1, 3, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [1,2], 4)
+         ([0.27216294, 0.72783706], 1, 3, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [1,2], 3),
+         ([0.05771943, 0.94228057], 2, 3, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [1,2], 3),
+         ([0.2720705, 0.7279295], 1, 4, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [1,2], 3),
+         ([0.26258101, 0.73741899], 1, 3, 0.07, 0.11, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [1,2], 3),
+         ([0.34602599, 0.65397401], 1, 3, 0.1, 0.3, [[0.4,0.5],[0.10,0.20]], [[0.1,0.05],[0.15,0.1]], [1,2], 3),
+         ([0.07011598, 0.92988402], 1, 3, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.5,0.65],[0.10,0.2]], [1,2], 3),
+         ([0.38853397, 0.61146603], 1, 3, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [2,2], 3),
+         ([0.1051384, 0.8948616], 1, 3, 0.1, 0.3, [[0.1,0.2],[0.15,0.25]], [[0.1,0.05],[0.15,0.1]], [1,2], 4)
     )
     @unpack
     def test_SCR_circuit(self,
@@ -60,5 +62,68 @@ class TestStaticCreditRisk(unittest.TestCase):
                                          circuit=circuit,
                                          qubits = [circuit.objective])
          
+    def RegimePaths(self, model):
+         '''Probability of every path of the regimes of the time steps, the chain starting in its
+         steady state and 1 marking the bad regime'''
+         transition = np.array([[1-model.prob_gb, model.prob_gb], [model.prob_bg, 1-model.prob_bg]])
+         steady = np.array([model.prob_bg, model.prob_gb])/(model.prob_gb+model.prob_bg)
+         paths = {}
+         for regimes in product([0, 1], repeat=model.time_steps+1):
+              probability = steady[regimes[0]]*np.prod([transition[a, b] for a, b in zip(regimes, regimes[1:])])
+              paths[regimes[1:]] = paths.get(regimes[1:], 0) + probability
+         return paths
+
+    def ClassicalLossProbability(self, model):
+         '''P(loss <= model.loss) summed over the regime paths, the grid of the factor registers and the defaults'''
+         z = model.z_qubits
+         center = (2**z-1)/2
+         weights = NormalDistribution(z, mu=center, sigma=(2**z-1)/4, bounds=(0, 2**z-1)).probabilities
+         models = [model._LinearDefaultModel(model.default_probs[r], model.sensitivities[r]) for r in [0, 1]]
+         total = 0
+         for path, path_probability in self.RegimePaths(model).items():
+              for innovations in product(range(2**z), repeat=model.num_factors):
+                   factors = center + model._cholesky @ (np.array(innovations) - center)
+                   '''every time step rotates by the angle of the default model of its regime'''
+                   probs = [np.sin(sum(models[r][0][i]*factors[model.sectors[i]] + models[r][1][i] for r in path)/2)**2
+                            for i in range(model.groups)]
+                   for defaults in product([0, 1], repeat=model.groups):
+                        if np.dot(model.weights, defaults) <= model.loss:
+                             total += path_probability*np.prod(weights[list(innovations)])*np.prod(
+                                  [p if d else 1-p for p, d in zip(probs, defaults)])
+         return total
+
+    @data(
+         (1, 2, None, None, False),
+         (1, 2, [[1, 0.5], [0.5, 1]], [0, 1], False),
+         (2, 1, [[1, -0.3], [-0.3, 1]], [1, 0], True),
+         (1, 2, [[1, 0.3, 0.2], [0.3, 1, 0.4], [0.2, 0.4, 1]], [2, 1], False),
+    )
+    @unpack
+    def test_multi_factor(self, loss, time_steps, factor_correlation, sectors, flatten):
+         model = StaticCreditRisk(loss, time_steps, z_qubits=2, factor_correlation=factor_correlation,
+                                  sectors=sectors, flatten=flatten)
+         probability = SparseState.from_circuit(model).probabilities([model.objective])[1]
+         self.assertAlmostEqual(probability, self.ClassicalLossProbability(model))
+
+    def test_single_factor(self):
+         default = StaticCreditRisk(1, 2)
+         single = StaticCreditRisk(1, 2, factor_correlation=[[1.0]])
+         self.assertEqual(single.num_qubits, default.num_qubits)
+         np.testing.assert_allclose(SparseState.from_circuit(single).probabilities([single.objective]),
+                                    SparseState.from_circuit(default).probabilities([default.objective]))
+
+         '''Almost perfectly correlated sectors behave like one factor'''
+         correlated = StaticCreditRisk(1, 2, factor_correlation=[[1, 0.9999], [0.9999, 1]], sectors=[0, 1])
+         self.assertEqual(correlated.num_qubits, default.num_qubits + 3)
+         self.assertAlmostEqual(SparseState.from_circuit(correlated).probabilities([correlated.objective])[1],
+                                SparseState.from_circuit(default).probabilities([default.objective])[1], places=2)
+
+    @data(([[1, 0.5], [0.4, 1]], [0, 1]), ([[1, 2], [2, 1]], [0, 1]), ([[1, 0.5], [0.5, 1]], [0, 2]),
+          (None, [1, 0]), ([[1, 0.5], [0.5, 1]], [0]))
+    @unpack
+    def test_invalid_factors(self, factor_correlation, sectors):
+         with self.assertRaises(ValueError):
+              StaticCreditRisk(1, 2, factor_correlation=factor_correlation, sectors=sectors, lazy=True)
+
 if __name__ == '__main__':
      unittest.main()
\ No newline at end of file
@@ -0,0 +1,104 @@
+import unittest
+from ddt import ddt, data, unpack
+import numpy as np
+import os
+import tempfile
+
+from markov_chain_models import DynamicCreditRisk, ScenarioTable, SparseState, StaticCreditRisk, StressTest
+from markov_chain_models.DynamicCreditRisk import _growths_gate
+
+@ddt
+class TestStressTest(unittest.TestCase):
+    """Test the scenario stress tests and their on-disk table."""
+    def setUp(self):
+         self.directory = tempfile.TemporaryDirectory()
+         self.path = os.path.join(self.directory.name, 'stress')
+
+    def tearDown(self):
+         self.directory.cleanup()
+
+    def circuit_probability(self, spec):
+         model = spec.build()
+         return SparseState.from_circuit(model).probabilities([model.objective])[1]
+
+    @data(({}, 1), ({'factor_correlation': [[1, 0.4], [0.4, 1]], 'sectors': [0, 1]}, 2))
+    @unpack
+    def test_static_classical(self, factors, loss):
+         scenarios = [{'default_probs': [[dp, 0.2], [0.15, 0.25]], 'sensitivities': [[0.1, s], [0.15, 0.1]]}
+                      for dp in [0.1, 0.5] for s in [0.05, 0.3]]
+         '''Stresses of the regimes, alone and with the bad-regime default model'''
+         scenarios += [{'prob_gb': 0.4}, {'prob_gb': 0.3, 'prob_bg': 0.05, 'default_probs': [[0.1, 0.2], [0.4, 0.5]]}]
+         test = StressTest(StaticCreditRisk, scenarios, loss=loss, time_steps=2, z_qubits=2, **factors)
+         values, probabilities = test.loss_distributions()
+         self.assertEqual(probabilities.shape, (6, 4))
+         np.testing.assert_allclose(probabilities.sum(axis=1), 1)
+         for index in range(len(test)):
+              self.assertAlmostEqual(probabilities[index, values[index] <= loss].sum(),
+                                     self.circuit_probability(test.spec(index)))
+         '''The regimes change the loss distribution'''
+         base = StressTest(StaticCreditRisk, [{}], loss=loss, time_steps=2, z_qubits=2, **factors)
+         self.assertGreater(np.abs(probabilities[4] - base.loss_distributions()[1][0]).max(), 1e-3)
+
+    @data(2, 4, 7)
+    def test_dynamic_classical(self, loss):
+         '''Growths of even integers: the growths and the scaled loss, one grid step above the
+         loss, are on the grid of the sum register and added exactly by the circuit'''
+         scenarios = [{'prob_gb': 0.05, 'prob_bg': 0.2, 'growth_possibilities': [2, 0]},
+                      {'prob_gb': 0.3, 'prob_bg': 0.1, 'growth_possibilities': [4, 2]},
+                      {'prob_gb': 0.5, 'growth_possibilities': [2, 4]}]
+         test = StressTest('DynamicCreditRisk', scenarios, loss=loss, time_steps=3)
+         values, probabilities = test.loss_distributions()
+         self.assertTrue(np.all(np.diff(values, axis=1) >= 0))
+         for index in range(len(test)):
+              self.assertAlmostEqual(probabilities[index, values[index] <= loss].sum(),
+                                     self.circuit_probability(test.spec(index)))
+
+    def test_run(self):
+         scenarios = [{'prob_gb': p, 'quantum': i == 2} for i, p in enumerate(np.linspace(0.01, 0.5, 5))]
+         test = StressTest(DynamicCreditRisk, scenarios, loss=1, time_steps=3,
+                           growth_possibilities=[0.75, 0])
+         table = test.run(self.path, shots=2000, confidence=0.9, seed=1, chunk_size=2)
+         self.assertEqual(len(table), 5)
+         np.testing.assert_array_equal(table.column('scenario'), range(5))
+
+         estimates = table.column('estimate')
+         self.assertEqual(np.isnan(estimates).tolist(), [True, True, False, True, True])
+         self.assertLessEqual(table.column('lower')[2], estimates[2])
+         self.assertAlmostEqual(estimates[2], table.column('probability')[2], delta=0.02)
+
+         values, probabilities = test.loss_distributions()
+         rows = table.rows()
+         np.testing.assert_allclose(rows[:, table.columns.index('prob_0'):], probabilities)
+         np.testing.assert_allclose(table.column('expected_loss'), np.sum(values*probabilities, axis=1))
+         for index in range(5):
+              cdf = np.cumsum(probabilities[index])
+              self.assertEqual(table.column('value_at_risk')[index], values[index][np.argmax(cdf >= 0.9)])
+
+         '''Reopened, the table keeps its rows and appends'''
+         test.run(self.path, chunk_size=10)
+         self.assertEqual(len(ScenarioTable(self.path)), 10)
+         with self.assertRaises(ValueError):
+              ScenarioTable(self.path, ['scenario'])
+
+    def test_shared_gates(self):
+         scenarios = [{'prob_gb': p} for p in [0.1, 0.2, 0.3]]
+         test = StressTest(DynamicCreditRisk, scenarios, loss=1, time_steps=2, growth_possibilities=[0.5, 0.125])
+         test.spec(0).build()
+         misses = _growths_gate.cache_info().misses
+         for index in range(1, len(test)):
+              test.spec(index).build()
+         self.assertEqual(_growths_gate.cache_info().misses, misses)
+
+    @data(('DynamicCreditRisk', {'time_steps': 2}), ('StaticCreditRisk', {'weights': [1, 1]}),
+          ('DerivativePricing', {'prob_gb': 0.1}))
+    @unpack
+    def test_invalid_scenarios(self, model, scenario):
+         with self.assertRaises(ValueError):
+              StressTest(model, [scenario], loss=1, time_steps=3)
+
+    def test_new_table(self):
+         with self.assertRaises(ValueError):
+              ScenarioTable(self.path)
+
+if __name__ == '__main__':
+     unittest.main()
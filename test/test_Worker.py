@@ -0,0 +1,103 @@
+import asyncio
+import json
+import unittest
+from ddt import ddt, data
+import numpy as np
+
+from markov_chain_models import ModelSpec, SparseState, StaticCreditRisk
+from markov_chain_models.MockBackend import MockBackend
+from markov_chain_models.Worker import Worker
+
+@ddt
+class TestWorker(unittest.TestCase):
+    """Test the asyncio pricing and risk worker."""
+    def setUp(self):
+         self.specs = [ModelSpec.of(StaticCreditRisk, loss, 1) for loss in range(4)]
+
+    def exact(self, spec):
+         model = spec.build()
+         return SparseState.from_circuit(model).probabilities([model.objective])[1]
+
+    def test_coalesce(self):
+         async def run():
+              async with Worker(shots=500, seed=1) as worker:
+                   results = await asyncio.gather(*[worker.price(self.specs[0]) for _ in range(3)])
+                   return results, worker.metrics()
+         results, metrics = asyncio.run(run())
+         self.assertEqual(metrics['requests'], 3)
+         self.assertEqual(metrics['coalesced'], 2)
+         self.assertEqual(metrics['completed'], 1)
+         for estimation, interval in results:
+              self.assertEqual(estimation, results[0][0])
+         estimation, interval = results[0]
+         self.assertLessEqual(interval[0], estimation)
+         self.assertAlmostEqual(estimation, self.exact(self.specs[0]), delta=2*(interval[1] - interval[0]))
+
+    def test_batch(self):
+         async def run():
+              async with Worker(MockBackend(seed=2), shots=200, batch_window=0.05) as worker:
+                   first = await asyncio.gather(*[worker.price(spec) for spec in self.specs[:2]])
+                   await worker.price(self.specs[0], shots=100)
+                   return first, worker.metrics()
+         first, metrics = asyncio.run(run())
+         self.assertEqual(metrics['batches'], 2)
+         self.assertEqual(metrics['jobs'], 2)
+         self.assertEqual(metrics['circuits'], 12)
+         self.assertEqual(metrics['warm_specs'], 2)
+         self.assertIsNotNone(metrics['latency_p95'])
+         self.assertGreater(metrics['throughput'], 0)
+         for spec, (estimation, _) in zip(self.specs, first):
+              self.assertAlmostEqual(estimation, self.exact(spec), delta=0.1)
+
+    @data(0.5, 0.9, 0.99)
+    def test_value_at_risk(self, confidence):
+         cdf = [self.exact(spec) for spec in self.specs]
+         expected = next(loss for loss, value in enumerate(cdf) if value >= confidence)
+         async def run():
+              async with Worker(shots=2000, seed=3) as worker:
+                   return await worker.value_at_risk(self.specs[0], confidence)
+         self.assertEqual(asyncio.run(run()), expected)
+
+    def test_evictions(self):
+         async def run():
+              async with Worker(shots=200, seed=5, max_warm_specs=2) as worker:
+                   for spec in self.specs[:3]+self.specs[:1]:
+                        await worker.price(spec)
+                   return worker.metrics()
+         metrics = asyncio.run(run())
+         self.assertEqual(metrics['warm_specs'], 2)
+         '''The problem and distribution of the first spec, and of the second when the first returns'''
+         self.assertEqual(metrics['evictions'], 4)
+
+    def test_failed_job(self):
+         async def run():
+              async with Worker(MockBackend(failure_rate=1.0, seed=4)) as worker:
+                   with self.assertRaises(Exception):
+                        await worker.price(self.specs[0])
+                   return worker.metrics()
+         self.assertEqual(asyncio.run(run())['failed'], 1)
+
+    def test_serve(self):
+         async def run():
+              async with Worker(shots=500, seed=5) as worker:
+                   server = await worker.serve(port=0)
+                   port = server.sockets[0].getsockname()[1]
+                   reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                   requests = [{'id': 1, 'model': 'StaticCreditRisk', 'args': [1, 1]},
+                               {'id': 2, 'type': 'metrics'},
+                               {'id': 3, 'model': 'Unknown'}]
+                   writer.write(''.join(json.dumps(request) + '\n' for request in requests).encode())
+                   await writer.drain()
+                   answers = [json.loads(await reader.readline()) for _ in requests]
+                   writer.close()
+                   server.close()
+                   await server.wait_closed()
+                   return {answer['id']: answer for answer in answers}
+         answers = asyncio.run(run())
+         self.assertAlmostEqual(answers[1]['estimate'], self.exact(self.specs[1]), delta=0.1)
+         self.assertEqual(len(answers[1]['interval']), 2)
+         self.assertIn('requests', answers[2]['metrics'])
+         self.assertIn('error', answers[3])
+
+if __name__ == '__main__':
+     unittest.main()